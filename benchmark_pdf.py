@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the GAICOM documentation PDF generator.
+
+postprocess: times the single-pass HTML post-processor on the GAICOM
+             document scaled to several sizes (tests/test_postprocess.py
+             checks it against the original chain of passes).
+backends:    renders the GAICOM document with each rendering backend in
+             a fresh process and compares render time, peak memory and
+             PDF size.
+suite:       times every pipeline function separately on synthetic
+             documents shaped like GAICOM-SYSTEM-DOCUMENTATION.md, from
+             1k to 1M lines, and writes comparable JSON results. With
+             --compare it flags functions that got slower than a saved
+             baseline.
+
+Usage:
+    python benchmark_pdf.py postprocess --scales 1 10 50 --repeat 5
+    python benchmark_pdf.py backends --backends chrome chrome-warm weasyprint
+    python benchmark_pdf.py suite --sizes 1000 10000 --output bench.json
+    python benchmark_pdf.py suite --output new.json --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import generate_pdf as gen
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+def best_time(func, arg, repeat):
+    """Return (best wall time in seconds, result) over repeat runs."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_postprocess(args):
+    """Time the single pass on the GAICOM HTML repeated N times."""
+    raw_html = gen.convert_md_to_html(gen.read_markdown(gen.MD_FILE))
+
+    print("Post-processing: single pass")
+    print(f"{'scale':>6} {'size':>12} {'time (ms)':>12} {'MB/s':>8}")
+    for scale in args.scales:
+        html = raw_html * scale
+        single_time, _ = best_time(gen.postprocess_html, html, args.repeat)
+        print(
+            f"{scale:>6} {len(html):>12,} {single_time * 1000:>12.2f} "
+            f"{len(html) / single_time / 1e6:>8.1f}"
+        )
+
+
+def _peak_rss_mb(who):
+    """Peak resident set size in MB for RUSAGE_SELF or RUSAGE_CHILDREN."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def render_one(backend, pdf_path):
+    """Child-process worker: render the GAICOM document once and print a
+    JSON result line. Runs in its own process so peak RSS is per backend."""
+    args = gen.parse_args(["--renderer", backend])
+    document, _ = gen.build_document_html(gen.read_markdown(gen.MD_FILE))
+    renderer = gen.make_renderer(args)
+    try:
+        start = time.perf_counter()
+        ok = renderer.render(document, pdf_path)
+        elapsed = time.perf_counter() - start
+    finally:
+        renderer.close()
+    print(json.dumps({
+        "ok": ok,
+        "render_s": elapsed,
+        # A warm browser is not our child, so its memory is not counted
+        "peak_self_mb": _peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+        "peak_children_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+        "size": os.path.getsize(pdf_path) if ok else 0,
+    }))
+
+
+def bench_backends(args):
+    """Compare rendering backends on time, peak memory and output size."""
+    print("Rendering backends on the GAICOM document")
+    print(f"{'backend':<12} {'best (ms)':>10} {'mean (ms)':>10} {'peak RSS':>10} {'size':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in args.backends:
+            pdf_path = os.path.join(tmp, backend + ".pdf")
+            runs = []
+            for _ in range(args.repeat):
+                proc = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "_render-one", backend, pdf_path],
+                    capture_output=True,
+                    text=True,
+                )
+                lines = [l for l in proc.stdout.splitlines() if l.startswith("{")]
+                if proc.returncode != 0 or not lines:
+                    error = (proc.stderr.strip().splitlines() or ["no output"])[-1]
+                    print(f"{backend:<12} failed: {error}")
+                    break
+                runs.append(json.loads(lines[-1]))
+            if not runs:
+                continue
+            times = [r["render_s"] * 1000 for r in runs]
+            peaks = [max(r["peak_self_mb"] or 0, r["peak_children_mb"] or 0) for r in runs]
+            peak = f"{max(peaks):.0f} MB" if resource else "n/a"
+            print(
+                f"{backend:<12} {min(times):>10.0f} {sum(times) / len(times):>10.0f} "
+                f"{peak:>10} {runs[-1]['size'] / 1024:>8.0f}KB"
+            )
+
+
+# -------------------------------------------------------------------
+# Synthetic corpora and the pipeline suite
+# -------------------------------------------------------------------
+RESULTS_SCHEMA = 1
+WORDS = (
+    "sanity studio content publish lambda stripe checkout webhook newsletter "
+    "react component query schema deploy bucket environment variable secret "
+    "frontend backend route fallback image event resource author testimonial "
+    "donation session validate request response cache build release editor"
+).split()
+CODE_SAMPLES = {
+    "jsx": [
+        "export default function Card({ title, body }) {",
+        "  const [open, setOpen] = useState(false);",
+        "  return <div className=\"card\" onClick={() => setOpen(!open)}>{title}</div>;",
+        "}",
+    ],
+    "json": ['{', '  "name": "gaicom",', '  "version": "1.0.0",', '  "private": true', '}'],
+    "bash": ["npm install", "npm run build", "aws s3 sync dist/ s3://gaicom-site --delete"],
+    "groq": ['*[_type == "blogPost"] | order(publishedAt desc) {', "  title, slug, excerpt", "}"],
+}
+
+
+def _sentence(rng, words=12):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def generate_corpus(lines, seed=0):
+    """Build synthetic markdown of about `lines` lines, structured like the
+    GAICOM document: numbered H2 chapters, lettered H3 sections, H4 steps,
+    callouts, checkbox lists, fenced code and tables."""
+    rng = random.Random(seed)
+    out = ["# GAICOM SYSTEM DOCUMENTATION", "", "---", ""]
+    chapter = 0
+    # Whole chapters only: the last one may run past `lines`, and nothing
+    # is truncated afterwards
+    while len(out) < lines:
+        chapter += 1
+        out += [f"## {chapter}. {_sentence(rng, 4)[:-1].title()}", ""]
+        for section in range(rng.randint(3, 6)):
+            out += [f"### {chr(65 + section)}. {_sentence(rng, 3)[:-1].title()}", ""]
+            out += [_sentence(rng, 30), ""]
+            kind = rng.randrange(5)
+            if kind == 0:
+                for step in range(1, rng.randint(3, 6)):
+                    out += [f"#### Step {step}: {_sentence(rng, 4)[:-1]}", "", _sentence(rng), ""]
+            elif kind == 1:
+                label = rng.choice(["Important", "Note", "Decision"])
+                out += [f"**{label}:** {_sentence(rng, 20)}", ""]
+            elif kind == 2:
+                out += [f"- [{rng.choice(' x')}] {_sentence(rng, 6)}" for _ in range(rng.randint(3, 8))] + [""]
+            elif kind == 3:
+                lang = rng.choice(sorted(CODE_SAMPLES))
+                out += ["```" + lang] + CODE_SAMPLES[lang] + ["```", ""]
+            else:
+                out += ["| Field | Type | Description |", "|-------|------|-------------|"]
+                out += [
+                    f"| `{rng.choice(WORDS)}` | {rng.choice(['string', 'slug', 'image'])} | {_sentence(rng, 6)} |"
+                    for _ in range(rng.randint(3, 8))
+                ] + [""]
+        out += ["---", ""]
+    return "\n".join(out) + "\n"
+
+
+def time_call(func, args, repeat, budget_s=5.0):
+    """Time func(*args) up to repeat times, stopping early once the total
+    exceeds budget_s. Returns (stats dict, last result)."""
+    times = []
+    result = None
+    while len(times) < repeat:
+        start = time.perf_counter()
+        result = func(*args)
+        times.append(time.perf_counter() - start)
+        if sum(times) > budget_s:
+            break
+    return {"best_s": min(times), "mean_s": sum(times) / len(times), "runs": len(times)}, result
+
+
+def _size_of(value):
+    if isinstance(value, str):
+        return len(value)
+    if isinstance(value, (list, tuple)):
+        return sum(_size_of(v) for v in value) if value and isinstance(value[0], str) else len(value)
+    return None
+
+
+def bench_pipeline(md_text, repeat):
+    """Time every pipeline function on one document; returns {name: stats}."""
+    results = {}
+
+    def record(name, func, *args):
+        stats, result = time_call(func, args, repeat)
+        stats["input_chars"] = len(args[0]) if isinstance(args[0], str) else None
+        stats["output_size"] = _size_of(result)
+        results[name] = stats
+        return result
+
+    chapters = record("split_chapters", gen.split_chapters, md_text)
+    raw_html, toc_tokens = record("convert_markdown", gen.convert_markdown, md_text)
+    toc_items = record("build_toc_from_tokens", gen.build_toc_from_tokens, toc_tokens)
+    record("build_toc_html", gen.build_toc_html, toc_items)
+    content_html = record("postprocess_html", gen.postprocess_html, raw_html)
+    with tempfile.TemporaryDirectory() as cache_dir:
+        # Cold: every chapter converted; warm: every fragment from the cache
+        store = gen.ArtifactStore(cache_dir)
+        gen._HIGHLIGHT_MEMO.clear()
+        gen._DIAGRAM_MEMO.clear()
+        stats, _ = time_call(gen.convert_chapters, (chapters, store), 1)
+        results["convert_chapters_cold"] = dict(stats, input_chars=len(md_text), output_size=None)
+        record("convert_chapters_warm", lambda c: gen.convert_chapters(c, store), chapters)
+    record("build_full_html", lambda html: gen.build_full_html(gen.build_cover_page(), "", html), content_html)
+    return results
+
+
+def bench_suite(args):
+    """Run the pipeline suite on synthetic corpora and store JSON results."""
+    report = {
+        "schema": RESULTS_SCHEMA,
+        "generator_version": gen.GENERATOR_VERSION,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "seed": args.seed,
+        "results": {},
+    }
+    for lines in args.sizes:
+        md_text = generate_corpus(lines, args.seed)
+        print(f"\n{lines:,} lines ({len(md_text):,} characters)")
+        results = bench_pipeline(md_text, args.repeat)
+        for name, stats in results.items():
+            print(f"  {name:<32} {stats['best_s'] * 1000:>12.2f} ms  ({stats['runs']} runs)")
+        report["results"][str(lines)] = results
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare_results(baseline, report, args.threshold):
+            sys.exit(1)
+
+
+def compare_results(baseline, current, threshold):
+    """Print per-function ratios against a baseline; return the number of
+    regressions (best time slower than threshold x baseline)."""
+    if baseline.get("schema") != current["schema"]:
+        raise SystemExit("Baseline uses a different results schema")
+    regressions = 0
+    print(f"\nComparison against baseline ({baseline.get('timestamp')}), threshold {threshold:.2f}x")
+    for size, results in current["results"].items():
+        old_results = baseline["results"].get(size, {})
+        for name, stats in results.items():
+            old = old_results.get(name)
+            if not old:
+                continue
+            ratio = stats["best_s"] / old["best_s"] if old["best_s"] else 1.0
+            flag = "REGRESSION" if ratio > threshold else ""
+            regressions += bool(flag)
+            print(f"  {size:>8} {name:<32} {ratio:>6.2f}x {flag}")
+    print(f"  {regressions} regression(s)")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PDF generator.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    post = sub.add_parser("postprocess", help="time the single-pass post-processing")
+    post.add_argument("--scales", type=int, nargs="+", default=[1, 10, 50, 200])
+    post.add_argument("--repeat", type=int, default=3)
+    post.set_defaults(func=bench_postprocess)
+
+    back = sub.add_parser("backends", help="compare rendering backends")
+    back.add_argument("--backends", nargs="+", choices=sorted(gen.RENDERERS), default=sorted(gen.RENDERERS))
+    back.add_argument("--repeat", type=int, default=3)
+    back.set_defaults(func=bench_backends)
+
+    suite = sub.add_parser("suite", help="time every pipeline function on synthetic corpora")
+    suite.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000, 1000000],
+                       help="document sizes in lines (default: %(default)s)")
+    suite.add_argument("--repeat", type=int, default=3)
+    suite.add_argument("--seed", type=int, default=0)
+    suite.add_argument("--output", help="write results JSON here")
+    suite.add_argument("--compare", metavar="BASELINE", help="compare against a saved results JSON")
+    suite.add_argument("--threshold", type=float, default=1.2,
+                       help="slowdown ratio reported as a regression (default: %(default)s)")
+    suite.set_defaults(func=bench_suite)
+
+    one = sub.add_parser("_render-one")
+    one.add_argument("backend")
+    one.add_argument("pdf_path")
+    one.set_defaults(func=lambda a: render_one(a.backend, a.pdf_path))
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,13 +3,61 @@
 GAICOM System Documentation PDF Generator - Version 2.0
 Converts the markdown documentation into a professionally styled PDF.
 Fixed: diagram placement, page breaks, section handling, checkbox rendering
+
+Usage:
+    python generate_pdf.py                          # rebuild only if inputs changed
+    python generate_pdf.py --force                  # ignore the build cache
+    python generate_pdf.py --renderer chrome-warm   # reuse a background Chrome
+    python generate_pdf.py --renderer weasyprint    # pure-Python backend, no Chrome
+    python generate_pdf.py --stop-browser           # shut the background Chrome down
+    python generate_pdf.py --download-fonts         # fetch Inter / JetBrains Mono once
+    python generate_pdf.py --batch "docs/*.md" --renderer chrome-warm --tabs 4
+    python generate_pdf.py --watch --renderer chrome-warm
+    python generate_pdf.py --keep-html              # also write _doc_intermediate.html
+    python generate_pdf.py --keep-html --no-minify  # ...without pruning/minifying CSS and HTML
+    python generate_pdf.py --trace trace.json       # per-stage timings for chrome://tracing
+    python generate_pdf.py --optimize-pdf           # dedupe, recompress and linearize the PDF
+    python generate_pdf.py --formats pdf,html,epub  # PDF, per-chapter HTML site and EPUB from one parse
+    python generate_pdf.py --formats html,search    # site plus a prebuilt search index
+    python generate_pdf.py --parallel-chapters --tabs 8  # render chapters concurrently, then merge
+    python generate_pdf.py --cache-dir /ci/doc-cache --cache-size 2048  # shared artifact store
+    python generate_pdf.py --serve 8765 --tabs 4    # render daemon: POST /render, GET /doc/<name>.pdf
 """
 
+import argparse
+import base64
+import collections
+import concurrent.futures
+import contextlib
+import functools
+import glob
+import gzip
+import html as html_lib
+import html.parser
+import http.server
+import io
+import logging
+import hashlib
+import json
 import markdown
 import re
+import shutil
+import socket
+import struct
 import subprocess
+import tempfile
 import os
+import queue
 import sys
+import threading
+import time
+import traceback
+import urllib.parse
+import urllib.request
+import uuid
+import warnings
+import weakref
+import zipfile
 
 # -------------------------------------------------------------------
 # Configuration
@@ -17,7 +65,102 @@ import sys
 MD_FILE = os.path.join(os.path.dirname(__file__), "GAICOM-SYSTEM-DOCUMENTATION.md")
 HTML_FILE = os.path.join(os.path.dirname(__file__), "_doc_intermediate.html")
 PDF_FILE = os.path.join(os.path.dirname(__file__), "GAICOM-SYSTEM-DOCUMENTATION.pdf")
+SITE_DIR = os.path.join(os.path.dirname(__file__), "GAICOM-SYSTEM-DOCUMENTATION-site")
+EPUB_FILE = os.path.join(os.path.dirname(__file__), "GAICOM-SYSTEM-DOCUMENTATION.epub")
+SEARCH_INDEX_FILE = os.path.join(os.path.dirname(__file__), "GAICOM-SYSTEM-DOCUMENTATION.search.json.gz")
+OUTPUT_FORMATS = ("pdf", "html", "epub", "search")
+# Shown on the cover and written to the HTML, EPUB and search metadata
+DOCUMENT_TITLE = "GAICOM System Documentation"
+DOCUMENT_AUTHOR = "Tanish Kumar"
+DOCUMENT_PUBLISHER = "Generative AI Community (GAICOM)"
 CHROME_PATH = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
+# Tried in order when CHROME_PATH does not exist on this machine
+CHROME_CANDIDATES = [
+    "/Applications/Google Chrome.app/Contents/MacOS/Google Chrome",
+    "google-chrome",
+    "google-chrome-stable",
+    "chromium",
+    "chromium-browser",
+    "chrome",
+]
+
+# Bump whenever the generator's output changes for identical inputs,
+# so cached builds from older versions are not reused.
+GENERATOR_VERSION = "2.6"
+CACHE_DIR = os.path.join(os.path.dirname(__file__), ".doc-cache")
+MANIFEST_FILE = os.path.join(CACHE_DIR, "manifest.json")
+WATCH_POLL_INTERVAL = 0.25
+
+# Converted fragments, highlighted code, diagrams, optimized images, font
+# subsets, search postings and chunk PDFs share one content-addressed
+# store. Its directory can be copied between machines; past the size cap
+# the least recently used entries are evicted.
+ARTIFACT_DIR = os.path.join(CACHE_DIR, "artifacts")
+ARTIFACT_STORE_MAX_MB = 1024
+ARTIFACT_TRIM_RATIO = 0.9  # evict down to this fraction of the cap
+# In-memory diagram and highlight entries kept in front of the store
+MEMO_MAX_ENTRIES = 2048
+
+# Local fonts: drop Inter / JetBrains Mono .ttf/.otf/.woff/.woff2 files
+# (static "Inter-SemiBold.ttf" or variable "Inter[opsz,wght].ttf") here.
+# They are subset to the document's glyphs and embedded, so rendering
+# never waits on the network. `--download-fonts` fetches the OFL-licensed
+# fonts from Google Fonts into FONT_CACHE_DIR, which is used when FONT_DIR
+# has none. Builds never download; without either, the CSS fallback
+# fonts apply.
+FONT_DIR = os.path.join(os.path.dirname(__file__), "fonts")
+FONT_CACHE_DIR = os.path.join(CACHE_DIR, "fonts")
+FONT_DOWNLOAD_URL = (
+    "https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800;900"
+    "&family=JetBrains+Mono:wght@400;500;600"
+)
+FONT_DOWNLOAD_TIMEOUT = 10
+FONT_FAMILIES = {
+    "inter": "Inter",
+    "jetbrainsmono": "JetBrains Mono",
+}
+FONT_WEIGHTS = {
+    "thin": 100,
+    "extralight": 200,
+    "light": 300,
+    "regular": 400,
+    "medium": 500,
+    "semibold": 600,
+    "bold": 700,
+    "extrabold": 800,
+    "black": 900,
+}
+
+# Syntax highlighting (Pygments, optional). Highlighted blocks are cached
+# by (language, code); above the pool threshold, uncached blocks are lexed
+# in worker processes.
+HIGHLIGHT_STYLE = "github-dark"
+HIGHLIGHT_POOL_MIN_BLOCKS = 32
+LEXER_ALIASES = {
+    "js": "javascript",
+    "shell": "bash",
+    "sh": "bash",
+    "ts": "typescript",
+}
+PLAIN_CODE_LANGUAGES = {"text", "plain", "mermaid"}
+
+# Images are downsampled to this resolution at their printed width. The
+# content column is letter width minus the 0.85in side margins of @page.
+IMAGE_PRINT_DPI = 200
+IMAGE_JPEG_QUALITY = 82
+PRINT_CONTENT_WIDTH_PX = (8.5 - 2 * 0.85) * 96
+
+# Warm renderer: a background Chrome reached over the DevTools protocol
+CHROME_DEBUG_PORT = 9222
+CHROME_PROFILE_DIR = os.path.join(CACHE_DIR, "chrome-profile")
+PDF_STREAM_CHUNK = 1024 * 1024
+
+# Seconds a browser started before the HTML is ready waits for the document
+DOCUMENT_WAIT_TIMEOUT = 300
+
+# Render daemon (--serve): default loopback port and largest markdown body
+DAEMON_PORT = 8765
+DAEMON_MAX_BODY = 16 * 1024 * 1024
 
 # -------------------------------------------------------------------
 # CSS - Enhanced with better page handling and typography
@@ -27,8 +170,6 @@ CSS = r"""
    PRINT + SCREEN STYLES - Enhanced Version 2.0
    ============================================================ */
 
-@import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700;800;900&family=JetBrains+Mono:wght@400;500;600&display=swap');
-
 :root {
     --navy: #0F172A;
     --navy-light: #1E293B;
@@ -617,90 +758,11 @@ body {
     border-bottom: 2px solid var(--slate-200);
 }
 
-.flow-row {
-    display: flex;
-    justify-content: center;
-    align-items: center;
-    margin-bottom: 8px;
-    flex-wrap: wrap;
-    gap: 8px;
-}
-
-.flow-box {
-    background: var(--white);
-    border: 2px solid var(--slate-300);
-    border-radius: 8px;
-    padding: 10px 16px;
-    font-size: 9pt;
-    font-weight: 600;
-    color: var(--navy);
-    text-align: center;
-    min-width: 110px;
-    box-shadow: 0 2px 4px rgba(0,0,0,0.05);
-}
-
-.flow-box small {
-    display: block;
-    font-size: 7.5pt;
-    font-weight: 400;
-    color: var(--slate-500);
-    margin-top: 2px;
-}
-
-.flow-box.primary { 
-    border-color: var(--accent); 
-    background: linear-gradient(135deg, var(--accent-light) 0%, #EFF6FF 100%);
-}
-.flow-box.cloud { 
-    border-color: #818CF8; 
-    background: linear-gradient(135deg, #EEF2FF 0%, #F5F5FF 100%);
-}
-.flow-box.lambda { 
-    border-color: #F97316; 
-    background: linear-gradient(135deg, #FFF7ED 0%, #FFFAF5 100%);
-}
-.flow-box.ext { 
-    border-color: var(--success); 
-    background: linear-gradient(135deg, #ECFDF5 0%, #F5FFFA 100%);
-}
-
-.flow-arrow {
-    font-size: 16pt;
-    color: var(--slate-400);
-    font-weight: 400;
-}
-
-.flow-arrow-down {
+.flow-diagram svg {
     display: block;
-    text-align: center;
-    font-size: 16pt;
-    color: var(--slate-400);
-    font-weight: 400;
-    margin: 6px 0;
-}
-
-.diagram-legend {
-    margin-top: 16px;
-    text-align: center;
-    font-size: 8pt;
-    color: var(--slate-500);
-    padding-top: 12px;
-    border-top: 1px solid var(--slate-200);
-}
-
-.legend-item {
-    display: inline-flex;
-    align-items: center;
-    margin: 0 12px;
-}
-
-.legend-box {
-    display: inline-block;
-    width: 12px;
-    height: 12px;
-    border-radius: 3px;
-    margin-right: 5px;
-    border: 1.5px solid;
+    max-width: 100%;
+    height: auto;
+    margin: 0 auto;
 }
 
 /* ============================================================
@@ -782,303 +844,1625 @@ h2, h3, h4, h5, h6 {
 """
 
 # -------------------------------------------------------------------
-# Architecture diagram as styled HTML boxes
+# Tracing
 # -------------------------------------------------------------------
-ARCHITECTURE_DIAGRAM = """
-<div class="diagram-container">
-<div class="flow-diagram">
-    <h4>System Architecture Overview</h4>
-
-    <div class="flow-row">
-        <div class="flow-box primary">User / Browser</div>
-    </div>
-    <div class="flow-arrow-down">↓</div>
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class Tracer:
+    """Collects nested timing spans and exports them as Chrome trace events.
+
+    Each span records wall and CPU time plus any args the caller attaches,
+    such as input/output sizes. The JSON written by export() opens in
+    chrome://tracing or https://ui.perfetto.dev.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.origin = time.perf_counter()
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(args)
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield args
+        finally:
+            wall = time.perf_counter() - wall_start
+            args["cpu_ms"] = round((time.thread_time() - cpu_start) * 1000, 3)
+            stack.pop()
+            self._local.__dict__.get("events", self.events).append({
+                "name": name,
+                "ph": "X",
+                "ts": round((wall_start - self.origin) * 1e6, 1),
+                "dur": round(wall * 1e6, 1),
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": args,
+                "depth": len(stack),
+            })
+
+    def reset(self):
+        self.events = []
+        self.origin = time.perf_counter()
+
+    @contextlib.contextmanager
+    def capture(self):
+        """Collect the spans of this thread in a separate list, so
+        concurrent requests (in the render daemon) don't mix timings."""
+        events = self._local.events = []
+        try:
+            yield events
+        finally:
+            del self._local.events
+
+    def annotate(self, **args):
+        """Attach args to the innermost open span on this thread."""
+        stack = self._local.__dict__.get("stack")
+        if stack:
+            stack[-1].update(args)
+
+    def export(self, path):
+        events = [{k: v for k, v in e.items() if k != "depth"} for e in self.events]
+        atomic_write(path, json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}))
+
+    def summary(self, events=None):
+        """Top-level spans as (name, wall ms, cpu ms), in start order."""
+        events = self.events if events is None else events
+        top = sorted((e for e in events if e["depth"] == 0), key=lambda e: e["ts"])
+        return [(e["name"], e["dur"] / 1000, e["args"]["cpu_ms"]) for e in top]
+
+
+TRACER = Tracer()
+
+
+def children_rusage():
+    """(cpu seconds, peak RSS in MB) of reaped child processes, or None."""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # Linux reports ru_maxrss in kilobytes, macOS in bytes
+    peak = usage.ru_maxrss / (1024 * 1024) if sys.platform == "darwin" else usage.ru_maxrss / 1024
+    return usage.ru_utime + usage.ru_stime, peak
+
+
+def atomic_write(path, text):
+    """Write text to path via a temp file so readers never see a partial file.
+
+    text may also be an HtmlDocument (or any iterable of strings), which is
+    streamed part by part instead of being joined first.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        if isinstance(text, str):
+            f.write(text)
+        else:
+            f.writelines(text)
+    os.replace(tmp_path, path)
 
-    <div class="flow-row">
-        <div class="flow-box primary">AWS S3<br><small>Static Website — React SPA</small></div>
-        <span class="flow-arrow">←→</span>
-        <div class="flow-box cloud">Sanity Content API<br><small>CDN-backed GROQ</small></div>
-    </div>
-    <div class="flow-arrow-down">↓ POST requests</div>
 
-    <div class="flow-row">
-        <div class="flow-box lambda">AWS Lambda<br><small>Node.js 20.x Function URL</small></div>
-    </div>
-    <div class="flow-arrow-down">↓</div>
+# -------------------------------------------------------------------
+# Artifact store
+#
+# Entries are addressed by a hash of everything that produced them, so
+# a key is valid on any machine and an entry never needs invalidating.
+# Writes go to a temp file in the entry's directory and are renamed into
+# place, which is atomic between processes sharing the store: readers
+# see no entry or a complete one. Reads refresh an entry's mtime, which
+# orders the least-recently-used eviction.
+# -------------------------------------------------------------------
+def artifact_key(*parts):
+    """Hash strings (or bytes) into an artifact key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class ArtifactStore:
+    """On-disk cache of build intermediates, shared by every stage.
+
+    Entries are byte strings stored as <root>/<namespace>/<key[:2]>/<key>.
+    The store is best effort: a failed write only loses the entry. Hits
+    and misses are counted per namespace for report().
+    """
+
+    def __init__(self, root=ARTIFACT_DIR, max_mb=ARTIFACT_STORE_MAX_MB):
+        self.root = root
+        self.max_bytes = max_mb * 1024 * 1024
+        self.stats = {}
+        self.evicted = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    def path(self, namespace, key):
+        return os.path.join(self.root, namespace, key[:2], key)
+
+    def _count(self, namespace, field, amount=1):
+        with self._lock:
+            counts = self.stats.setdefault(namespace, {"hits": 0, "misses": 0, "writes": 0, "bytes_written": 0})
+            counts[field] += amount
+
+    def get(self, namespace, key):
+        """The entry's bytes, or None on a miss."""
+        path = self.path(namespace, key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            self._count(namespace, "misses")
+            return None
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        self._count(namespace, "hits")
+        return data
+
+    def get_text(self, namespace, key):
+        data = self.get(namespace, key)
+        return None if data is None else data.decode("utf-8")
+
+    def put(self, namespace, key, data):
+        """Store bytes under key, evicting old entries past the size cap.
+        Returns whether the entry was written."""
+        path = self.path(namespace, key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        except OSError:
+            return False
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # A rewrite of an existing entry only changes the size by the difference
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+        except OSError:
+            # Out of space, or (on Windows) another process has the same
+            # entry open; either way the build goes on without it
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            return False
+        self._count(namespace, "writes")
+        self._count(namespace, "bytes_written", len(data))
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(data) - replaced
+            over = self._size > self.max_bytes
+        if over:
+            self.trim(int(self.max_bytes * ARTIFACT_TRIM_RATIO))
+        return True
+
+    def put_text(self, namespace, key, text):
+        return self.put(namespace, key, text.encode("utf-8"))
+
+    def _entries(self):
+        """[(mtime_ns, size, path)] of every file under the root."""
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:  # evicted by another process meanwhile
+                    continue
+                entries.append((st.st_mtime_ns, st.st_size, path))
+        return entries
+
+    def trim(self, max_bytes=None):
+        """Delete least recently used entries until the store fits in
+        max_bytes (default: the cap). Returns the number of bytes freed."""
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            freed = 0
+            for _, size, path in entries:
+                if total - freed <= limit:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    continue
+                freed += size
+                self.evicted += 1
+            self._size = total - freed
+        return freed
+
+    def report(self):
+        """One-line hit/miss summary, or "" when nothing was looked up."""
+        hits = sum(c["hits"] for c in self.stats.values())
+        lookups = hits + sum(c["misses"] for c in self.stats.values())
+        if not lookups:
+            return ""
+        per_namespace = ", ".join(
+            f"{name} {c['hits']}/{c['hits'] + c['misses']}" for name, c in sorted(self.stats.items())
+        )
+        line = f"Artifact cache: {hits}/{lookups} hits ({per_namespace})"
+        if self.evicted:
+            line += f", evicted {self.evicted} entries"
+        return line
+
+
+ARTIFACTS = ArtifactStore()
+
+
+class BoundedMemo:
+    """Thread-safe in-memory LRU map of at most max_entries items.
+
+    Keeps repeated lookups off the store within one process without
+    growing for the life of a long-running daemon.
+    """
+
+    def __init__(self, max_entries=MEMO_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._items = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def __len__(self):
+        return len(self._items)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+def use_artifact_store(root=None, max_mb=None):
+    """Point the shared store at another directory and/or size cap.
+
+    Also the initializer of batch worker processes, which do not inherit
+    the parent's settings on platforms that spawn them.
+    """
+    if root:
+        ARTIFACTS.root = os.path.abspath(root)
+        ARTIFACTS._size = None
+    if max_mb is not None:
+        ARTIFACTS.max_bytes = max_mb * 1024 * 1024
 
-    <div class="flow-row">
-        <div class="flow-box ext">Stripe API<br><small>Checkout Sessions</small></div>
-        <div class="flow-box ext">Stripe Webhooks<br><small>Payment Events</small></div>
-        <div class="flow-box ext">Google Sheets<br><small>Newsletter Storage</small></div>
-    </div>
 
-    <div class="diagram-legend">
-        <span class="legend-item"><span class="legend-box" style="background:#DBEAFE; border-color:#3B82F6;"></span>Frontend</span>
-        <span class="legend-item"><span class="legend-box" style="background:#EEF2FF; border-color:#818CF8;"></span>CMS</span>
-        <span class="legend-item"><span class="legend-box" style="background:#FFF7ED; border-color:#F97316;"></span>Serverless</span>
-        <span class="legend-item"><span class="legend-box" style="background:#ECFDF5; border-color:#10B981;"></span>External Services</span>
-    </div>
-</div>
-</div>
-"""
+# -------------------------------------------------------------------
+# Markdown conversion
+# -------------------------------------------------------------------
+def read_markdown(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
 
-PAYMENT_FLOW_DIAGRAM = """
-<div class="diagram-container">
-<div class="flow-diagram">
-    <h4>Donation Payment Flow</h4>
-    <div class="flow-row">
-        <div class="flow-box primary">1. User selects amount<br><small>/donate page</small></div>
-        <span class="flow-arrow">→</span>
-        <div class="flow-box lambda">2. Create checkout session<br><small>Lambda validates amount</small></div>
-        <span class="flow-arrow">→</span>
-        <div class="flow-box ext">3. Stripe Checkout<br><small>Hosted payment page</small></div>
-    </div>
-    <div class="flow-arrow-down">↓ On success</div>
-    <div class="flow-row">
-        <div class="flow-box primary">4. Success redirect<br><small>/donate/success</small></div>
-        <span class="flow-arrow">&nbsp;&nbsp;&nbsp;</span>
-        <div class="flow-box ext">5. Webhook → Lambda<br><small>Logs to CloudWatch</small></div>
-    </div>
-</div>
-</div>
-"""
 
-NEWSLETTER_FLOW_DIAGRAM = """
-<div class="diagram-container">
-<div class="flow-diagram">
-    <h4>Newsletter Signup Flow</h4>
-    <div class="flow-row">
-        <div class="flow-box primary">1. User fills form<br><small>Name + Email</small></div>
-        <span class="flow-arrow">→</span>
-        <div class="flow-box lambda">2. POST /newsletter<br><small>Lambda validates</small></div>
-        <span class="flow-arrow">→</span>
-        <div class="flow-box ext">3. Google Sheets API<br><small>Appends row</small></div>
-    </div>
-    <div class="flow-arrow-down">↓</div>
-    <div class="flow-row">
-        <div class="flow-box primary">4. Success message<br><small>"Thank you for subscribing!"</small></div>
-    </div>
-</div>
-</div>
-"""
+_MARKDOWN = threading.local()
+
+
+def _markdown_converter():
+    """Per-thread python-markdown instance, reused across conversions."""
+    md = getattr(_MARKDOWN, "md", None)
+    if md is None:
+        extensions = [
+            "markdown.extensions.tables",
+            "markdown.extensions.fenced_code",
+            "markdown.extensions.codehilite",
+            "markdown.extensions.toc",
+            "markdown.extensions.attr_list",
+            "markdown.extensions.md_in_html",
+        ]
+        ext_configs = {
+            "markdown.extensions.toc": {"permalink": False, "toc_depth": "2-4"},
+            "markdown.extensions.codehilite": {"use_pygments": False},
+        }
+        md = _MARKDOWN.md = markdown.Markdown(extensions=extensions, extension_configs=ext_configs)
+    return md
 
-CONTENT_FLOW_DIAGRAM = """
-<div class="diagram-container">
-<div class="flow-diagram">
-    <h4>CMS Content Flow</h4>
-    <div class="flow-row">
-        <div class="flow-box cloud">1. Admin edits<br><small>Sanity Studio</small></div>
-        <span class="flow-arrow">→</span>
-        <div class="flow-box cloud">2. Publish<br><small>→ Sanity CDN</small></div>
-        <span class="flow-arrow">→</span>
-        <div class="flow-box primary">3. Browser fetches<br><small>GROQ query</small></div>
-        <span class="flow-arrow">→</span>
-        <div class="flow-box primary">4. React renders<br><small>or fallback</small></div>
-    </div>
-</div>
-</div>
-"""
 
+def convert_markdown(md_text):
+    """Convert markdown to HTML using python-markdown.
 
-def read_markdown(path):
-    with open(path, "r", encoding="utf-8") as f:
-        return f.read()
+    Returns (html, toc_tokens); toc_tokens are the nested heading tokens
+    from the toc extension, carrying the same ids as the rendered HTML.
+    """
+    md = _markdown_converter()
+    try:
+        html = md.convert(md_text)
+        toc_tokens = md.toc_tokens
+    finally:
+        md.reset()
+    return html, toc_tokens
 
 
 def convert_md_to_html(md_text):
     """Convert markdown to HTML using python-markdown."""
-    extensions = [
-        "markdown.extensions.tables",
-        "markdown.extensions.fenced_code",
-        "markdown.extensions.codehilite",
-        "markdown.extensions.toc",
-        "markdown.extensions.attr_list",
-        "markdown.extensions.md_in_html",
-    ]
-    ext_configs = {
-        "markdown.extensions.toc": {"permalink": False, "toc_depth": "2-4"},
-        "markdown.extensions.codehilite": {"use_pygments": False},
-    }
-    html = markdown.markdown(md_text, extensions=extensions, extension_configs=ext_configs)
-    return html
+    return convert_markdown(md_text)[0]
 
 
-def build_toc_from_md(md_text):
-    """Extract headings from markdown for the table of contents."""
-    toc_items = []
+_FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})(.*)$")
+
+
+def split_chapters(md_text):
+    """Split markdown at `## N.` chapter headings, ignoring fenced code.
+
+    A fence closes only on a run of the same character at least as long
+    as the one that opened it, so ``` lines inside a ~~~ block (or a
+    longer fence) stay code. The first chunk is the preamble before
+    chapter 1 (title and intro).
+    """
+    chapters = []
+    current = []
+    fence = None
     for line in md_text.split("\n"):
-        m = re.match(r"^(#{2,3})\s+(.+)", line)
-        if m:
-            level = len(m.group(1))
-            title = m.group(2).strip()
-            # Create an id from the title
-            slug = re.sub(r"[^a-z0-9]+", "-", title.lower()).strip("-")
-            toc_items.append((level, title, slug))
-    return toc_items
+        m = _FENCE_RE.match(line)
+        if fence:
+            if m and m.group(1)[0] == fence[0] and len(m.group(1)) >= len(fence) and not m.group(2).strip():
+                fence = None
+        elif m:
+            fence = m.group(1)
+        elif re.match(r"^##\s+\d+\.", line) and current:
+            chapters.append("\n".join(current))
+            current = []
+        current.append(line)
+    chapters.append("\n".join(current))
+    return chapters
+
+
+def fragment_key(chapter_md):
+    """Hash a chapter together with everything its HTML depends on."""
+    digest = hashlib.sha256()
+    for part in (
+        GENERATOR_VERSION,
+        chapter_md,
+        highlight_signature(),
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _flatten_toc_tokens(tokens):
+    for token in tokens:
+        yield token
+        yield from _flatten_toc_tokens(token["children"])
+
+
+_HEADING_ID_RE = re.compile(r'(<h[1-6]\b[^>]*?\sid=")([^"]*)"')
+_LOCAL_HREF_RE = re.compile(r'(\shref="#)([^"]*)"')
+
+
+def _unique_heading_ids(html, tokens, seen_ids):
+    """Rename heading ids already used by an earlier chapter.
+
+    Chapters are converted separately, so the toc extension can only keep
+    ids unique within one chapter; this applies its "_N" suffix rule
+    across the whole document. Links within the chapter to a renamed
+    heading are updated to match. Returns (html, {old id: new id}).
+    """
+    chapter_tokens = list(_flatten_toc_tokens(tokens))
+    taken = seen_ids | {token["id"] for token in chapter_tokens}
+    renames = {}
+    for token in chapter_tokens:
+        new_id = token["id"]
+        if new_id in seen_ids:
+            while new_id in taken:
+                m = re.match(r"^(.*)_(\d+)$", new_id)
+                new_id = f"{m.group(1)}_{int(m.group(2)) + 1}" if m else f"{new_id}_1"
+            taken.add(new_id)
+            renames[token["id"]] = new_id
+            token["id"] = new_id
+    seen_ids.update(taken)
+    if renames:
+        html = _HEADING_ID_RE.sub(lambda m: m.group(1) + renames.get(m.group(2), m.group(2)) + '"', html)
+        html = _LOCAL_HREF_RE.sub(lambda m: m.group(1) + renames.get(m.group(2), m.group(2)) + '"', html)
+    return html, renames
+
+
+def _warn_ambiguous_links(fragments, chapter_tokens, renamed):
+    """Report links from other chapters to a heading id that several
+    chapters use; they go to the first heading with that id."""
+    owner = {}
+    for index, tokens in enumerate(chapter_tokens):
+        for token in _flatten_toc_tokens(tokens):
+            owner.setdefault(token["id"], index)
+    for index, html in enumerate(fragments):
+        for m in _LOCAL_HREF_RE.finditer(html):
+            target = m.group(2)
+            if target in renamed and index != owner.get(target) and index not in renamed[target]:
+                print(f"  ⚠ Link to #{target} in chapter {index} is ambiguous: "
+                      f"{len(renamed[target]) + 1} headings use that id; it goes to the first")
+
+
+def convert_chapters(chapters, store=ARTIFACTS):
+    """Convert and post-process each chapter, caching fragments in the store.
+
+    Code blocks of newly converted chapters are highlighted together, so a
+    large document can spread them over the highlighting pool.
+
+    Returns (fragments, toc_tokens, converted): the HTML per chapter, the
+    heading tokens of the whole document, and how many chapters were not
+    found in the cache.
+    """
+    fragments = []
+    chapter_tokens = []
+    pending = []
+    for index, chapter_md in enumerate(chapters):
+        with TRACER.span(f"chapter {index}", input_chars=len(chapter_md)) as span:
+            key = fragment_key(chapter_md)
+            try:
+                cached = json.loads(store.get_text("fragments", key))
+                html, tokens = cached["html"], cached["toc"]
+                span["cached"] = True
+            except (TypeError, ValueError, KeyError):
+                with TRACER.span("convert_markdown", input_chars=len(chapter_md)) as sub:
+                    html, tokens = convert_markdown(chapter_md)
+                    sub["output_chars"] = len(html)
+                with TRACER.span("postprocess_html", input_chars=len(html)) as sub:
+                    html = postprocess_html(html)
+                    sub["output_chars"] = len(html)
+                pending.append((index, key))
+                span["cached"] = False
+            fragments.append(html)
+            chapter_tokens.append(tokens)
+            span["output_chars"] = len(html)
+
+    if pending:
+        with TRACER.span("highlight_code_blocks") as span:
+            highlighted, lexed = highlight_code_blocks([fragments[i] for i, _ in pending], store)
+            span["lexed_blocks"] = lexed
+        for (index, key), html in zip(pending, highlighted):
+            fragments[index] = html
+            store.put_text("fragments", key, json.dumps({"html": html, "toc": chapter_tokens[index]}))
+
+    toc_tokens = []
+    seen_ids = set()
+    renamed = {}
+    for index, tokens in enumerate(chapter_tokens):
+        fragments[index], renames = _unique_heading_ids(fragments[index], tokens, seen_ids)
+        for old_id in renames:
+            renamed.setdefault(old_id, set()).add(index)
+        toc_tokens.extend(tokens)
+    if renamed:
+        _warn_ambiguous_links(fragments, chapter_tokens, renamed)
+    return fragments, toc_tokens, len(pending)
+
+
+def build_toc_from_tokens(toc_tokens, levels=(2, 3)):
+    """Flatten parser heading tokens into (level, title_html, id) TOC items."""
+    return [
+        (token["level"], token["name"], token["id"])
+        for token in _flatten_toc_tokens(toc_tokens)
+        if token["level"] in levels
+    ]
 
 
 def build_toc_html(toc_items):
     """Build the TOC page HTML with two columns."""
-    html = '<div class="toc-page">\n'
-    html += '  <h2>Table of Contents</h2>\n'
-    html += '  <div class="toc-underline"></div>\n'
-    html += '  <div class="toc-columns">\n'
-
+    lines = [
+        '<div class="toc-page">\n',
+        '  <h2>Table of Contents</h2>\n',
+        '  <div class="toc-underline"></div>\n',
+        '  <div class="toc-columns">\n',
+    ]
     for level, title, slug in toc_items:
         css_class = f"level-{level - 1}"
-        html += f'    <div class="toc-section {css_class}"><a href="#{slug}">{title}</a></div>\n'
+        lines.append(f'    <div class="toc-section {css_class}"><a href="#{slug}">{title}</a></div>\n')
+    lines.append('  </div>\n')
+    lines.append("</div>\n")
+    return "".join(lines)
 
-    html += '  </div>\n'
-    html += "</div>\n"
-    return html
 
+# -------------------------------------------------------------------
+# Mermaid flowcharts as static SVG
+#
+# Covers the flowchart subset the documentation uses: graph/flowchart
+# headers with a direction, [] () ([]) (()) {} node shapes, edge chains
+# (-->, ---, -.->, ==>, with |labels|), "&" node groups, subgraphs,
+# classDef / class / :::class, and a "title:" front matter block.
+# Layout is layered: ranks are breadth-first distances from the roots,
+# each rank is ordered by barycenter, and every subgraph is laid out on
+# its own and placed as a single box. No JavaScript runs at render time.
+# -------------------------------------------------------------------
+class MermaidError(ValueError):
+    """Raised for mermaid source outside the supported flowchart subset."""
 
-def inject_architecture_diagram(html):
-    """Replace mermaid code block with our styled architecture diagram."""
-    # Find the mermaid code block and replace with our styled diagram
-    # The mermaid block starts with ```mermaid and ends with ```
-    pattern = r"<pre><code[^>]*>graph TD.*?</code></pre>"
-    html = re.sub(pattern, ARCHITECTURE_DIAGRAM, html, flags=re.DOTALL)
-    return html
 
+MERMAID_SHAPES = {
+    "([": ("])", "stadium"),
+    "((": ("))", "circle"),
+    "[": ("]", "rect"),
+    "(": (")", "round"),
+    "{": ("}", "diamond"),
+}
+DIAGRAM_FONT = "Inter, -apple-system, 'Segoe UI', sans-serif"
+DIAGRAM_COLORS = {
+    "fill": "#FFFFFF",
+    "stroke": "#CBD5E1",
+    "color": "#0F172A",
+    "subtext": "#64748B",
+    "edge": "#94A3B8",
+    "cluster_fill": "#F8FAFC",
+    "cluster_stroke": "#E2E8F0",
+}
+NODE_PAD_X = 16
+NODE_PAD_Y = 10
+NODE_MIN_WIDTH = 110
+NODE_GAP = 24
+RANK_GAP = 40
+LABELLED_RANK_GAP = 64
+CLUSTER_PAD = 14
+CLUSTER_TITLE = 18
+DIAGRAM_MARGIN = 4
+
+_MERMAID_FRONT_MATTER_RE = re.compile(r"\A\s*---\n(.*?)\n---\n", re.S)
+_MERMAID_HEADER_RE = re.compile(r"(?:graph|flowchart)(?:\s+(TD|TB|BT|LR|RL))?", re.I)
+_MERMAID_ID_RE = re.compile(r"\s*(\w+)")
+_MERMAID_CLASS_RE = re.compile(r":::([\w-]+)")
+_MERMAID_AND_RE = re.compile(r"\s*&")
+_MERMAID_EDGE_RE = re.compile(
+    r"\s*(?:"
+    r"(?P<op>-{2,}>|-{3,}|-\.+->|-\.+-|={2,}>|={3,})(?:\|(?P<label>[^|]*)\|)?"
+    r"|(?P<open>--|==|-\.)\s*(?P<text>[^-=.>|][^|]*?)\s*"
+    r"(?P<close>-{2,}>|-{3,}|\.+->|\.+-|={2,}>|={3,})"
+    r")"
+)
+_MERMAID_SUBGRAPH_RE = re.compile(r'(\w+)\s*\[\s*"?(.*?)"?\s*\]|"(.*)"|(.*)')
+_MERMAID_BR_RE = re.compile(r"<br\s*/?>", re.I)
+_DIAGRAM_MEMO = BoundedMemo()
+
+
+class Flowchart:
+    """A parsed mermaid flowchart: nodes, edges and nested subgraphs.
+
+    Groups map a subgraph id (None for the top level) to its title,
+    direction and items; an item is ("node", id) or ("group", id).
+    """
+
+    def __init__(self, direction="TD", title=""):
+        self.direction = direction
+        self.title = title
+        self.nodes = {}
+        self.edges = []
+        self.groups = {None: {"title": "", "direction": direction, "items": []}}
+        self.parent = {}
+        self.class_defs = {}
+
+    def node(self, nid, group, label=None, shape=None):
+        """Return node nid, creating it in group on first mention."""
+        node = self.nodes.get(nid)
+        if node is None:
+            node = self.nodes[nid] = {"label": nid, "shape": "rect", "classes": []}
+            self.groups[group]["items"].append(("node", nid))
+            self.parent[("node", nid)] = group
+        if label is not None:
+            node["label"], node["shape"] = label.strip(), shape
+        return node
+
+    def add_group(self, spec, parent):
+        m = _MERMAID_SUBGRAPH_RE.fullmatch(spec)
+        if m.group(1):
+            gid, title = m.group(1), m.group(2)
+        elif m.group(3) is not None:
+            gid, title = None, m.group(3)
+        else:
+            gid, title = m.group(4), m.group(4)
+        if not gid or gid in self.groups:
+            gid = f"subgraph-{len(self.groups)}"
+        self.groups[gid] = {"title": title, "direction": self.groups[parent]["direction"], "items": []}
+        self.groups[parent]["items"].append(("group", gid))
+        self.parent[("group", gid)] = parent
+        return gid
+
+    def item_in(self, gid, nid):
+        """The item of group gid that contains node nid, or None."""
+        item = ("node", nid)
+        while item in self.parent:
+            parent = self.parent[item]
+            if parent == gid:
+                return item
+            if parent is None:
+                return None
+            item = ("group", parent)
+        return None
+
+
+def parse_mermaid(source):
+    """Parse mermaid flowchart source into a Flowchart."""
+    title = ""
+    m = _MERMAID_FRONT_MATTER_RE.match(source)
+    if m:
+        for line in m.group(1).splitlines():
+            key, _, value = line.partition(":")
+            if key.strip() == "title":
+                title = value.strip().strip("\"'")
+        source = source[m.end():]
+    lines = [line.strip().rstrip(";").strip() for line in source.splitlines()]
+    lines = [line for line in lines if line and not line.startswith("%%")]
+    if not lines:
+        raise MermaidError("empty diagram")
+    header = _MERMAID_HEADER_RE.fullmatch(lines[0])
+    if not header:
+        raise MermaidError(f"unsupported diagram type: {lines[0].split()[0]}")
+
+    chart = Flowchart((header.group(1) or "TD").upper(), title)
+    stack = [None]
+    for line in lines[1:]:
+        keyword, _, rest = line.partition(" ")
+        rest = rest.strip()
+        if keyword == "subgraph":
+            stack.append(chart.add_group(rest, stack[-1]))
+        elif line == "end":
+            if len(stack) == 1:
+                raise MermaidError("'end' without a subgraph")
+            stack.pop()
+        elif keyword == "direction":
+            chart.groups[stack[-1]]["direction"] = rest.upper()
+        elif keyword == "classDef":
+            names, _, styles = rest.partition(" ")
+            style = {}
+            for prop in styles.split(","):
+                key, _, value = prop.partition(":")
+                style[key.strip()] = value.strip()
+            for name in names.split(","):
+                chart.class_defs[name] = style
+        elif keyword == "class":
+            ids, _, name = rest.rpartition(" ")
+            for nid in ids.split(","):
+                chart.node(nid.strip(), stack[-1])["classes"].append(name)
+        elif keyword in ("style", "linkStyle", "click"):
+            continue
+        else:
+            _parse_mermaid_chain(chart, line, stack[-1])
+    if len(stack) != 1:
+        raise MermaidError("unclosed subgraph")
+    return chart
+
+
+def _parse_mermaid_nodes(chart, line, pos, group):
+    """Parse "A[label]:::cls & B" at pos; returns (node ids, new pos)."""
+    ids = []
+    while True:
+        m = _MERMAID_ID_RE.match(line, pos)
+        if not m:
+            raise MermaidError(f"expected a node: {line}")
+        nid, pos = m.group(1), m.end()
+        label = shape = None
+        for opener, (closer, name) in MERMAID_SHAPES.items():
+            if not line.startswith(opener, pos):
+                continue
+            start = pos + len(opener)
+            if line.startswith('"', start):
+                end = line.find('"', start + 1)
+                label, close_at = line[start + 1:end], end + 1
+                if end < 0 or not line.startswith(closer, close_at):
+                    raise MermaidError(f"unclosed node label: {line}")
+            else:
+                close_at = line.find(closer, start)
+                if close_at < 0:
+                    raise MermaidError(f"unclosed node label: {line}")
+                label = line[start:close_at]
+            pos, shape = close_at + len(closer), name
+            break
+        node = chart.node(nid, group, label, shape)
+        m = _MERMAID_CLASS_RE.match(line, pos)
+        if m:
+            node["classes"].append(m.group(1))
+            pos = m.end()
+        ids.append(nid)
+        m = _MERMAID_AND_RE.match(line, pos)
+        if not m:
+            return ids, pos
+        pos = m.end()
+
+
+def _parse_mermaid_chain(chart, line, group):
+    """Parse a node statement or an edge chain such as "A -->|x| B --> C"."""
+    sources, pos = _parse_mermaid_nodes(chart, line, 0, group)
+    while line[pos:].strip():
+        m = _MERMAID_EDGE_RE.match(line, pos)
+        if not m:
+            raise MermaidError(f"cannot parse: {line}")
+        if m.group("op"):
+            op, label = m.group("op"), m.group("label")
+        else:
+            op, label = m.group("open") + m.group("close"), m.group("text")
+        targets, pos = _parse_mermaid_nodes(chart, line, m.end(), group)
+        style = "dotted" if "." in op else "thick" if "=" in op else "solid"
+        for src in sources:
+            for dst in targets:
+                chart.edges.append({
+                    "src": src,
+                    "dst": dst,
+                    "label": (label or "").strip(),
+                    "style": style,
+                    "arrow": op.endswith(">"),
+                })
+        sources = targets
+
+
+def _text_width(text, size):
+    """Approximate width of text set in the diagram font."""
+    width = 0.0
+    for ch in text:
+        if ch in "il.,:;|!'`()[]{}/ ":
+            width += 0.32
+        elif ch in "mwMW@":
+            width += 0.86
+        elif ch.isupper():
+            width += 0.66
+        elif ch.isdigit():
+            width += 0.56
+        else:
+            width += 0.53
+    return width * size
+
+
+def _label_lines(label):
+    return [line.strip() for line in _MERMAID_BR_RE.split(label)]
+
+
+def _node_size(node):
+    lines = _label_lines(node["label"])
+    text_w = max([_text_width(lines[0], 11) * 1.06] + [_text_width(line, 9) for line in lines[1:]])
+    w = max(NODE_MIN_WIDTH, text_w + 2 * NODE_PAD_X)
+    h = 14 + 12 * (len(lines) - 1) + 2 * NODE_PAD_Y
+    if node["shape"] == "circle":
+        w = h = max(w, h)
+    elif node["shape"] == "diamond":
+        w, h = w + h, h * 1.6
+    return w, h
+
+
+def _rank_items(items, links):
+    """Assign layer ranks to items.
+
+    A breadth-first walk from the roots (items without incoming links, or
+    the first unvisited item when only cycles remain) fixes a visit order.
+    Links that go forward in that order are kept, which breaks cycles,
+    and each item is ranked one below its deepest kept predecessor.
+    Sources are then pulled down next to their nearest successor.
+    """
+    successors = {item: [] for item in items}
+    has_incoming = set()
+    for a, b in links:
+        successors[a].append(b)
+        has_incoming.add(b)
+    visit = {}
+    queue = [item for item in items if item not in has_incoming]
+    while len(visit) < len(items):
+        if not queue:
+            queue = [next(item for item in items if item not in visit)]
+        for item in queue:
+            visit.setdefault(item, len(visit))
+        for item in queue:
+            for nxt in successors[item]:
+                if nxt not in visit:
+                    visit[nxt] = len(visit)
+                    queue.append(nxt)
+        queue = []
+
+    order = sorted(items, key=visit.get)
+    forward = {item: [b for b in successors[item] if visit[b] > visit[item]] for item in items}
+    rank = dict.fromkeys(items, 0)
+    has_predecessor = set()
+    for item in order:
+        for nxt in forward[item]:
+            rank[nxt] = max(rank[nxt], rank[item] + 1)
+            has_predecessor.add(nxt)
+    for item in reversed(order):
+        if item not in has_predecessor and forward[item]:
+            rank[item] = min(rank[b] for b in forward[item]) - 1
+    return rank
+
+
+def _layout_group(chart, gid):
+    """Lay out one group; returns its size plus node and cluster rects
+    (x, y, w, h) relative to the group's top-left corner."""
+    group = chart.groups[gid]
+    items = group["items"]
+    if not items:
+        return {"w": 0, "h": 0, "nodes": {}, "clusters": []}
+    sizes, inner = {}, {}
+    for item in items:
+        if item[0] == "node":
+            sizes[item] = _node_size(chart.nodes[item[1]])
+        else:
+            sub = inner[item] = _layout_group(chart, item[1])
+            sizes[item] = (sub["w"] + 2 * CLUSTER_PAD, sub["h"] + 2 * CLUSTER_PAD + CLUSTER_TITLE)
+
+    links = []
+    labelled = False
+    for edge in chart.edges:
+        a, b = chart.item_in(gid, edge["src"]), chart.item_in(gid, edge["dst"])
+        if a is not None and b is not None and a != b:
+            links.append((a, b))
+            labelled = labelled or bool(edge["label"])
+    neighbours = {item: [] for item in items}
+    for a, b in links:
+        neighbours[a].append(b)
+        neighbours[b].append(a)
+
+    rank = _rank_items(items, links)
+    layers = [[] for _ in range(max(rank.values()) + 1)]
+    for item in items:
+        layers[rank[item]].append(item)
+
+    def reorder(layer, ref):
+        pos = {item: i for i, item in enumerate(ref)}
+
+        def barycenter(pair):
+            linked = [pos[n] for n in neighbours[pair[1]] if n in pos]
+            return sum(linked) / len(linked) if linked else pair[0]
+
+        layer[:] = [item for _, item in sorted(enumerate(layer), key=barycenter)]
+
+    for _ in range(2):
+        for r in range(1, len(layers)):
+            reorder(layers[r], layers[r - 1])
+        for r in range(len(layers) - 2, -1, -1):
+            reorder(layers[r], layers[r + 1])
+
+    # (main, cross) extents: main runs along the ranks
+    vertical = group["direction"] in ("TD", "TB", "BT")
+    extent = {item: (h, w) if vertical else (w, h) for item, (w, h) in sizes.items()}
+    cross = {}
+    for layer in layers:
+        centers, cursor = {}, None
+        desired = {}
+        for item in layer:
+            linked = [cross[n] for n in neighbours[item] if n in cross]
+            if linked:
+                desired[item] = sum(linked) / len(linked)
+        for item in layer:
+            half = extent[item][1] / 2
+            lowest = half if cursor is None else cursor + NODE_GAP + half
+            centers[item] = max(desired.get(item, lowest), lowest)
+            cursor = centers[item] + half
+        if desired:
+            shift = sum(desired[item] - centers[item] for item in desired) / len(desired)
+            centers = {item: c + shift for item, c in centers.items()}
+        cross.update(centers)
+    low = min(cross[item] - extent[item][1] / 2 for item in items)
+    cross_total = max(cross[item] + extent[item][1] / 2 for item in items) - low
+
+    gap = LABELLED_RANK_GAP if labelled else RANK_GAP
+    main, start = {}, 0.0
+    for layer in layers:
+        thickness = max(extent[item][0] for item in layer)
+        for item in layer:
+            main[item] = start + thickness / 2
+        start += thickness + gap
+    main_total = start - gap
+    if group["direction"] in ("BT", "RL"):
+        main = {item: main_total - m for item, m in main.items()}
+
+    result = {"nodes": {}, "clusters": []}
+    result["w"], result["h"] = (cross_total, main_total) if vertical else (main_total, cross_total)
+    for item in items:
+        w, h = sizes[item]
+        cx, cy = (cross[item] - low, main[item]) if vertical else (main[item], cross[item] - low)
+        x, y = cx - w / 2, cy - h / 2
+        if item[0] == "node":
+            result["nodes"][item[1]] = (x, y, w, h)
+            continue
+        sub = inner[item]
+        result["clusters"].append((x, y, w, h, chart.groups[item[1]]["title"]))
+        dx, dy = x + CLUSTER_PAD, y + CLUSTER_PAD + CLUSTER_TITLE
+        for nid, (nx, ny, nw, nh) in sub["nodes"].items():
+            result["nodes"][nid] = (nx + dx, ny + dy, nw, nh)
+        for cx_, cy_, cw, ch, title in sub["clusters"]:
+            result["clusters"].append((cx_ + dx, cy_ + dy, cw, ch, title))
+    return result
+
+
+_SIDE_NORMALS = {"top": (0, -1), "bottom": (0, 1), "left": (-1, 0), "right": (1, 0)}
+
+
+def _edge_sides(a, b, vertical):
+    """Which sides of rects a and b an edge from a to b leaves and enters."""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    if vertical:
+        if by >= ay + ah:
+            return "bottom", "top"
+        if by + bh <= ay:
+            return "top", "bottom"
+        return ("right", "left") if bx + bw / 2 >= ax + aw / 2 else ("left", "right")
+    if bx >= ax + aw:
+        return "right", "left"
+    if bx + bw <= ax:
+        return "left", "right"
+    return ("bottom", "top") if by + bh / 2 >= ay + ah / 2 else ("top", "bottom")
+
+
+def _route_edges(chart, rects):
+    """Cubic bezier control points for every edge, with the edges that
+    share a side of a node spread across it in the order of their other
+    ends so they do not cross at the node."""
+    vertical = chart.direction in ("TD", "TB", "BT")
+    ports = {}
+    routes = []
+    for index, edge in enumerate(chart.edges):
+        a, b = rects[edge["src"]], rects[edge["dst"]]
+        if edge["src"] == edge["dst"]:
+            routes.append(None)
+            continue
+        sides = _edge_sides(a, b, vertical)
+        routes.append(sides)
+        for end, (nid, other) in enumerate(((edge["src"], b), (edge["dst"], a))):
+            side = sides[end]
+            along = other[0] + other[2] / 2 if side in ("top", "bottom") else other[1] + other[3] / 2
+            ports.setdefault((nid, side), []).append((along, index, end))
+
+    points = {}
+    for (nid, side), entries in ports.items():
+        x, y, w, h = rects[nid]
+        entries.sort()
+        for k, (_, index, end) in enumerate(entries):
+            t = 0.15 + 0.7 * (k + 1) / (len(entries) + 1)
+            if side in ("top", "bottom"):
+                points[index, end] = (x + w * t, y if side == "top" else y + h)
+            else:
+                points[index, end] = (x if side == "left" else x + w, y + h * t)
+
+    curves = []
+    for index, sides in enumerate(routes):
+        if sides is None:
+            curves.append(None)
+            continue
+        p0, p3 = points[index, 0], points[index, 1]
+        n0, n3 = _SIDE_NORMALS[sides[0]], _SIDE_NORMALS[sides[1]]
+        reach = max(16.0, (abs(p3[1] - p0[1]) if n0[0] == 0 else abs(p3[0] - p0[0])) / 2)
+        c1 = (p0[0] + n0[0] * reach, p0[1] + n0[1] * reach)
+        c2 = (p3[0] + n3[0] * reach, p3[1] + n3[1] * reach)
+        curves.append((p0, c1, c2, p3))
+    return curves
+
+
+def _bezier_point(curve, t):
+    p0, c1, c2, p3 = curve
+    u = 1 - t
+    return tuple(u ** 3 * p0[i] + 3 * u * u * t * c1[i] + 3 * u * t * t * c2[i] + t ** 3 * p3[i] for i in (0, 1))
+
+
+def _overlaps(box, other):
+    return box[0] < other[0] + other[2] and other[0] < box[0] + box[2] and \
+        box[1] < other[1] + other[3] and other[1] < box[1] + box[3]
+
+
+def _svg_num(value):
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def _svg_text_lines(cx, cy, lines, color, subtext):
+    """Centered node text: a bold first line and smaller lines below it."""
+    top = cy - (14 + 12 * (len(lines) - 1)) / 2
+    out = [
+        f'<text x="{_svg_num(cx)}" y="{_svg_num(top + 11)}" font-size="11" font-weight="600" '
+        f'fill="{color}" text-anchor="middle">{html_lib.escape(lines[0])}</text>'
+    ]
+    for i, line in enumerate(lines[1:]):
+        out.append(
+            f'<text x="{_svg_num(cx)}" y="{_svg_num(top + 14 + 12 * i + 10)}" font-size="9" '
+            f'fill="{subtext}" text-anchor="middle">{html_lib.escape(line)}</text>'
+        )
+    return out
+
+
+def _node_shape(shape, x, y, w, h, fill, stroke):
+    paint = f'fill="{fill}" stroke="{stroke}" stroke-width="1.5"'
+    if shape == "diamond":
+        cx, cy = x + w / 2, y + h / 2
+        pts = f"{_svg_num(cx)},{_svg_num(y)} {_svg_num(x + w)},{_svg_num(cy)} {_svg_num(cx)},{_svg_num(y + h)} {_svg_num(x)},{_svg_num(cy)}"
+        return f'<polygon points="{pts}" {paint}/>'
+    if shape == "circle":
+        return f'<ellipse cx="{_svg_num(x + w / 2)}" cy="{_svg_num(y + h / 2)}" rx="{_svg_num(w / 2)}" ry="{_svg_num(h / 2)}" {paint}/>'
+    radius = {"round": 14, "stadium": h / 2}.get(shape, 6)
+    return (
+        f'<rect x="{_svg_num(x)}" y="{_svg_num(y)}" width="{_svg_num(w)}" height="{_svg_num(h)}" '
+        f'rx="{_svg_num(radius)}" {paint}/>'
+    )
 
-def inject_flow_diagrams(html):
-    """Inject flow diagrams at appropriate section locations."""
-    
-    # Content flow - inject after "C. Content Flow" section, specifically after the paragraph about CDN refresh
-    # Look for the paragraph ending with "within seconds."
-    content_marker = "typically within seconds.</p>"
-    idx = html.find(content_marker)
-    if idx != -1:
-        insert_pos = idx + len(content_marker)
-        html = html[:insert_pos] + "\n" + CONTENT_FLOW_DIAGRAM + "\n" + html[insert_pos:]
-    
-    # Payment flow - inject before "E. Newsletter Flow" section (after payment section ends)
-    # Find the H3 for newsletter flow and insert before it
-    payment_end_marker = '<h3 id="e-newsletter-flow">'
-    idx = html.find(payment_end_marker)
-    if idx != -1:
-        html = html[:idx] + PAYMENT_FLOW_DIAGRAM + "\n" + html[idx:]
-    
-    # Newsletter flow - inject before "F. Local vs Production" section
-    newsletter_end_marker = '<h3 id="f-local-vs-production-behavior">'
-    idx = html.find(newsletter_end_marker)
-    if idx != -1:
-        html = html[:idx] + NEWSLETTER_FLOW_DIAGRAM + "\n" + html[idx:]
-    
-    return html
 
+def flowchart_svg(chart, uid):
+    """Lay out a Flowchart and draw it as a standalone <svg> element.
+
+    uid keeps marker ids unique when several diagrams share a page.
+    """
+    layout = _layout_group(chart, None)
+    rects = layout["nodes"]
+    curves = _route_edges(chart, rects)
+    width = layout["w"] + 2 * DIAGRAM_MARGIN
+    height = layout["h"] + 2 * DIAGRAM_MARGIN
+    colors = DIAGRAM_COLORS
+    out = [
+        f'<svg class="mermaid-diagram" xmlns="http://www.w3.org/2000/svg" '
+        f'width="{_svg_num(width)}" height="{_svg_num(height)}" '
+        f'viewBox="0 0 {_svg_num(width)} {_svg_num(height)}" font-family="{html_lib.escape(DIAGRAM_FONT)}" '
+        f'role="img" aria-label="{html_lib.escape(chart.title or "Diagram")}">',
+        f'<defs><marker id="arrow-{uid}" viewBox="0 0 10 10" refX="9" refY="5" markerWidth="7" '
+        f'markerHeight="7" orient="auto-start-reverse"><path d="M0,0 L10,5 L0,10 z" fill="{colors["edge"]}"/></marker></defs>',
+        f'<g transform="translate({DIAGRAM_MARGIN},{DIAGRAM_MARGIN})">',
+    ]
 
-def add_callout_boxes(html):
-    """Convert Important/Note paragraphs into styled callout boxes."""
-    # Convert **Important:** paragraphs
-    html = re.sub(
-        r"<p><strong>Important:</strong>\s*(.*?)</p>",
-        r'<div class="callout callout-important"><div class="callout-label">Important</div><p>\1</p></div>',
-        html,
-        flags=re.DOTALL,
-    )
-    # Convert **Note:** paragraphs
-    html = re.sub(
-        r"<p><strong>Note:</strong>\s*(.*?)</p>",
-        r'<div class="callout callout-note"><div class="callout-label">Note</div><p>\1</p></div>',
-        html,
-        flags=re.DOTALL,
-    )
-    # Convert **Decision:** paragraphs
-    html = re.sub(
-        r"<p><strong>Decision:</strong>\s*(.*?)</p>",
-        r'<div class="callout callout-note"><div class="callout-label">Decision</div><p>\1</p></div>',
-        html,
-        flags=re.DOTALL,
-    )
+    for x, y, w, h, title in layout["clusters"]:
+        out.append(
+            f'<rect x="{_svg_num(x)}" y="{_svg_num(y)}" width="{_svg_num(w)}" height="{_svg_num(h)}" rx="10" '
+            f'fill="{colors["cluster_fill"]}" stroke="{colors["cluster_stroke"]}" stroke-width="1.5"/>'
+        )
+        if title:
+            out.append(
+                f'<text x="{_svg_num(x + CLUSTER_PAD)}" y="{_svg_num(y + CLUSTER_PAD + 8)}" font-size="9" '
+                f'font-weight="700" letter-spacing="0.5" fill="{colors["subtext"]}">{html_lib.escape(title)}</text>'
+            )
+
+    labels = []
+    taken = list(rects.values())
+    taken += [(x, y, w, CLUSTER_PAD + CLUSTER_TITLE) for x, y, w, h, title in layout["clusters"] if title]
+    for edge, curve in zip(chart.edges, curves):
+        if curve is None:
+            continue
+        p0, c1, c2, p3 = curve
+        path = (
+            f"M{_svg_num(p0[0])},{_svg_num(p0[1])} C{_svg_num(c1[0])},{_svg_num(c1[1])} "
+            f"{_svg_num(c2[0])},{_svg_num(c2[1])} {_svg_num(p3[0])},{_svg_num(p3[1])}"
+        )
+        attrs = f'fill="none" stroke="{colors["edge"]}" stroke-width="{2.5 if edge["style"] == "thick" else 1.5}"'
+        if edge["style"] == "dotted":
+            attrs += ' stroke-dasharray="4 3"'
+        if edge["arrow"]:
+            attrs += f' marker-end="url(#arrow-{uid})"'
+        out.append(f'<path d="{path}" {attrs}/>')
+        if edge["label"]:
+            w, h = _text_width(edge["label"], 9) + 8, 14
+            for t in (0.5, 0.4, 0.6, 0.3, 0.7, 0.5):
+                mx, my = _bezier_point(curve, t)
+                box = (mx - w / 2, my - h / 2, w, h)
+                if not any(_overlaps(box, other) for other in taken):
+                    break
+            taken.append(box)
+            labels.append((box, edge["label"]))
+
+    for (x, y, w, h), text in labels:
+        out.append(
+            f'<rect x="{_svg_num(x)}" y="{_svg_num(y)}" width="{_svg_num(w)}" height="{h}" rx="3" fill="#FFFFFF"/>'
+            f'<text x="{_svg_num(x + w / 2)}" y="{_svg_num(y + 10.5)}" font-size="9" fill="{colors["subtext"]}" '
+            f'text-anchor="middle">{html_lib.escape(text)}</text>'
+        )
+
+    for nid, (x, y, w, h) in rects.items():
+        node = chart.nodes[nid]
+        style = dict(colors)
+        for name in node["classes"]:
+            style.update(chart.class_defs.get(name, {}))
+        out.append(_node_shape(node["shape"], x, y, w, h, style["fill"], style["stroke"]))
+        out.extend(_svg_text_lines(x + w / 2, y + h / 2, _label_lines(node["label"]), style["color"], colors["subtext"]))
+
+    out.append("</g>\n</svg>")
+    return "\n".join(out)
+
+
+def render_mermaid(source, store=ARTIFACTS):
+    """Render mermaid flowchart source to a diagram block with inline SVG.
+
+    Results are cached in memory and in the store by a hash of the source, so
+    an unchanged diagram is laid out once. Raises MermaidError for
+    source outside the supported subset.
+    """
+    digest = hashlib.sha256(f"{GENERATOR_VERSION}\0{source}".encode("utf-8")).hexdigest()
+    html = _DIAGRAM_MEMO.get(digest)
+    if html is not None:
+        return html
+    html = store.get_text("diagrams", digest)
+    if html is None:
+        chart = parse_mermaid(source)
+        title = f"\n    <h4>{html_lib.escape(chart.title)}</h4>" if chart.title else ""
+        html = (
+            f'<div class="diagram-container">\n<div class="flow-diagram">{title}\n'
+            f"{flowchart_svg(chart, digest[:8])}\n</div>\n</div>\n"
+        )
+        store.put_text("diagrams", digest, html)
+    _DIAGRAM_MEMO[digest] = html
     return html
 
 
-def convert_checkbox_lists(html):
-    """Convert checkbox list items into styled checkboxes."""
-    # Convert [ ] into unchecked checkbox
-    html = html.replace(
-        "[ ]", 
-        '<span class="checkbox-box"></span>'
-    )
-    # Convert [x] into checked checkbox
-    html = html.replace(
-        "[x]", 
-        '<span class="checkbox-box checked"></span>'
-    )
-    html = html.replace(
-        "[X]", 
-        '<span class="checkbox-box checked"></span>'
-    )
-    return html
+def _render_mermaid_code(code):
+    """Diagram for an escaped mermaid code block, or None when the source
+    is outside the supported subset and should stay a code block."""
+    try:
+        return render_mermaid(html_lib.unescape(code))
+    except MermaidError:
+        return None
 
 
-def add_section_numbers_and_rules(html):
-    """Add colored section numbers and horizontal accent rules after h2 tags."""
-    def replace_h2(match):
-        attrs = match.group(1) or ""
-        content = match.group(2)
-        # Extract section number if present
-        num_match = re.match(r"(\d+)\.\s*(.*)", content)
-        if num_match:
-            num = num_match.group(1)
-            rest = num_match.group(2)
-            return f'<div class="section-break"></div><h2{attrs}><span class="section-number">{num}.</span> {rest}</h2>\n<hr class="section-rule">'
-        return f"<h2{attrs}>{content}</h2>\n" + '<hr class="section-rule">'
-
-    html = re.sub(r"<h2([^>]*)>(.*?)</h2>", replace_h2, html)
-    return html
+# -------------------------------------------------------------------
+# Syntax highlighting
+# -------------------------------------------------------------------
+try:
+    import pygments
+    from pygments.formatters import HtmlFormatter
+    from pygments.lexer import RegexLexer
+    from pygments.lexers import get_lexer_by_name
+    from pygments.token import Comment, Keyword, Name, Number, Operator, Punctuation, String, Whitespace
+    from pygments.util import ClassNotFound
+except ImportError:
+    pygments = None
+
+if pygments is not None:
+
+    class GroqLexer(RegexLexer):
+        """Sanity's GROQ query language, which Pygments does not ship."""
+
+        name = "GROQ"
+        aliases = ["groq"]
+        tokens = {
+            "root": [
+                (r"\s+", Whitespace),
+                (r"//.*?$", Comment.Single),
+                (r'"(?:\\.|[^"\\])*"', String.Double),
+                (r"'(?:\\.|[^'\\])*'", String.Single),
+                (r"\$\w+", Name.Variable),
+                (r"\b(?:true|false|null)\b", Keyword.Constant),
+                (r"\b(?:in|match|asc|desc)\b", Operator.Word),
+                (r"[A-Za-z_]\w*(?=\s*\()", Name.Function),
+                (r"\d+(?:\.\d+)?", Number),
+                (r"->|\.\.\.?|==|!=|<=|>=|&&|\|\||[*=<>!|+\-/%]", Operator),
+                (r"[\[\](){},.:;@^]", Punctuation),
+                (r"[A-Za-z_]\w*", Name),
+            ],
+        }
 
 
-def add_code_language_labels(html):
-    """Add language labels to code blocks."""
-    # Find code blocks with language classes and add labels
-    def add_label(match):
-        lang = match.group(1) if match.group(1) else ""
-        code_content = match.group(2)
-        
-        lang_display = {
-            "jsx": "JSX",
-            "javascript": "JavaScript", 
-            "js": "JavaScript",
-            "json": "JSON",
-            "bash": "Bash",
-            "shell": "Shell",
-            "groq": "GROQ",
-            "typescript": "TypeScript",
-            "ts": "TypeScript",
-            "python": "Python",
-            "html": "HTML",
-            "css": "CSS",
-        }
-        
-        label = lang_display.get(lang.lower(), lang.upper()) if lang else ""
-        label_html = f'<span class="code-lang">{label}</span>' if label else ""
-        
-        return f'<pre>{label_html}<code class="language-{lang}">{code_content}</code></pre>'
-    
-    # Match pre>code blocks with language class
-    html = re.sub(
-        r'<pre><code class="language-(\w+)">(.*?)</code></pre>',
-        add_label,
-        html,
-        flags=re.DOTALL
+_HIGHLIGHT_BLOCK_RE = re.compile(r'(<code class="language-(\w+)">)([^<]*)(</code></pre>)')
+_HIGHLIGHT_MEMO = BoundedMemo()
+_LEXERS = {}
+
+
+def highlight_signature():
+    """Identify the highlighter so caches invalidate when it changes."""
+    version = pygments.__version__ if pygments is not None else "none"
+    return f"pygments-{version}:{HIGHLIGHT_STYLE}"
+
+
+def _lexer_for(lang):
+    """Resolve a fence language to a lexer by name only, never by guessing.
+
+    Returns None for plain-text and unknown languages.
+    """
+    lang = LEXER_ALIASES.get(lang.lower(), lang.lower())
+    if lang not in _LEXERS:
+        if lang in PLAIN_CODE_LANGUAGES:
+            lexer = None
+        elif lang == "groq":
+            lexer = GroqLexer()
+        else:
+            try:
+                lexer = get_lexer_by_name(lang)
+            except ClassNotFound:
+                lexer = None
+        _LEXERS[lang] = lexer
+    return _LEXERS[lang]
+
+
+def highlight_block(lang, code):
+    """Highlight one escaped code block; returns the <code> body HTML."""
+    lexer = _lexer_for(lang)
+    if lexer is None:
+        return code
+    formatter = HtmlFormatter(nowrap=True)
+    return pygments.highlight(html_lib.unescape(code), lexer, formatter)
+
+
+def _highlight_worker(block):
+    """Process-pool worker: highlight a (lang, code) pair."""
+    return highlight_block(*block)
+
+
+def _highlight_key(lang, code):
+    digest = hashlib.sha256()
+    for part in (highlight_signature(), lang, code):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def highlight_code_blocks(fragments, store=ARTIFACTS):
+    """Syntax-highlight the labelled code blocks in post-processed fragments.
+
+    Each block is looked up in memory, then in the store, by a hash of its
+    language and code; only misses are lexed, in a process pool when
+    there are at least HIGHLIGHT_POOL_MIN_BLOCKS of them. Returns
+    (fragments, blocks highlighted). Fragments pass through unchanged
+    when Pygments is not installed.
+    """
+    if pygments is None:
+        return list(fragments), 0
+
+    blocks = {}
+    for fragment in fragments:
+        for m in _HIGHLIGHT_BLOCK_RE.finditer(fragment):
+            block = (m.group(2), m.group(3))
+            if block not in blocks:
+                blocks[block] = _highlight_key(*block)
+
+    # The memo is bounded, so this call's bodies are kept until substituted
+    bodies = {}
+    missing = []
+    for block, key in blocks.items():
+        body = _HIGHLIGHT_MEMO.get(key)
+        if body is None and _lexer_for(block[0]) is None:
+            body = block[1]
+        if body is None:
+            body = store.get_text("highlight", key)
+            if body is not None:
+                _HIGHLIGHT_MEMO[key] = body
+        if body is None:
+            missing.append(block)
+        else:
+            bodies[key] = body
+
+    if len(missing) >= HIGHLIGHT_POOL_MIN_BLOCKS and (os.cpu_count() or 1) > 1:
+        with concurrent.futures.ProcessPoolExecutor() as pool:
+            results = list(pool.map(_highlight_worker, missing, chunksize=8))
+    else:
+        results = [highlight_block(*block) for block in missing]
+    for block, highlighted in zip(missing, results):
+        key = blocks[block]
+        bodies[key] = _HIGHLIGHT_MEMO[key] = highlighted
+        store.put_text("highlight", key, highlighted)
+
+    def substitute(m):
+        body = bodies[blocks[(m.group(2), m.group(3))]]
+        return m.group(1) + body + m.group(4)
+
+    return [_HIGHLIGHT_BLOCK_RE.sub(substitute, fragment) for fragment in fragments], len(missing)
+
+
+def highlight_css():
+    """Token colours for highlighted code, scoped to the document's <pre> blocks."""
+    if pygments is None:
+        return ""
+    scope = ".doc-content pre code"
+    rules = HtmlFormatter(style=HIGHLIGHT_STYLE).get_style_defs(scope).splitlines()
+    # Keep token rules only; the block background and padding come from CSS
+    return "\n".join(r for r in rules if r.startswith(scope + " .") and not r.startswith(scope + " .hll")) + "\n"
+
+
+# -------------------------------------------------------------------
+# Single-pass HTML post-processing
+#
+# One scan over the converted HTML applies every enhancement that the
+# original chain of whole-document passes performed. That chain lives on
+# in tests/test_postprocess.py, which checks the single pass against it.
+# -------------------------------------------------------------------
+CODE_LANG_LABELS = {
+    "jsx": "JSX",
+    "javascript": "JavaScript",
+    "js": "JavaScript",
+    "json": "JSON",
+    "bash": "Bash",
+    "shell": "Shell",
+    "groq": "GROQ",
+    "mermaid": "Mermaid",
+    "typescript": "TypeScript",
+    "ts": "TypeScript",
+    "python": "Python",
+    "html": "HTML",
+    "css": "CSS",
+}
+
+CHECKBOX_HTML = {
+    "[ ]": '<span class="checkbox-box"></span>',
+    "[x]": '<span class="checkbox-box checked"></span>',
+    "[X]": '<span class="checkbox-box checked"></span>',
+}
+
+# Bodies use unrolled loops ("[^<]*(?:<(?!end)[^<]*)*") instead of
+# DOTALL ".*?" so each match is a single linear scan with no backtracking.
+_POSTPROCESS_RE = re.compile(
+    r"<(?:"
+    r"(?P<h1>h1[^>]*>GAICOM SYSTEM DOCUMENTATION</h1>\s*<hr\s*/?\s*>)"
+    r"|pre><code(?P<code_attrs>[^>]*)>(?P<code>[^<]*(?:<(?!/code></pre>)[^<]*)*)</code></pre>"
+    r"|p><strong>(?P<callout>Important|Note|Decision):</strong>\s*"
+    r"(?P<callout_body>[^<]*(?:<(?!/p>)[^<]*)*)</p>"
+    r"|h2(?P<h2_attrs>[^>]*)>(?P<h2_body>[^\n]*?)</h2>"
+    r")"
+    r"|\[(?P<checkbox>[ xX])\]"
+)
+_CHECKBOX_RE = re.compile(r"\[[ xX]\]")
+_CODE_LANG_ATTR_RE = re.compile(r' class="language-(\w+)"')
+
+
+def _replace_checkboxes(text):
+    if "[" not in text:
+        return text
+    return _CHECKBOX_RE.sub(lambda m: CHECKBOX_HTML[m.group(0)], text)
+
+
+def postprocess_html(html):
+    """Apply every HTML enhancement in a single pass over a converted fragment.
+
+    Removes the cover-duplicating first h1, renders mermaid blocks,
+    turns Important/Note/Decision paragraphs into callouts, draws
+    checkboxes, numbers h2 sections and labels code languages.
+    """
+    out = []
+    pos = 0
+    h1_seen = False
+
+    for m in _POSTPROCESS_RE.finditer(html):
+        out.append(html[pos:m.start()])
+        pos = m.end()
+        kind = m.lastgroup
+        if kind == "h1":
+            if h1_seen:
+                out.append(m.group(0))
+            h1_seen = True
+        elif kind == "code":
+            attrs, code = m.group("code_attrs"), m.group("code")
+            if attrs == ' class="language-mermaid"':
+                diagram = _render_mermaid_code(code)
+                if diagram is not None:
+                    out.append(diagram)
+                    continue
+            code = _replace_checkboxes(code)
+            lang = _CODE_LANG_ATTR_RE.fullmatch(attrs)
+            if lang:
+                lang = lang.group(1)
+                label = CODE_LANG_LABELS.get(lang.lower(), lang.upper())
+                out.append(
+                    f'<pre><span class="code-lang">{label}</span>'
+                    f'<code class="language-{lang}">{code}</code></pre>'
+                )
+            else:
+                out.append(f"<pre><code{attrs}>{code}</code></pre>")
+        elif kind == "callout_body":
+            label = m.group("callout")
+            css = "callout-important" if label == "Important" else "callout-note"
+            body = _replace_checkboxes(m.group("callout_body"))
+            out.append(
+                f'<div class="callout {css}"><div class="callout-label">{label}</div>'
+                f"<p>{body}</p></div>"
+            )
+        elif kind == "h2_body":
+            attrs, content = m.group("h2_attrs"), _replace_checkboxes(m.group("h2_body"))
+            num_match = re.match(r"(\d+)\.\s*(.*)", content)
+            if num_match:
+                out.append(
+                    f'<div class="section-break"></div><h2{attrs}>'
+                    f'<span class="section-number">{num_match.group(1)}.</span> '
+                    f'{num_match.group(2)}</h2>\n<hr class="section-rule">'
+                )
+            else:
+                out.append(f'<h2{attrs}>{content}</h2>\n<hr class="section-rule">')
+        else:
+            out.append(CHECKBOX_HTML[m.group(0)])
+    out.append(html[pos:])
+    return "".join(out)
+
+
+# -------------------------------------------------------------------
+# Stylesheet pruning and minification
+#
+# The stylesheet covers every construct the documentation can contain,
+# and any one document uses a fraction of it. Before rendering, style
+# rules whose selectors need a class, id or element the document never
+# contains are dropped, then the CSS and the HTML are minified. The
+# selector check is conservative: pseudo-classes, pseudo-elements and
+# attribute selectors are ignored, so a kept selector may still match
+# nothing, but a dropped one never could have matched.
+# -------------------------------------------------------------------
+_CSS_TOKEN_RE = re.compile(r"""/\*.*?\*/|"(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*'|[{};]|[^{};"'/]+|/""", re.S)
+_CSS_IGNORED_SELECTOR_RE = re.compile(r"::?[\w-]+(?:\([^)]*\))?|\[[^\]]*\]")
+_CSS_PRUNABLE_AT_RULES = ("@media", "@supports")
+_HTML_TAG_NAME_RE = re.compile(r"<([a-zA-Z][\w:-]*)")
+_HTML_CLASS_ID_RE = re.compile(r"""\s(class|id)\s*=\s*(?:"([^"]*)"|'([^']*)')""", re.I)
+_HTML_VERBATIM_RE = re.compile(r"<(pre|textarea|script|style)\b.*?</\1\s*>|<!--.*?-->", re.S | re.I)
+
+
+_CSS_STRING_RE = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""")
+
+
+def _squash_css(tokens):
+    """Join CSS tokens with whitespace collapsed outside string literals."""
+    text = "".join(tok if tok[0] in "\"'" else re.sub(r"\s+", " ", tok) for tok in tokens)
+    return text.strip()
+
+
+def _parse_css_block(tokens, pos=0):
+    """Parse tokens into [declaration | (prelude, block)] up to the closing brace."""
+    items, buf = [], []
+    while pos < len(tokens):
+        tok = tokens[pos]
+        pos += 1
+        if tok.startswith("/*"):
+            continue
+        if tok == "{":
+            block, pos = _parse_css_block(tokens, pos)
+            items.append((_squash_css(buf), block))
+            buf = []
+        elif tok == "}":
+            break
+        elif tok == ";":
+            decl = _squash_css(buf)
+            if decl:
+                items.append(decl)
+            buf = []
+        else:
+            buf.append(tok)
+    decl = _squash_css(buf)
+    if decl:
+        items.append(decl)
+    return items, pos
+
+
+@functools.lru_cache(maxsize=8)
+def parse_css(css):
+    """Parse a stylesheet into nested items, with comments removed."""
+    return _parse_css_block(_CSS_TOKEN_RE.findall(css))[0]
+
+
+def _split_selectors(prelude):
+    """Split a selector list on top-level commas."""
+    selectors, depth, start = [], 0, 0
+    for i, ch in enumerate(prelude):
+        if ch in "([":
+            depth += 1
+        elif ch in ")]":
+            depth -= 1
+        elif ch == "," and depth == 0:
+            selectors.append(prelude[start:i].strip())
+            start = i + 1
+    selectors.append(prelude[start:].strip())
+    return selectors
+
+
+def collect_used_selectors(parts):
+    """(element names, classes, ids) that occur in the HTML parts."""
+    tags, classes, ids = set(), set(), set()
+    for part in parts:
+        tags.update(name.lower() for name in _HTML_TAG_NAME_RE.findall(part))
+        for attr, v1, v2 in _HTML_CLASS_ID_RE.findall(part):
+            value = v1 or v2
+            if attr.lower() == "class":
+                classes.update(value.split())
+            else:
+                ids.add(value.strip())
+    return tags, classes, ids
+
+
+def selector_may_match(selector, used):
+    """False only when the selector needs a name absent from used."""
+    tags, classes, ids = used
+    for compound in re.split(r"[\s>+~]+", _CSS_IGNORED_SELECTOR_RE.sub("", selector)):
+        tag = re.match(r"[\w-]+", compound)
+        if tag and tag.group(0).lower() not in tags:
+            return False
+        for kind, name in re.findall(r"([.#])([\w-]+)", compound):
+            if name not in (classes if kind == "." else ids):
+                return False
+    return True
+
+
+def _prune_css_items(items, used):
+    """Drop style rules that cannot match; returns (items, rules removed)."""
+    kept, removed = [], 0
+    for item in items:
+        if isinstance(item, str):
+            kept.append(item)
+            continue
+        prelude, block = item
+        if prelude.startswith("@"):
+            if prelude.lower().startswith(_CSS_PRUNABLE_AT_RULES):
+                block, dropped = _prune_css_items(block, used)
+                removed += dropped
+                if not block:
+                    continue
+            kept.append((prelude, block))
+            continue
+        selectors = [sel for sel in _split_selectors(prelude) if selector_may_match(sel, used)]
+        if selectors:
+            kept.append((",".join(selectors), block))
+        else:
+            removed += 1
+    return kept, removed
+
+
+def _minify_declaration(decl):
+    name, sep, value = decl.partition(":")
+    if not sep or not re.fullmatch(r"\s*-{0,2}[\w-]+\s*", name):
+        return decl
+    # Odd items are string literals, whose spacing is rendered text
+    pieces = _CSS_STRING_RE.split(value.strip())
+    return name.strip() + ":" + "".join(
+        piece if index % 2 else re.sub(r"\s*,\s*", ",", piece) for index, piece in enumerate(pieces)
     )
-    
-    return html
 
 
-def remove_first_h1(html):
-    """Remove the first H1 tag (GAICOM SYSTEM DOCUMENTATION) since we have a cover page."""
-    # Remove the first h1 and the hr that follows it
-    html = re.sub(r'<h1[^>]*>GAICOM SYSTEM DOCUMENTATION</h1>\s*<hr\s*/?\s*>', '', html, count=1)
-    return html
+def _minify_selector(prelude):
+    if prelude.startswith("@"):
+        return prelude
+    return ",".join(re.sub(r"\s*([>+~])\s*", r"\1", sel) for sel in _split_selectors(prelude))
 
 
+def serialize_css(items):
+    """Serialize parsed items as minified CSS."""
+    out = []
+    for i, item in enumerate(items):
+        if isinstance(item, str):
+            out.append(_minify_declaration(item))
+            if i < len(items) - 1:
+                out.append(";")
+        else:
+            prelude, block = item
+            out.append(f"{_minify_selector(prelude)}{{{serialize_css(block)}}}")
+    return "".join(out)
+
+
+def prune_css(css, used):
+    """Return (minified css without unmatchable rules, rules removed)."""
+    items, removed = _prune_css_items(parse_css(css), used)
+    return serialize_css(items), removed
+
+
+def _collapse_whitespace(text):
+    return re.sub(r"\s+", lambda m: "\n" if "\n" in m.group(0) else " ", text)
+
+
+def minify_html(html):
+    """Collapse whitespace runs and drop comments outside pre, textarea,
+    script and style elements.
+
+    A run that contains a newline becomes one newline, otherwise one
+    space, so the rendered whitespace is unchanged.
+    """
+    out, pos = [], 0
+    for m in _HTML_VERBATIM_RE.finditer(html):
+        out.append(_collapse_whitespace(html[pos:m.start()]))
+        if not m.group(0).startswith("<!--"):
+            out.append(m.group(0))
+        pos = m.end()
+    out.append(_collapse_whitespace(html[pos:]))
+    return "".join(out)
+
+
+def report_minification(stats):
+    """One-line summary of HtmlDocument.stats after minification."""
+    css_saved = stats["css_bytes_before"] - stats["css_bytes_after"]
+    html_saved = stats["html_bytes_before"] - stats["html_bytes_after"]
+    return (
+        f"Pruned {stats['css_rules_removed']} unused CSS rules, saved {(css_saved + html_saved) / 1024:,.1f} KB "
+        f"(CSS {stats['css_bytes_before'] / 1024:,.1f} → {stats['css_bytes_after'] / 1024:,.1f} KB, "
+        f"HTML {stats['html_bytes_before'] / 1024:,.0f} → {stats['html_bytes_after'] / 1024:,.0f} KB)"
+    )
+
+
+# -------------------------------------------------------------------
+# Document assembly
+# -------------------------------------------------------------------
 def build_cover_page():
     """Build the cover page HTML."""
-    return """
+    return f"""
 <div class="cover-page">
     <div class="cover-accent-line"></div>
     <div class="cover-org">GAICOM</div>
@@ -1090,8 +2474,8 @@ def build_cover_page():
         and maintenance procedures.
     </div>
     <div class="cover-meta">
-        <strong>Created by:</strong> Tanish Kumar<br>
-        <strong>Organization:</strong> Generative AI Community (GAICOM)<br>
+        <strong>Created by:</strong> {html_lib.escape(DOCUMENT_AUTHOR)}<br>
+        <strong>Organization:</strong> {html_lib.escape(DOCUMENT_PUBLISHER)}<br>
         <strong>Version:</strong> 1.0<br>
         <strong>Date:</strong> February 2026
     </div>
@@ -1099,139 +2483,2922 @@ def build_cover_page():
 """
 
 
-def build_full_html(cover_html, toc_html, content_html):
-    """Assemble the full HTML document."""
-    return f"""<!DOCTYPE html>
+class HtmlDocument:
+    """An HTML document held as an ordered list of string parts.
+
+    Assembly appends references to the cover, TOC, chapter fragments and
+    stylesheets instead of concatenating them, so building the document
+    copies none of them. Consumers that can stream (file writes, the
+    loopback server, glyph collection) iterate the parts; str() joins them
+    once for consumers that need a single string.
+    """
+
+    def __init__(self, parts=()):
+        self.parts = list(parts)
+        self.stats = {}
+
+    def append(self, text):
+        self.parts.append(text)
+
+    def extend(self, parts):
+        self.parts.extend(parts)
+
+    def __iter__(self):
+        return iter(self.parts)
+
+    def __len__(self):
+        return sum(len(part) for part in self.parts)
+
+    def __str__(self):
+        return "".join(self.parts)
+
+    def encoded_parts(self, encoding="utf-8"):
+        """Yield the parts encoded one at a time."""
+        for part in self.parts:
+            yield part.encode(encoding)
+
+    def encoded_length(self, encoding="utf-8"):
+        return sum(len(chunk) for chunk in self.encoded_parts(encoding))
+
+
+def build_document(cover_html, toc_html, fragments, font_css="", extra_css="", minify=True):
+    """Assemble the full HTML document from chapter fragments as an
+    HtmlDocument; extra_css is appended after the stylesheet so it can
+    override it.
+
+    With minify, style rules the document cannot match are dropped and
+    the CSS and HTML are minified; doc.stats then reports the rules
+    removed and the byte counts before and after.
+    """
+    head = f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>GAICOM System Documentation</title>
-    <style>{CSS}</style>
+    <title>{html_lib.escape(DOCUMENT_TITLE)}</title>
+    <style>"""
+    body = [
+        """</style>
 </head>
 <body>
-    {cover_html}
-    {toc_html}
+    """,
+        cover_html,
+        "\n    ",
+        toc_html,
+        """
     <div class="doc-content">
-        {content_html}
+        """,
+    ]
+    for index, fragment in enumerate(fragments):
+        if index:
+            body.append("\n")
+        body.append(fragment)
+    body.append("""
     </div>
 </body>
 </html>
-"""
+""")
+    stylesheet = [CSS, highlight_css(), extra_css]
+    if not minify:
+        return HtmlDocument([head, font_css, *stylesheet, *body])
+
+    html_before = sum(len(part.encode("utf-8")) for part in [head, *body])
+    head = minify_html(head)
+    body = [minify_html(part) for part in body]
+    css_before = sum(len(part.encode("utf-8")) for part in stylesheet)
+    css, removed = prune_css("".join(stylesheet), collect_used_selectors([head, *body]))
+    doc = HtmlDocument([head, font_css, css, *body])
+    doc.stats = {
+        "css_rules_removed": removed,
+        "css_bytes_before": css_before,
+        "css_bytes_after": len(css.encode("utf-8")),
+        "html_bytes_before": html_before,
+        "html_bytes_after": sum(len(part.encode("utf-8")) for part in [head, *body]),
+    }
+    return doc
+
+
+def build_full_html(cover_html, toc_html, content_html, font_css="", extra_css="", minify=True):
+    """Assemble the full HTML document as one string."""
+    return str(build_document(cover_html, toc_html, [content_html], font_css, extra_css, minify))
+
 
+def build_document_html(md_text, store=ARTIFACTS, base_dir=None, minify=True, image_root=None):
+    """Run every markdown stage quietly and return (document, stats).
 
-def html_to_pdf_chrome(html_path, pdf_path, chrome_path):
-    """Use Chrome headless to convert HTML to PDF."""
-    abs_html = os.path.abspath(html_path)
-    abs_pdf = os.path.abspath(pdf_path)
+    The document is an HtmlDocument. Relative image paths resolve against
+    base_dir, by default the directory of the GAICOM document. With
+    image_root, an image outside that directory raises ImagePathError.
+    """
+    chapters = split_chapters(md_text)
+    fragments, toc_tokens, converted = convert_chapters(chapters, store)
+    toc_items = build_toc_from_tokens(toc_tokens)
+    cover_html = build_cover_page()
+    toc_html = build_toc_html(toc_items)
+    images = 0
+    base_dir = base_dir or os.path.dirname(MD_FILE)
+    for index, fragment in enumerate(fragments):
+        fragments[index], image_stats = embed_images(fragment, base_dir, root=image_root)
+        images += image_stats["images"]
+    font_css, faces = build_font_css([cover_html, toc_html, *fragments])
+    document = build_document(cover_html, toc_html, fragments, font_css, minify=minify)
+    stats = {
+        "sections": len(toc_items),
+        "chapters": len(chapters),
+        "converted": converted,
+        "font_faces": faces,
+        "images": images,
+    }
+    return document, stats
 
-    file_url = "file:///" + abs_html.replace("\\", "/")
 
-    cmd = [
-        chrome_path,
-        "--headless",
-        "--disable-gpu",
-        "--no-sandbox",
-        "--run-all-compositor-stages-before-draw",
-        "--print-to-pdf=" + abs_pdf,
-        "--print-to-pdf-no-header",
-        "--no-pdf-header-footer",
-        file_url,
+# -------------------------------------------------------------------
+# Images
+# -------------------------------------------------------------------
+_IMG_TAG_RE = re.compile(r"<img\b[^>]*>", re.I)
+_IMG_ATTR_RE = re.compile(r'\s([\w-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_IMG_STYLE_WIDTH_RE = re.compile(r"(?:^|;)\s*width\s*:\s*([\d.]+)(px|%|in)", re.I)
+_MD_IMAGE_RE = re.compile(r"!\[[^\]]*\]\(\s*<?([^)\s>]+)|<img\b[^>]*\bsrc\s*=\s*[\"']([^\"']+)", re.I)
+IMAGE_MIME_TYPES = {
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".gif": "image/gif",
+    ".webp": "image/webp",
+    ".svg": "image/svg+xml",
+}
+
+
+def _local_image_path(src, base_dir):
+    """Filesystem path for an <img> src, or None for remote and inline images."""
+    if not src or re.match(r"^(?:[a-z][a-z0-9+.-]*:|//)", src, re.I):
+        return None
+    path = urllib.parse.unquote(src.split("#", 1)[0].split("?", 1)[0])
+    return os.path.normpath(os.path.join(base_dir, path.lstrip("/")))
+
+
+class ImagePathError(ValueError):
+    """Raised for an image a document may not read."""
+
+
+def check_image_path(src, path, root):
+    """Raise ImagePathError unless the image src (resolved to path) stays
+    inside root. Symlinks are followed, and file: URLs are refused."""
+    if re.match(r"^file:", src, re.I):
+        raise ImagePathError(f"file: image URLs are not allowed: {src}")
+    if path is None:
+        return
+    root = os.path.realpath(root)
+    if os.path.commonpath([os.path.realpath(path), root]) != root:
+        raise ImagePathError(f"Image outside the document directory: {src}")
+
+
+def image_files_signature(md_text, base_dir):
+    """Cheap fingerprint of the local images a document references, for the build key."""
+    parts = []
+    for m in _MD_IMAGE_RE.finditer(md_text):
+        path = _local_image_path(m.group(1) or m.group(2), base_dir)
+        try:
+            st = os.stat(path)
+        except (OSError, TypeError):
+            continue
+        parts.append(f"{path}:{st.st_size}:{st.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def image_display_width(attrs):
+    """Width in CSS pixels an image is printed at: its width attribute or
+    inline style width, else the full content column."""
+    style = _IMG_STYLE_WIDTH_RE.search(attrs.get("style", ""))
+    if style:
+        value, unit = float(style.group(1)), style.group(2).lower()
+        if unit == "%":
+            return PRINT_CONTENT_WIDTH_PX * min(value, 100) / 100
+        return min(value * 96 if unit == "in" else value, PRINT_CONTENT_WIDTH_PX)
+    width = attrs.get("width", "")
+    if width.endswith("%") and width[:-1].isdigit():
+        return PRINT_CONTENT_WIDTH_PX * min(int(width[:-1]), 100) / 100
+    if width.isdigit():
+        return min(int(width), PRINT_CONTENT_WIDTH_PX)
+    return PRINT_CONTENT_WIDTH_PX
+
+
+def optimize_image(path, css_width, dpi=IMAGE_PRINT_DPI, store=ARTIFACTS):
+    """Downsample an image to dpi at its printed width and re-encode it.
+
+    Opaque images become JPEG, which Chrome embeds in the PDF as is;
+    images with transparency become optimized PNG. Results are cached
+    in the store under a hash of the source bytes and settings. Returns
+    (bytes, mime).
+    SVG, GIF and, when Pillow is not installed, every image pass
+    through unchanged.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    mime = IMAGE_MIME_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        return data, mime
+    if mime in ("image/svg+xml", "image/gif"):
+        return data, mime
+
+    target_px = max(1, round(css_width / 96 * dpi))
+    digest = hashlib.sha256(data)
+    digest.update(f"\0{target_px}\0{IMAGE_JPEG_QUALITY}".encode("ascii"))
+    key = digest.hexdigest()
+    cached = store.get("images", key)
+    if cached is not None:
+        return cached, "image/png" if cached.startswith(b"\x89PNG") else "image/jpeg"
+
+    # Pillow decodes lazily, so a truncated or corrupt file can fail at any
+    # step up to the encode; it is then embedded as is
+    try:
+        optimized, out_mime = _reencode_image(data, target_px)
+    except (OSError, ValueError, SyntaxError, Image.DecompressionBombError):
+        return data, mime
+    store.put("images", key, optimized)
+    return optimized, out_mime
+
+
+def _reencode_image(data, target_px):
+    """(bytes, mime) of an image downsampled to target_px wide."""
+    from PIL import Image, ImageOps
+
+    image = Image.open(io.BytesIO(data))
+    source_format = image.format
+    image = ImageOps.exif_transpose(image)
+    if image.width > target_px:
+        image = image.resize((target_px, max(1, round(image.height * target_px / image.width))), Image.LANCZOS)
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        image = image.convert("RGBA")
+        transparent = image.getchannel("A").getextrema()[0] < 255
+    else:
+        transparent = False
+    out = io.BytesIO()
+    if transparent:
+        image.save(out, "PNG", optimize=True)
+        out_mime = "image/png"
+    else:
+        image.convert("RGB").save(out, "JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+        out_mime = "image/jpeg"
+    optimized = out.getvalue()
+    # Keep an already compact JPEG/PNG rather than growing it
+    if len(optimized) >= len(data) and source_format in ("JPEG", "PNG"):
+        optimized = data
+        out_mime = "image/jpeg" if source_format == "JPEG" else "image/png"
+    return optimized, out_mime
+
+
+def _img_attrs(tag):
+    return {k.lower(): v1 if v1 is not None else v2 for k, v1, v2 in _IMG_ATTR_RE.findall(tag)}
+
+
+def prefetch_images(md_text, base_dir, dpi=IMAGE_PRINT_DPI):
+    """Optimize the local images md_text references into the image cache
+    ahead of embed_images(), which then only reads the cache.
+
+    Best effort: markdown images are assumed to print at full column
+    width, <img> tags at their width attribute. Returns the number of
+    images prepared.
+    """
+    refs = [(m.group(1), {}) for m in re.finditer(r"!\[[^\]]*\]\(\s*<?([^)\s>]+)", md_text)]
+    for tag in _IMG_TAG_RE.findall(md_text):
+        attrs = _img_attrs(tag)
+        refs.append((attrs.get("src", ""), attrs))
+    prepared = set()
+    for src, attrs in refs:
+        path = _local_image_path(html_lib.unescape(src), base_dir)
+        key = (path, image_display_width(attrs))
+        if path is None or key in prepared or not os.path.isfile(path):
+            continue
+        try:
+            optimize_image(path, key[1], dpi)
+        except OSError:
+            continue
+        prepared.add(key)
+    return len(prepared)
+
+
+def embed_images(html, base_dir, dpi=IMAGE_PRINT_DPI, root=None):
+    """Inline every local <img> as an optimized data URI.
+
+    The renderers load the document from memory with no base URL, so
+    relative image paths would not resolve otherwise. Missing files keep
+    their original tag. With root, any image outside it raises
+    ImagePathError (see check_image_path). Returns (html, stats) with the
+    image count and total bytes before and after.
+    """
+    stats = {"images": 0, "bytes_in": 0, "bytes_out": 0}
+
+    def replace(m):
+        tag = m.group(0)
+        attrs = _img_attrs(tag)
+        src = html_lib.unescape(attrs.get("src", ""))
+        path = _local_image_path(src, base_dir)
+        if root is not None:
+            check_image_path(src, path, root)
+        if path is None or not os.path.isfile(path):
+            return tag
+        data, mime = optimize_image(path, image_display_width(attrs), dpi)
+        stats["images"] += 1
+        stats["bytes_in"] += os.path.getsize(path)
+        stats["bytes_out"] += len(data)
+        uri = f"data:{mime};base64,{base64.b64encode(data).decode('ascii')}"
+        return _IMG_ATTR_RE.sub(lambda a: f' src="{uri}"' if a.group(1).lower() == "src" else a.group(0), tag)
+
+    if "<img" not in html and "<IMG" not in html:
+        return html, stats
+    return _IMG_TAG_RE.sub(replace, html), stats
+
+
+# -------------------------------------------------------------------
+# Local fonts
+# -------------------------------------------------------------------
+def find_local_fonts(font_dir=None):
+    """Return [(css_family, weight, style, path)] for font files in font_dir.
+
+    By default that is FONT_DIR or, when it has no fonts, the downloaded
+    fonts in FONT_CACHE_DIR.
+    """
+    if font_dir is None:
+        return find_local_fonts(FONT_DIR) or find_local_fonts(FONT_CACHE_DIR)
+    try:
+        names = sorted(os.listdir(font_dir))
+    except OSError:
+        return []
+    fonts = []
+    for name in names:
+        stem, ext = os.path.splitext(name)
+        if ext.lower() not in (".ttf", ".otf", ".woff", ".woff2"):
+            continue
+        base, _, variant = stem.partition("-")
+        family = FONT_FAMILIES.get(re.sub(r"\[.*\]|variablefont.*", "", base.lower()).strip("_"))
+        if not family:
+            continue
+        variant = variant.lower()
+        style = "italic" if "italic" in variant or "italic" in base.lower() else "normal"
+        if "[" in base or "variable" in stem.lower():
+            weight = "100 900"
+        else:
+            weight = str(FONT_WEIGHTS.get(variant.replace("italic", "") or "regular", 400))
+        fonts.append((family, weight, style, os.path.join(font_dir, name)))
+    return fonts
+
+
+def font_files_signature(font_dir=None):
+    """Cheap fingerprint of the local font files, for the build key."""
+    parts = []
+    for _, _, _, path in find_local_fonts(font_dir):
+        st = os.stat(path)
+        parts.append(f"{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}")
+    return "|".join(parts)
+
+
+_FONT_FACE_RE = re.compile(r"(?:/\*\s*([\w-]+)\s*\*/\s*)?@font-face\s*\{([^}]*)\}")
+
+
+def download_fonts(cache_dir=FONT_CACHE_DIR, url=FONT_DOWNLOAD_URL):
+    """Fetch the faces listed by a Google Fonts stylesheet into cache_dir,
+    named so find_local_fonts() recognizes them.
+
+    The faces are downloaded into a temporary directory that replaces
+    cache_dir only once every face has arrived, so a failed download
+    leaves the previous set (or none) in place. Returns the number of
+    files written. Raises OSError when the download fails and ValueError
+    when the stylesheet lists no faces.
+    """
+    with urllib.request.urlopen(url, timeout=FONT_DOWNLOAD_TIMEOUT) as response:
+        css = response.read().decode("utf-8")
+    faces = _FONT_FACE_RE.findall(css)
+    # Browser user agents get one face per script subset; keep Latin
+    if any(subset for subset, _ in faces):
+        faces = [face for face in faces if face[0] == "latin"]
+    weight_names = {weight: name.capitalize() for name, weight in FONT_WEIGHTS.items()}
+    files = {}
+    for _, body in faces:
+        props = dict(re.findall(r"([\w-]+)\s*:\s*([^;]+);", body))
+        src = re.search(r"url\(\s*['\"]?([^)'\"]+)", props.get("src", ""))
+        if not src:
+            continue
+        family = props.get("font-family", "").strip("'\" ").replace(" ", "")
+        weight = props.get("font-weight", "400").strip()
+        italic = "Italic" if props.get("font-style", "").strip() == "italic" else ""
+        ext = os.path.splitext(urllib.parse.urlsplit(src.group(1)).path)[1] or ".ttf"
+        if " " in weight:
+            name = f"{family}[wght]{italic}{ext}"
+        else:
+            name = f"{family}-{weight_names.get(int(weight), weight)}{italic}{ext}"
+        files.setdefault(name, src.group(1))
+    if not files:
+        raise ValueError("the font stylesheet lists no font faces")
+    parent = os.path.dirname(os.path.abspath(cache_dir))
+    os.makedirs(parent, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".fonts-", dir=parent)
+    try:
+        for name, font_url in files.items():
+            with urllib.request.urlopen(font_url, timeout=FONT_DOWNLOAD_TIMEOUT) as response:
+                data = response.read()
+            with open(os.path.join(tmp_dir, name), "wb") as f:
+                f.write(data)
+        # A directory only renames over an empty one; move the old set aside
+        old_dir = None
+        if os.path.exists(cache_dir):
+            old_dir = f"{tmp_dir}.old"
+            os.replace(cache_dir, old_dir)
+        os.replace(tmp_dir, cache_dir)
+        if old_dir:
+            shutil.rmtree(old_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return len(files)
+
+
+_CSS_CONTENT_RE = re.compile(r"(?<![\w-])content\s*:\s*([^;}]*)")
+_CSS_ESCAPE_RE = re.compile(r"\\([0-9a-fA-F]{1,6})\s?|\\(.)", re.DOTALL)
+
+
+def css_generated_text(css):
+    """Characters of the string literals in content: declarations, with
+    CSS escapes (\\2014, \\") decoded."""
+    text = []
+    for value in _CSS_CONTENT_RE.findall(css):
+        for literal in _CSS_STRING_RE.findall(value):
+            text.append(_CSS_ESCAPE_RE.sub(
+                lambda m: chr(int(m.group(1), 16)) if m.group(1) else m.group(2), literal[1:-1]
+            ))
+    return "".join(text)
+
+
+def collect_document_glyphs(document_parts):
+    """Characters that can appear on the page: text content in every case
+    text-transform can give it, CSS generated content and printable ASCII
+    (page numbers, counters).
+
+    document_parts is a string or an iterable of whole-element HTML parts,
+    scanned one at a time.
+    """
+    if isinstance(document_parts, str):
+        document_parts = [document_parts]
+    glyphs = set()
+    for part in document_parts:
+        glyphs.update(html_lib.unescape(re.sub(r"<[^>]*>", "", part)))
+    glyphs.update(css_generated_text(CSS))
+    text = "".join(glyphs)
+    glyphs.update(text.upper() + text.lower() + text.title())
+    glyphs.update(chr(c) for c in range(0x20, 0x7F))
+    glyphs.discard("\n")
+    return "".join(sorted(glyphs))
+
+
+def subset_font(path, glyphs, store=ARTIFACTS):
+    """Subset a font to glyphs with fontTools, caching the result in the store.
+
+    Returns (font bytes, css format). Falls back to the original file
+    when fontTools is not installed.
+    """
+    try:
+        from fontTools import subset
+    except ImportError:
+        ext = os.path.splitext(path)[1].lower().lstrip(".")
+        with open(path, "rb") as f:
+            return f.read(), {"ttf": "truetype", "otf": "opentype"}.get(ext, ext)
+    try:
+        import brotli  # noqa: F401  (required by fontTools for woff2)
+        flavor = "woff2"
+    except ImportError:
+        flavor = "woff"
+
+    with open(path, "rb") as f:
+        font_bytes = f.read()
+    digest = hashlib.sha256(font_bytes)
+    digest.update(glyphs.encode("utf-8"))
+    digest.update(flavor.encode("ascii"))
+    key = digest.hexdigest()
+    cached = store.get("fonts", key)
+    if cached is not None:
+        return cached, flavor
+
+    # fontTools warns about every table it drops; those are expected here
+    logging.getLogger("fontTools").setLevel(logging.ERROR)
+    options = subset.Options()
+    options.flavor = flavor
+    options.layout_features = ["*"]
+    options.name_IDs = ["*"]
+    options.notdef_outline = True
+    font = subset.load_font(io.BytesIO(font_bytes), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text=glyphs)
+    subsetter.subset(font)
+    out = io.BytesIO()
+    subset.save_font(font, out, options)
+    data = out.getvalue()
+    store.put("fonts", key, data)
+    return data, flavor
+
+
+def build_font_css(document_parts, font_dir=None):
+    """Build @font-face rules embedding the local fonts as data URIs.
+
+    Returns (css, number of faces). Empty when no local fonts exist, in
+    which case the CSS font stacks fall back to system fonts.
+    """
+    fonts = find_local_fonts(font_dir)
+    if not fonts:
+        return "", 0
+    glyphs = collect_document_glyphs(document_parts)
+    rules = []
+    for family, weight, style, path in fonts:
+        data, fmt = subset_font(path, glyphs)
+        mime = {"truetype": "font/ttf", "opentype": "font/otf"}.get(fmt, "font/" + fmt)
+        encoded = base64.b64encode(data).decode("ascii")
+        rules.append(
+            f"@font-face {{ font-family: '{family}'; font-weight: {weight}; font-style: {style}; "
+            f"font-display: block; src: url(data:{mime};base64,{encoded}) format('{fmt}'); }}\n"
+        )
+    return "".join(rules), len(rules)
+
+
+def compute_build_key(md_text, engine="chrome", base_dir=None, optimize=False, parallel=False, minify=True):
+    """Hash every input that affects the rendered PDF, including the
+    rendering engine, per-chapter rendering, PDF post-optimization,
+    CSS/HTML minification and the images the markdown references."""
+    digest = hashlib.sha256()
+    parts = [
+        GENERATOR_VERSION,
+        engine,
+        "optimized" if optimize else "",
+        "parallel" if parallel else "",
+        "" if minify else "unminified",
+        md_text,
+        CSS,
+        highlight_signature(),
+        build_cover_page(),
+        font_files_signature(),
+        image_files_signature(md_text, base_dir or os.path.dirname(MD_FILE)),
     ]
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def load_manifest(path=MANIFEST_FILE):
+    """Load the build manifest, or an empty one if missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest, path=MANIFEST_FILE):
+    """Write the build manifest atomically."""
+    atomic_write(path, json.dumps(manifest, indent=2))
+
+
+def is_cached_build(manifest, build_key, pdf_path):
+    """Check whether pdf_path is the output of a previous build with build_key."""
+    entry = manifest.get(os.path.abspath(pdf_path))
+    if not entry or entry.get("key") != build_key:
+        return False
+    try:
+        st = os.stat(pdf_path)
+    except OSError:
+        return False
+    # A PDF that was replaced or touched since the build is not trusted
+    return st.st_size == entry.get("size") and st.st_mtime_ns == entry.get("mtime_ns")
+
+
+def record_build(manifest, build_key, pdf_path):
+    """Remember that pdf_path was produced from build_key."""
+    st = os.stat(pdf_path)
+    manifest[os.path.abspath(pdf_path)] = {
+        "key": build_key,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+    }
+
+
+class LoopbackDocumentServer:
+    """Serve one in-memory HTML document on an ephemeral 127.0.0.1 port.
+
+    Used as a context manager that yields the document URL. The document
+    may be supplied later with set_document(); until then requests wait,
+    so a browser can be pointed at the URL before the HTML exists.
+    """
+
+    def __init__(self, full_html=None):
+        self.document = None
+        self.length = 0
+        self.ready = threading.Event()
+        if full_html is not None:
+            self.set_document(full_html)
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path != "/":
+                    self.send_error(404)
+                    return
+                if not server.ready.wait(DOCUMENT_WAIT_TIMEOUT) or server.document is None:
+                    # The browser may already be gone when a build is abandoned
+                    with contextlib.suppress(OSError):
+                        self.send_error(503)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(server.length))
+                self.end_headers()
+                for chunk in server.document.encoded_parts():
+                    self.wfile.write(chunk)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def set_document(self, full_html):
+        """Serve full_html, a string or an HtmlDocument (streamed part by
+        part, never encoded whole), and release waiting requests."""
+        self.document = HtmlDocument([full_html]) if isinstance(full_html, str) else full_html
+        self.length = self.document.encoded_length()
+        self.ready.set()
+
+    def __enter__(self):
+        self.thread.start()
+        return f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def __exit__(self, *exc):
+        # Requests still waiting for a document get a 503
+        self.ready.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _discard_print_job(proc, server, out_dir):
+    if proc.poll() is None:
+        proc.kill()
+        proc.wait()
+    server.__exit__(None, None, None)
+    shutil.rmtree(out_dir, ignore_errors=True)
+
+
+class ChromePrintJob:
+    """One headless Chrome --print-to-pdf run, launched before its document
+    exists.
+
+    Chrome starts at once and requests the document from a loopback
+    server that holds the response until finish() supplies it, so browser
+    startup overlaps building the HTML. Chrome prints into a private temp
+    directory and finish() moves the PDF into place, so viewers never see
+    a half-written PDF. A job that is never finished is killed by cancel()
+    or at interpreter exit.
+    """
+
+    def __init__(self, chrome_path):
+        self.out_dir = tempfile.mkdtemp(prefix="gaicom-chrome-")
+        self.tmp_pdf = os.path.join(self.out_dir, "document.pdf")
+        self.server = LoopbackDocumentServer()
+        url = self.server.__enter__()
+        cmd = [
+            chrome_path,
+            "--headless",
+            "--disable-gpu",
+            "--no-sandbox",
+            "--run-all-compositor-stages-before-draw",
+            "--print-to-pdf=" + self.tmp_pdf,
+            "--print-to-pdf-no-header",
+            "--no-pdf-header-footer",
+            url,
+        ]
+        self.before = children_rusage()
+        try:
+            self.proc = subprocess.Popen(
+                cmd, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True
+            )
+        except OSError:
+            self.server.__exit__(None, None, None)
+            shutil.rmtree(self.out_dir, ignore_errors=True)
+            raise
+        self._discard = weakref.finalize(self, _discard_print_job, self.proc, self.server, self.out_dir)
+
+    def finish(self, full_html, pdf_path):
+        """Hand Chrome the document and wait for the PDF; returns whether
+        pdf_path was written."""
+        abs_pdf = os.path.abspath(pdf_path)
+        print("  Running Chrome headless...")
+        try:
+            self.server.set_document(full_html)
+            try:
+                _, stderr = self.proc.communicate(timeout=120)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+                self.proc.communicate()
+                raise
+            after = children_rusage()
+            if self.before and after:
+                # CPU covers Chrome and the helper processes it reaped; ru_maxrss is
+                # the largest single process, not the sum across Chrome's processes
+                TRACER.annotate(
+                    chrome_cpu_ms=round((after[0] - self.before[0]) * 1000, 1),
+                    chrome_peak_rss_mb=round(after[1], 1),
+                )
+            if self.proc.returncode != 0:
+                print(f"  Chrome stderr: {stderr[:500]}")
+            if not os.path.exists(self.tmp_pdf):
+                return False
+            tmp_pdf = f"{abs_pdf}.{os.getpid()}.tmp"
+            shutil.move(self.tmp_pdf, tmp_pdf)
+            os.replace(tmp_pdf, abs_pdf)
+            return True
+        finally:
+            self._discard()
+
+    def cancel(self):
+        """Kill Chrome and discard the job without printing."""
+        self._discard()
+
+
+def html_to_pdf_chrome(full_html, pdf_path, chrome_path):
+    """Use Chrome headless to convert an HTML string or HtmlDocument to PDF.
+
+    The document is served from memory over loopback rather than written
+    to disk.
+    """
+    return ChromePrintJob(chrome_path).finish(full_html, pdf_path)
+
+
+def find_chrome(chrome_path=None):
+    """Locate a Chrome/Chromium binary: explicit path, $CHROME_PATH,
+    CHROME_PATH, then CHROME_CANDIDATES on PATH."""
+    for candidate in [chrome_path, os.environ.get("CHROME_PATH"), CHROME_PATH] + CHROME_CANDIDATES:
+        if not candidate:
+            continue
+        if os.path.isfile(candidate):
+            return candidate
+        found = shutil.which(candidate)
+        if found:
+            return found
+    return chrome_path or CHROME_PATH
+
+
+# -------------------------------------------------------------------
+# Rendering backends
+# -------------------------------------------------------------------
+class Renderer:
+    """Interface for PDF rendering backends.
+
+    render() prints an HTML string or HtmlDocument to pdf_path (atomically)
+    and returns whether the PDF was written. engine identifies the layout
+    engine and is part of the build key, since different engines produce
+    different PDFs from the same HTML.
+
+    in_process marks engines that lay out the document in this Python
+    process; parallel chapter rendering gives them worker processes
+    instead of threads, since threads would share one interpreter.
+    """
+
+    name = None
+    label = None
+    engine = None
+    in_process = False
+
+    def start(self):
+        """Pay the renderer's startup cost ahead of the first render().
+
+        Called on a background thread while the document is being built.
+        """
+
+    def render(self, document, pdf_path):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class ChromeRenderer(Renderer):
+    """One-shot headless Chrome process per render.
+
+    start() launches the process for the next render ahead of time; it
+    waits on its loopback URL until render() supplies the document.
+    """
+
+    name = "chrome"
+    label = "Chrome headless"
+    engine = "chrome"
+
+    def __init__(self, chrome_path):
+        self.chrome_path = chrome_path
+        self.pending = None
+
+    def start(self):
+        if self.pending is None:
+            self.pending = ChromePrintJob(self.chrome_path)
+
+    def render(self, document, pdf_path):
+        job, self.pending = self.pending, None
+        if job is None:
+            return html_to_pdf_chrome(document, pdf_path, self.chrome_path)
+        return job.finish(document, pdf_path)
+
+    def close(self):
+        if self.pending is not None:
+            self.pending.cancel()
+            self.pending = None
+
 
-    print(f"  Running Chrome headless...")
-    result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+def _output_formats(value):
+    formats = [fmt.strip().lower() for fmt in value.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in OUTPUT_FORMATS]
+    if unknown or not formats:
+        raise argparse.ArgumentTypeError(
+            f"unknown format {', '.join(unknown) or repr(value)} (choose from {', '.join(OUTPUT_FORMATS)})"
+        )
+    return list(dict.fromkeys(formats))
 
-    if result.returncode != 0:
-        print(f"  Chrome stderr: {result.stderr[:500]}")
 
-    return os.path.exists(abs_pdf)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate the GAICOM documentation PDF.")
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="rebuild even if the build cache says the PDF is up to date",
+    )
+    parser.add_argument(
+        "--keep-html",
+        action="store_true",
+        help=f"also write the assembled HTML to {os.path.basename(HTML_FILE)} for debugging "
+             "(in batch mode, beside each PDF)",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="PATH",
+        help="write a Chrome trace-event JSON file with per-stage spans",
+    )
+    parser.add_argument(
+        "--renderer",
+        choices=["chrome", "chrome-warm", "weasyprint"],
+        default="chrome",
+        help="chrome: one-shot headless Chrome per build; "
+             "chrome-warm: reuse a background Chrome over the DevTools protocol; "
+             "weasyprint: pure-Python rendering, no browser needed",
+    )
+    parser.add_argument(
+        "--chrome-path",
+        help="Chrome/Chromium binary (default: $CHROME_PATH, the Windows install path, "
+             "or the first chrome/chromium found on PATH)",
+    )
+    parser.add_argument(
+        "--chrome-port",
+        type=int,
+        default=CHROME_DEBUG_PORT,
+        help="DevTools port for the warm renderer (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--parallel-chapters",
+        action="store_true",
+        help="render the front matter and each chapter separately in up to --tabs "
+             "concurrent renderers and merge the PDFs (needs pikepdf)",
+    )
+    parser.add_argument(
+        "--formats",
+        type=_output_formats,
+        default=["pdf"],
+        metavar="FORMATS",
+        help="comma-separated outputs built from one parse: pdf, html (one page per chapter, "
+             f"in {os.path.basename(SITE_DIR)}/), epub, search (gzipped JSON search index) (default: pdf)",
+    )
+    parser.add_argument(
+        "--optimize-pdf",
+        action="store_true",
+        help="merge duplicate objects, recompress streams and linearize the PDF "
+             "for fast web view (needs pikepdf or qpdf)",
+    )
+    parser.add_argument(
+        "--no-minify",
+        action="store_true",
+        help="keep the full stylesheet and the HTML formatting (for reading --keep-html output)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        metavar="DIR",
+        help="artifact store for converted chapters, images, fonts, diagrams and chunk PDFs; "
+             f"can be copied between machines (default: {os.path.basename(CACHE_DIR)}/artifacts)",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=int,
+        metavar="MB",
+        help=f"evict least recently used artifacts beyond this size (default: {ARTIFACT_STORE_MAX_MB})",
+    )
+    parser.add_argument(
+        "--batch",
+        nargs="+",
+        metavar="PATTERN",
+        help="render every markdown file matching these paths or globs instead of the GAICOM document",
+    )
+    parser.add_argument(
+        "--out-dir",
+        help="directory for batch PDFs, keeping the inputs' subdirectories "
+             "(default: next to each markdown file)",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="worker processes for markdown conversion in batch mode (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--tabs",
+        type=int,
+        default=4,
+        help="maximum concurrent renders in batch mode and with --parallel-chapters (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="rebuild the PDF whenever the markdown file is saved",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=0.4,
+        help="seconds the markdown must stay unchanged before a watch rebuild (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--serve",
+        nargs="?",
+        type=int,
+        const=DAEMON_PORT,
+        metavar="PORT",
+        help="run a render daemon on 127.0.0.1 (default port: %(const)s) serving POST /render "
+             "and GET /doc/<name>.pdf, with up to --tabs concurrent renders",
+    )
+    parser.add_argument(
+        "--doc-dir",
+        help="markdown directory for the daemon's GET /doc/<name>.pdf and relative images "
+             f"(default: the directory of {os.path.basename(MD_FILE)})",
+    )
+    parser.add_argument(
+        "--stop-browser",
+        action="store_true",
+        help="shut down the background Chrome used by --renderer chrome-warm and exit",
+    )
+    parser.add_argument(
+        "--download-fonts",
+        action="store_true",
+        help=f"download Inter and JetBrains Mono from Google Fonts into {os.path.relpath(FONT_CACHE_DIR)} and exit",
+    )
+    return parser.parse_args(argv)
 
 
-def main():
+# -------------------------------------------------------------------
+# Warm Chrome renderer over the DevTools protocol
+# -------------------------------------------------------------------
+class CDPError(RuntimeError):
+    """Raised when Chrome reports an error for a DevTools command."""
+
+
+class CDPConnection:
+    """Minimal blocking WebSocket client speaking the Chrome DevTools protocol."""
+
+    def __init__(self, ws_url, timeout=120):
+        parsed = urllib.parse.urlparse(ws_url)
+        self.sock = socket.create_connection((parsed.hostname, parsed.port or 80), timeout=timeout)
+        self._next_id = 0
+        self._events = []
+        self._buffer = b""
+        self._handshake(parsed.netloc, parsed.path or "/")
+
+    def _handshake(self, host, path):
+        key = base64.b64encode(os.urandom(16)).decode("ascii")
+        request = (
+            f"GET {path} HTTP/1.1\r\n"
+            f"Host: {host}\r\n"
+            "Upgrade: websocket\r\n"
+            "Connection: Upgrade\r\n"
+            f"Sec-WebSocket-Key: {key}\r\n"
+            "Sec-WebSocket-Version: 13\r\n\r\n"
+        )
+        self.sock.sendall(request.encode("ascii"))
+        while b"\r\n\r\n" not in self._buffer:
+            chunk = self.sock.recv(4096)
+            if not chunk:
+                raise ConnectionError("DevTools closed the connection during handshake")
+            self._buffer += chunk
+        header, self._buffer = self._buffer.split(b"\r\n\r\n", 1)
+        status = header.split(b"\r\n", 1)[0]
+        if status.split()[1:2] != [b"101"]:
+            raise ConnectionError(f"DevTools handshake failed: {status.decode(errors='replace')}")
+
+    def _read_exact(self, n):
+        while len(self._buffer) < n:
+            chunk = self.sock.recv(max(65536, n - len(self._buffer)))
+            if not chunk:
+                raise ConnectionError("DevTools connection closed")
+            self._buffer += chunk
+        data, self._buffer = self._buffer[:n], self._buffer[n:]
+        return data
+
+    def _send_frame(self, opcode, payload):
+        header = bytes([0x80 | opcode])
+        length = len(payload)
+        if length < 126:
+            header += bytes([0x80 | length])
+        elif length < 1 << 16:
+            header += bytes([0x80 | 126]) + struct.pack("!H", length)
+        else:
+            header += bytes([0x80 | 127]) + struct.pack("!Q", length)
+        # Client frames must be masked (RFC 6455 section 5.3)
+        mask = os.urandom(4)
+        key = (mask * (length // 4 + 1))[:length]
+        masked = (int.from_bytes(payload, "little") ^ int.from_bytes(key, "little")).to_bytes(length, "little")
+        self.sock.sendall(header + mask + masked)
+
+    def _recv_message(self):
+        message = b""
+        while True:
+            first, second = self._read_exact(2)
+            opcode = first & 0x0F
+            length = second & 0x7F
+            if length == 126:
+                length = struct.unpack("!H", self._read_exact(2))[0]
+            elif length == 127:
+                length = struct.unpack("!Q", self._read_exact(8))[0]
+            payload = self._read_exact(length)
+            if opcode == 0x8:
+                raise ConnectionError("DevTools connection closed")
+            if opcode == 0x9:
+                self._send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            message += payload
+            if first & 0x80:
+                return json.loads(message.decode("utf-8"))
+
+    def call(self, method, **params):
+        """Send a command and block until its result arrives."""
+        self._next_id += 1
+        msg_id = self._next_id
+        self._send_frame(0x1, json.dumps({"id": msg_id, "method": method, "params": params}).encode("utf-8"))
+        while True:
+            msg = self._recv_message()
+            if msg.get("id") == msg_id:
+                if "error" in msg:
+                    raise CDPError(f"{method}: {msg['error'].get('message')}")
+                return msg.get("result", {})
+            if "method" in msg:
+                self._events.append(msg)
+
+    def wait_event(self, method):
+        """Block until the named event arrives, consuming earlier ones."""
+        while True:
+            while self._events:
+                event = self._events.pop(0)
+                if event["method"] == method:
+                    return event.get("params", {})
+            msg = self._recv_message()
+            if "method" in msg:
+                self._events.append(msg)
+
+    def clear_events(self):
+        self._events = []
+
+    def close(self):
+        try:
+            self._send_frame(0x8, b"")
+        except OSError:
+            pass
+        self.sock.close()
+
+
+def _devtools_json(port, path, timeout=1.0, method="GET"):
+    req = urllib.request.Request(f"http://127.0.0.1:{port}{path}", method=method)
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+class WarmChromeRenderer(Renderer):
+    """Render PDFs in a long-lived headless Chrome, in a tab of its own.
+
+    The browser is launched detached on CHROME_DEBUG_PORT and left running
+    after the build, so later builds attach to it and skip browser startup.
+    If it has died, it is launched again on the next render. Every
+    renderer opens its own tab and closes it in close(), so concurrent
+    renderers and builds sharing the browser never print each other's page.
+    """
+
+    name = "chrome-warm"
+    label = "warm Chrome (DevTools)"
+    engine = "chrome"
+    # Renderers in one process connect concurrently in batch mode and with
+    # --parallel-chapters; only the first may launch the browser
+    _launch_lock = threading.Lock()
+
+    def __init__(self, chrome_path, port=CHROME_DEBUG_PORT, profile_dir=CHROME_PROFILE_DIR):
+        self.chrome_path = chrome_path
+        self.port = port
+        self.profile_dir = profile_dir
+        self.conn = None
+        self.target_id = None
+
+    def _browser_alive(self):
+        try:
+            _devtools_json(self.port, "/json/version", timeout=0.5)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def _launch_browser(self):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        cmd = [
+            self.chrome_path,
+            "--headless=new",
+            "--disable-gpu",
+            "--no-sandbox",
+            "--no-first-run",
+            "--no-default-browser-check",
+            "--run-all-compositor-stages-before-draw",
+            f"--remote-debugging-port={self.port}",
+            f"--user-data-dir={self.profile_dir}",
+            "about:blank",
+        ]
+        kwargs = {"stdin": subprocess.DEVNULL, "stdout": subprocess.DEVNULL, "stderr": subprocess.DEVNULL}
+        if os.name == "nt":
+            kwargs["creationflags"] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            kwargs["start_new_session"] = True
+        print(f"  Launching background Chrome on port {self.port}...")
+        subprocess.Popen(cmd, **kwargs)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if self._browser_alive():
+                return
+            time.sleep(0.1)
+        raise RuntimeError(f"Chrome did not open DevTools on port {self.port}")
+
+    def _connect(self):
+        with self._launch_lock:
+            if not self._browser_alive():
+                self._launch_browser()
+            else:
+                print(f"  Reusing background Chrome on port {self.port}")
+        target = _devtools_json(self.port, "/json/new?about:blank", method="PUT")
+        self.target_id = target["id"]
+        self.conn = CDPConnection(target["webSocketDebuggerUrl"])
+        self.conn.call("Page.enable")
+
+    def _render_once(self, full_html, pdf_path):
+        if self.conn is None:
+            self._connect()
+        conn = self.conn
+        conn.clear_events()
+        # The tab loads the document from a loopback server that streams
+        # its parts, so it is never joined into one string here
+        with LoopbackDocumentServer(full_html) as url:
+            conn.call("Page.navigate", url=url)
+            conn.wait_event("Page.loadEventFired")
+            conn.call(
+                "Runtime.evaluate",
+                expression="document.fonts.ready.then(() => true)",
+                awaitPromise=True,
+            )
+        result = conn.call(
+            "Page.printToPDF",
+            printBackground=True,
+            preferCSSPageSize=True,
+            displayHeaderFooter=False,
+            transferMode="ReturnAsStream",
+        )
+        handle = result["stream"]
+        tmp_path = f"{pdf_path}.{os.getpid()}.tmp"
+        try:
+            try:
+                with open(tmp_path, "wb") as f:
+                    while True:
+                        chunk = conn.call("IO.read", handle=handle, size=PDF_STREAM_CHUNK)
+                        data = chunk.get("data", "")
+                        f.write(base64.b64decode(data) if chunk.get("base64Encoded") else data.encode("latin-1"))
+                        if chunk.get("eof"):
+                            break
+            finally:
+                conn.call("IO.close", handle=handle)
+            os.replace(tmp_path, pdf_path)
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+
+    def start(self):
+        """Attach to (or launch) the background Chrome and open the tab."""
+        if self.conn is None:
+            self._connect()
+
+    def render(self, full_html, pdf_path):
+        """Print an HTML string to pdf_path, relaunching Chrome once if it died."""
+        abs_pdf = os.path.abspath(pdf_path)
+        try:
+            self._render_once(full_html, abs_pdf)
+        except OSError:
+            print("  Background Chrome connection lost, relaunching...")
+            self.close()
+            self._render_once(full_html, abs_pdf)
+        return os.path.exists(abs_pdf)
+
+    def close(self):
+        """Drop the connection; the browser itself keeps running."""
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+        if self.target_id is not None:
+            try:
+                urllib.request.urlopen(
+                    f"http://127.0.0.1:{self.port}/json/close/{self.target_id}", timeout=2
+                ).close()
+            except OSError:
+                pass
+            self.target_id = None
+
+    def shutdown(self):
+        """Close the background browser entirely."""
+        if not self._browser_alive():
+            return False
+        ws_url = _devtools_json(self.port, "/json/version")["webSocketDebuggerUrl"]
+        conn = CDPConnection(ws_url)
+        try:
+            conn.call("Browser.close")
+        except OSError:
+            pass
+        self.close()
+        return True
+
+
+class WeasyPrintRenderer(Renderer):
+    """Pure-Python HTML/CSS-to-PDF rendering with WeasyPrint (no browser)."""
+
+    name = "weasyprint"
+    label = "WeasyPrint"
+    engine = "weasyprint"
+    in_process = True
+
+    def __init__(self, base_url=None):
+        try:
+            import weasyprint
+        except (ImportError, OSError) as exc:
+            # WeasyPrint raises OSError when its Pango libraries are missing
+            raise RuntimeError(
+                "The weasyprint renderer needs `pip install weasyprint` and the Pango "
+                f"system libraries ({exc})"
+            ) from exc
+        self.weasyprint = weasyprint
+        self.base_url = base_url or os.path.dirname(os.path.abspath(MD_FILE))
+
+    def render(self, full_html, pdf_path):
+        abs_pdf = os.path.abspath(pdf_path)
+        tmp_pdf = f"{abs_pdf}.{os.getpid()}.tmp"
+        # Stream the parts to a file for WeasyPrint to read rather than
+        # joining them into one more copy of the document
+        fd, tmp_html = tempfile.mkstemp(prefix="gaicom-", suffix=".html")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.writelines([full_html] if isinstance(full_html, str) else full_html)
+            html = self.weasyprint.HTML(filename=tmp_html, base_url=self.base_url, encoding="utf-8")
+            html.write_pdf(tmp_pdf)
+            os.replace(tmp_pdf, abs_pdf)
+        finally:
+            for path in (tmp_html, tmp_pdf):
+                with contextlib.suppress(OSError):
+                    os.remove(path)
+        return True
+
+
+RENDERERS = {
+    cls.name: cls for cls in (ChromeRenderer, WarmChromeRenderer, WeasyPrintRenderer)
+}
+
+
+_WORKER_RENDERER = None
+
+
+def init_render_worker(renderer_name):
+    """Process-pool initializer for in-process engines: one renderer per
+    worker process, so renders do not share an interpreter."""
+    global _WORKER_RENDERER
+    _WORKER_RENDERER = RENDERERS[renderer_name]()
+
+
+def render_in_worker(document, pdf_path):
+    """Process-pool worker: render with this process's renderer."""
+    return _WORKER_RENDERER.render(document, pdf_path)
+
+
+def make_renderer(args):
+    """Create the renderer selected by --renderer."""
+    if args.renderer == "weasyprint":
+        return WeasyPrintRenderer()
+    chrome_path = find_chrome(args.chrome_path)
+    if args.renderer == "chrome-warm":
+        return WarmChromeRenderer(chrome_path, port=args.chrome_port)
+    return ChromeRenderer(chrome_path)
+
+
+# -------------------------------------------------------------------
+# PDF post-optimization
+# -------------------------------------------------------------------
+def _pdf_object_key(obj, pikepdf):
+    """Identity of an object's contents, with references kept as "n g R"."""
+    if isinstance(obj, pikepdf.Stream):
+        meta = pikepdf.Dictionary({k: v for k, v in obj.stream_dict.items() if k != "/Length"})
+        return b"stream" + meta.unparse(resolved=True) + hashlib.sha256(obj.read_raw_bytes()).digest()
+    return obj.unparse(resolved=True)
+
+
+def _relink_pdf_object(obj, targets, pikepdf):
+    """Repoint references inside obj, including nested direct containers."""
+    if isinstance(obj, pikepdf.Array):
+        keys = range(len(obj))
+    elif isinstance(obj, (pikepdf.Dictionary, pikepdf.Stream)):
+        keys = list(obj.keys())
+    else:
+        return
+    for key in keys:
+        value = obj[key]
+        if getattr(value, "is_indirect", False):
+            target = targets.get(value.objgen)
+            if target is not None:
+                obj[key] = target
+        else:
+            _relink_pdf_object(value, targets, pikepdf)
+
+
+def dedupe_pdf_objects(pdf):
+    """Merge identical indirect objects of an open pikepdf.Pdf.
+
+    Chrome writes a fresh copy of repeated fonts, images, gradients and
+    graphics states for many pages. Repeats until merging exposes no new
+    duplicates (objects that differed only in references to merged
+    copies). Pages and the page tree are never merged. Returns the number
+    of objects dropped; qpdf leaves the orphans out on save.
+    """
+    import pikepdf
+
+    structural = {pikepdf.Name.Page, pikepdf.Name.Pages, pikepdf.Name.Catalog}
+    dropped = set()
+    while True:
+        canonical, targets = {}, {}
+        for obj in pdf.objects:
+            if obj.objgen in dropped or not isinstance(obj, (pikepdf.Dictionary, pikepdf.Array, pikepdf.Stream)):
+                continue
+            if isinstance(obj, pikepdf.Dictionary) and obj.get("/Type") in structural:
+                continue
+            first = canonical.setdefault(_pdf_object_key(obj, pikepdf), obj)
+            if first.objgen != obj.objgen:
+                targets[obj.objgen] = first
+        if not targets:
+            return len(dropped)
+        for obj in pdf.objects:
+            if obj.objgen not in dropped:
+                _relink_pdf_object(obj, targets, pikepdf)
+        _relink_pdf_object(pdf.trailer, targets, pikepdf)
+        dropped.update(targets)
+
+
+def optimize_pdf(pdf_path):
+    """Deduplicate, recompress and linearize a rendered PDF in place.
+
+    Uses pikepdf when installed, else the qpdf command line, which
+    recompresses and linearizes but cannot merge duplicates. Returns
+    (bytes before, bytes after, objects merged), or None when neither
+    tool is available.
+    """
+    before = os.path.getsize(pdf_path)
+    tmp_path = f"{pdf_path}.{os.getpid()}.tmp"
+    try:
+        import pikepdf
+    except ImportError:
+        pikepdf = None
+
+    if pikepdf is not None:
+        pikepdf.settings.set_flate_compression_level(9)
+        try:
+            with pikepdf.open(pdf_path) as pdf:
+                merged = dedupe_pdf_objects(pdf)
+                pdf.remove_unreferenced_resources()
+                pdf.save(
+                    tmp_path,
+                    linearize=True,
+                    object_stream_mode=pikepdf.ObjectStreamMode.generate,
+                    compress_streams=True,
+                    recompress_flate=True,
+                    stream_decode_level=pikepdf.StreamDecodeLevel.generalized,
+                )
+        except pikepdf.PdfError as exc:
+            raise RuntimeError(f"pikepdf failed: {exc}") from exc
+    else:
+        qpdf = shutil.which("qpdf")
+        if qpdf is None:
+            return None
+        merged = 0
+        result = subprocess.run(
+            [qpdf, "--linearize", "--object-streams=generate", "--recompress-flate",
+             "--compression-level=9", pdf_path, tmp_path],
+            capture_output=True,
+            text=True,
+        )
+        # Exit status 3 means the output was written with warnings
+        if result.returncode not in (0, 3):
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise RuntimeError(f"qpdf failed: {result.stderr.strip()}")
+    os.replace(tmp_path, pdf_path)
+    return before, os.path.getsize(pdf_path), merged
+
+
+def report_pdf_optimization(result):
+    """One-line summary of an optimize_pdf() result."""
+    if result is None:
+        return "PDF optimization skipped: install pikepdf or qpdf"
+    before, after, merged = result
+    saved = (before - after) / before * 100 if before else 0.0
+    merged_note = f", {merged} duplicate objects merged" if merged else ""
+    return f"Optimized PDF: {before / 1024:,.0f} KB → {after / 1024:,.0f} KB ({saved:.1f}% smaller{merged_note})"
+
+
+# -------------------------------------------------------------------
+# Parallel chapter rendering
+#
+# The cover and TOC render as one chunk with the normal @page rules;
+# every chapter renders as its own document with the margin-box page
+# numbers switched off. The chunk PDFs are merged in order, named
+# destinations are carried over so TOC links still resolve, and the
+# page numbers are stamped afterwards so they continue across chapters.
+#
+# Chrome only emits link annotations for targets inside the same
+# document, so the front chunk carries an empty, zero-height stand-in
+# for every TOC target. Its TOC links then become /Link annotations to
+# named destinations, which the merge points at the chapters' headings.
+# -------------------------------------------------------------------
+CHAPTER_CHUNK_CSS = """
+@page { @bottom-center { content: none; } }
+@page :first { margin: 0.9in 0.85in 1in 0.85in; }
+"""
+FRONT_CHUNK_CSS = """
+.toc-link-targets { height: 0; overflow: hidden; }
+"""
+_TOC_HREF_RE = re.compile(r'href="#([^"]+)"')
+PAGE_NUMBER_SIZE = 9
+PAGE_NUMBER_BASELINE = 33  # points above the page bottom, mid-way down the 1in margin
+PAGE_NUMBER_RGB = "0.392 0.455 0.545"  # --slate-500
+
+
+def toc_link_targets(toc_html):
+    """The TOC with an empty element for each of its link targets, so a
+    front matter rendered on its own still links its entries."""
+    targets = "".join(f'<span id="{slug}"></span>' for slug in _TOC_HREF_RE.findall(toc_html))
+    if not targets:
+        return toc_html
+    block = f'  <div class="toc-link-targets">{targets}</div>\n'
+    end = toc_html.rfind("</div>")
+    if end < 0:
+        return toc_html + block
+    return toc_html[:end] + block + toc_html[end:]
+
+
+def build_render_chunks(cover_html, toc_html, fragments, font_css="", minify=True):
+    """HtmlDocuments to render separately: front matter, then one per
+    non-empty chapter fragment. With minify each chunk keeps only the
+    style rules its own HTML can match."""
+    chunks = [build_document(cover_html, toc_link_targets(toc_html), [""], font_css, FRONT_CHUNK_CSS, minify)]
+    for fragment in fragments:
+        if fragment.strip():
+            chunks.append(build_document("", "", [fragment], font_css, CHAPTER_CHUNK_CSS, minify))
+    return chunks
+
+
+def _named_destinations(pdf):
+    """(catalog /Dests entries, /Names /Dests name tree entries) of a PDF."""
+    import pikepdf
+
+    root = pdf.Root
+    dests = dict(root.Dests.items()) if "/Dests" in root else {}
+    tree = {}
+    if "/Names" in root and "/Dests" in root.Names:
+        tree = dict(pikepdf.NameTree(root.Names.Dests).items())
+    return dests, tree
+
+
+def _link_target(annot):
+    """Named destination of a /Link annotation, or None."""
+    import pikepdf
+
+    target = annot.get("/Dest")
+    if target is None and "/A" in annot and annot.A.get("/S") == pikepdf.Name.GoTo:
+        target = annot.A.get("/D")
+    if isinstance(target, pikepdf.Name):
+        return str(target)[1:]
+    if isinstance(target, pikepdf.String):
+        return str(target)
+    return None
+
+
+def unresolved_links(pdf):
+    """[(page index, name)] of links to named destinations the PDF lacks."""
+    dests, tree = _named_destinations(pdf)
+    known = {name[1:] for name in dests} | set(tree)
+    missing = []
+    for index, page in enumerate(pdf.pages):
+        for annot in page.obj.get("/Annots", []):
+            if annot.get("/Subtype") != "/Link":
+                continue
+            name = _link_target(annot)
+            if name is not None and name not in known:
+                missing.append((index, name))
+    return missing
+
+
+def stamp_page_numbers(pdf, first_index):
+    """Print 1-based page numbers on pages[first_index:], matching the
+    @bottom-center position of the stylesheet."""
+    import pikepdf
+
+    font = pdf.make_indirect(pikepdf.Dictionary(
+        Type=pikepdf.Name.Font,
+        Subtype=pikepdf.Name.Type1,
+        BaseFont=pikepdf.Name.Helvetica,
+        Encoding=pikepdf.Name.WinAnsiEncoding,
+    ))
+    for index in range(first_index, len(pdf.pages)):
+        page = pdf.pages[index]
+        number = str(index + 1)
+        x0, y0, x1, _ = (float(v) for v in page.mediabox)
+        # Helvetica digits are all 0.556 em wide
+        x = (x0 + x1) / 2 - len(number) * PAGE_NUMBER_SIZE * 0.556 / 2
+        name = page.add_resource(font, pikepdf.Name.Font, prefix="PN")
+        # Isolate Chrome's graphics state so the stamp uses default user space
+        page.contents_add(pdf.make_stream(b"q\n"), prepend=True)
+        page.contents_add(pdf.make_stream(
+            f"\nQ\nq BT {name} {PAGE_NUMBER_SIZE} Tf {PAGE_NUMBER_RGB} rg "
+            f"{x:.2f} {y0 + PAGE_NUMBER_BASELINE:.2f} Td ({number}) Tj ET Q\n".encode("ascii")
+        ))
+
+
+def merge_chunk_pdfs(chunk_paths, pdf_path):
+    """Concatenate chunk PDFs into pdf_path, keeping named destinations and
+    numbering every page after the first chunk. Returns the page count.
+
+    The first chunk's destinations are the stand-in TOC targets and are
+    dropped, so its links resolve to the later chunks' headings. Links
+    left without a destination are reported.
+    """
+    import pikepdf
+
+    merged = pikepdf.new()
+    dests, tree = {}, {}
+    sources = []
+    try:
+        for index, path in enumerate(chunk_paths):
+            src = pikepdf.open(path)
+            sources.append(src)
+            with warnings.catch_warnings():
+                # Newer pikepdf warns that extend() drops named destinations;
+                # they are copied below
+                warnings.filterwarnings("ignore", message="Copying pages from another Pdf")
+                merged.pages.extend(src.pages)
+            if index == 0:
+                continue
+            src_dests, src_tree = _named_destinations(src)
+            # Destinations point at the source's pages; copying maps them
+            # onto the pages just appended
+            for name, dest in src_dests.items():
+                dests[name] = merged.copy_foreign(src.make_indirect(dest))
+            for name, dest in src_tree.items():
+                tree[name] = merged.copy_foreign(src.make_indirect(dest))
+        front_pages = len(sources[0].pages) if sources else 0
+        stamp_page_numbers(merged, front_pages)
+        if dests:
+            merged.Root.Dests = pikepdf.Dictionary(dests)
+        if tree:
+            name_tree = pikepdf.NameTree.new(merged)
+            for name, dest in tree.items():
+                name_tree[name] = dest
+            merged.Root.Names = pikepdf.Dictionary(Dests=name_tree.obj)
+        missing = unresolved_links(merged)
+        if missing:
+            names = ", ".join(name for _, name in missing[:5])
+            print(f"  ⚠ {len(missing)} links have no destination in the merged PDF: {names}")
+        tmp_path = f"{pdf_path}.{os.getpid()}.tmp"
+        merged.save(tmp_path)
+        os.replace(tmp_path, pdf_path)
+        return len(merged.pages)
+    finally:
+        for src in sources:
+            src.close()
+
+
+def render_chunks_parallel(chunks, pdf_path, renderers, engine, store=ARTIFACTS):
+    """Render HTML chunks concurrently, one per available renderer, and
+    merge the results into pdf_path.
+
+    renderers is a queue.Queue of Renderer instances; its size bounds
+    the concurrency. Browser renderers are driven from threads; in-process
+    engines render in a pool of as many worker processes. Chunk PDFs are cached in the store by engine and
+    HTML, so an edit re-renders only the chapters it touched. Returns
+    (ok, merged page count). Raises RuntimeError when pikepdf is not
+    installed.
+    """
+    try:
+        import pikepdf  # noqa: F401
+    except ImportError:
+        raise RuntimeError("parallel chapter rendering needs pikepdf to merge the chapter PDFs")
+
+    def render_chunk(index, chunk_html, out_dir):
+        path = os.path.join(out_dir, f"chunk-{index:04d}.pdf")
+        key = artifact_key(GENERATOR_VERSION, engine, *chunk_html.encoded_parts())
+        cached = store.get("chunks", key)
+        if cached is not None:
+            with open(path, "wb") as f:
+                f.write(cached)
+            return path
+        renderer = renderers.get()
+        try:
+            with TRACER.span(f"render chunk {index}", renderer=renderer.name, input_chars=len(chunk_html)):
+                if process_pool is not None:
+                    rendered = process_pool.submit(render_in_worker, chunk_html, path).result()
+                else:
+                    rendered = renderer.render(chunk_html, path)
+                if not rendered:
+                    return None
+        finally:
+            renderers.put(renderer)
+        with open(path, "rb") as f:
+            store.put("chunks", key, f.read())
+        return path
+
+    workers = renderers.qsize()
+    in_process = [r for r in list(renderers.queue) if r.in_process]
+    with contextlib.ExitStack() as stack:
+        process_pool = None
+        if in_process and workers > 1:
+            process_pool = stack.enter_context(concurrent.futures.ProcessPoolExecutor(
+                workers, initializer=init_render_worker, initargs=(in_process[0].name,)))
+        out_dir = stack.enter_context(tempfile.TemporaryDirectory(prefix="gaicom-chunks-"))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            paths = list(pool.map(render_chunk, range(len(chunks)), chunks, [out_dir] * len(chunks)))
+        if None in paths:
+            return False, 0
+        with TRACER.span("merge_chunks", chunks=len(paths)) as span:
+            pages = merge_chunk_pdfs(paths, pdf_path)
+            span["pages"] = pages
+    return True, pages
+
+
+# -------------------------------------------------------------------
+# HTML site and EPUB output
+#
+# Both reuse the converted chapter fragments, TOC, cover and font CSS of
+# the PDF build, so each format only adds its own serialization. Every
+# non-empty chapter becomes one page (or EPUB content document), and
+# #id links are rewritten to the page that holds the target.
+# -------------------------------------------------------------------
+SITE_CSS = """
+body.site-page { max-width: 76rem; margin: 0 auto; padding: 1rem 1.25rem 3rem; }
+.site-layout { display: grid; grid-template-columns: 16rem minmax(0, 1fr); gap: 2.5rem; align-items: start; }
+.site-toc { position: sticky; top: 0; max-height: 100vh; overflow-y: auto; padding: 1rem 0; }
+.site-toc .toc-page { padding: 0; }
+.site-toc .toc-page h2 { font-size: 13pt; }
+.site-toc .toc-underline { margin-bottom: 12px; }
+.site-toc .toc-columns { column-count: 1; }
+.site-nav { display: flex; justify-content: space-between; gap: 1rem; margin: 1rem 0; font-size: 0.9rem; }
+.site-nav a { color: var(--accent-dark); text-decoration: none; }
+.site-page .section-break { display: none; }
+@media (max-width: 800px) {
+    .site-layout { display: block; }
+    .site-toc { position: static; max-height: 40vh; border-bottom: 1px solid var(--slate-200); margin-bottom: 1rem; }
+}
+"""
+# Written as Netlify / Cloudflare Pages _headers. The stylesheet name
+# carries its content hash, so it can be cached for good; pages keep the
+# hosts' default revalidation. For S3, upload assets/ with
+# `aws s3 sync site/assets s3://bucket/assets --cache-control "<value>"`.
+SITE_ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+EPUB_CSS = """
+.cover-page { width: auto; height: auto; min-height: 0; padding: 3em 1em; }
+"""
+_ID_ATTR_RE = re.compile(r"""\sid=["']([^"']+)["']""")
+_FRAGMENT_HREF_RE = re.compile(r"""(\shref=)(["'])#([^"']+)\2""")
+_XHTML_VOID_ELEMENTS = frozenset("area base br col embed hr img input link meta source track wbr".split())
+_TAG_ATTR_NAMES_RE = re.compile(r"""([^\s"'=<>/]+)(?:\s*=\s*(?:"[^"]*"|'[^']*'|[^\s>]+))?""")
+
+
+def chapter_title(fragment):
+    """Plain-text title of a chapter fragment: its first h2, if any."""
+    m = re.search(r"<h2\b[^>]*>(.*?)</h2>", fragment, re.S)
+    return html_lib.unescape(re.sub(r"<[^>]+>", "", m.group(1))).strip() if m else ""
+
+
+def chapter_pages(fragments, ext):
+    """[(file name, fragment)] for the non-empty chapter fragments."""
+    return [(f"chapter-{index:02d}{ext}", fragment) for index, fragment in enumerate(fragments) if fragment.strip()]
+
+
+def page_owners(pages):
+    """Map each element id in [(file name, html)] to the page holding it."""
+    owner = {}
+    for name, html in pages:
+        for element_id in _ID_ATTR_RE.findall(html):
+            owner.setdefault(element_id, name)
+    return owner
+
+
+def relink_html(name, html, owner):
+    """Point #id links in page name at the page owner says holds the id."""
+    def replace(m):
+        target = owner.get(m.group(3), name)
+        return m.group(0) if target == name else f"{m.group(1)}{m.group(2)}{target}#{m.group(3)}{m.group(2)}"
+    return _FRAGMENT_HREF_RE.sub(replace, html)
+
+
+def relink_pages(pages):
+    """Point #id links in [(file name, html)] at the page holding the id."""
+    owner = page_owners(pages)
+    return [(name, relink_html(name, html, owner)) for name, html in pages]
+
+
+class _XhtmlWriter(html.parser.HTMLParser):
+    """Re-serialize HTML as well-formed XHTML, keeping the original case
+    of tag and attribute names (which SVG needs)."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self.stack = []
+
+    def _open(self, tag, attrs, self_closing):
+        raw = self.get_starttag_text()
+        name = re.match(r"<([^\s/>]+)", raw).group(1)
+        names = _TAG_ATTR_NAMES_RE.findall(raw[len(name) + 1:].rstrip("/>"))
+        if len(names) != len(attrs):
+            names = [key for key, _ in attrs]
+        out = [f"<{name}"]
+        for attr_name, (key, value) in zip(names, attrs):
+            out.append(f' {attr_name}="{html_lib.escape(key if value is None else value)}"')
+        if tag in _XHTML_VOID_ELEMENTS or self_closing:
+            out.append("/>")
+        else:
+            out.append(">")
+            self.stack.append(name)
+        self.out.append("".join(out))
+
+    def handle_starttag(self, tag, attrs):
+        self._open(tag, attrs, False)
+
+    def handle_startendtag(self, tag, attrs):
+        self._open(tag, attrs, True)
+
+    def handle_endtag(self, tag):
+        for depth in range(len(self.stack) - 1, -1, -1):
+            if self.stack[depth].lower() == tag:
+                # Close anything left open inside it as well
+                while len(self.stack) > depth:
+                    self.out.append(f"</{self.stack.pop()}>")
+                return
+
+    def handle_data(self, data):
+        self.out.append(html_lib.escape(data, quote=False))
+
+    def close(self):
+        super().close()
+        while self.stack:
+            self.out.append(f"</{self.stack.pop()}>")
+
+
+def to_xhtml(html):
+    """Well-formed XHTML for an HTML fragment; comments are dropped."""
+    writer = _XhtmlWriter()
+    writer.feed(html)
+    writer.close()
+    return "".join(writer.out)
+
+
+def site_stylesheet(pages, font_css="", extra_css=SITE_CSS):
+    """One stylesheet for every page: the font faces, then the document
+    CSS pruned to the rules some page can match."""
+    css, _ = prune_css(CSS + highlight_css() + extra_css, collect_used_selectors(html for _, html in pages))
+    return font_css + css
+
+
+def site_page(title, stylesheet, nav, content, sidebar=""):
+    """One site page; with a sidebar, the TOC sits beside the content
+    (above it on narrow screens)."""
+    body = f"""{nav}
+<div class="doc-content">
+{content}
+</div>
+{nav}"""
+    if sidebar:
+        body = f'<div class="site-layout">\n<nav class="site-toc">{sidebar}</nav>\n<main>\n{body}\n</main>\n</div>'
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{html_lib.escape(title)}</title>
+    <link rel="stylesheet" href="{stylesheet}">
+</head>
+<body class="site-page">
+{body}
+</body>
+</html>
+"""
+
+
+def write_html_site(site_dir, cover_html, toc_items, fragments, font_css=""):
+    """Write the document as a static site, one page per `## N.` chapter.
+
+    index.html carries the cover and the full TOC. Chapter pages carry a
+    TOC sidebar listing every chapter plus the current chapter's
+    sections, so a reader downloads one chapter at a time. All pages
+    share one stylesheet named by its content hash under assets/, with a
+    _headers file that lets hosts cache it indefinitely. Returns the
+    number of pages written.
+    """
+    chapters = chapter_pages(fragments, ".html")
+    owner = page_owners(chapters)
+    title = DOCUMENT_TITLE
+    pages = [("index.html", title, cover_html + relink_html("index.html", build_toc_html(toc_items), owner), "")]
+    for name, fragment in chapters:
+        sections = [item for item in toc_items if item[0] <= 2 or owner.get(item[2]) == name]
+        sidebar = relink_html(name, build_toc_html(sections), owner)
+        pages.append((name, f"{chapter_title(fragment)} - {title}", relink_html(name, fragment, owner), sidebar))
+
+    def render(index, stylesheet):
+        name, page_title, content, sidebar = pages[index]
+        links = [f'<a href="{pages[index - 1][0]}">← Previous</a>' if index else "<span></span>"]
+        links.append('<a href="index.html">Contents</a>')
+        links.append(f'<a href="{pages[index + 1][0]}">Next →</a>' if index + 1 < len(pages) else "<span></span>")
+        nav = f'<nav class="site-nav">{"".join(links)}</nav>'
+        return site_page(page_title, stylesheet, nav, content, sidebar)
+
+    css = site_stylesheet([(page[0], render(index, "")) for index, page in enumerate(pages)], font_css)
+    stylesheet = f"assets/style.{hashlib.sha256(css.encode('utf-8')).hexdigest()[:12]}.css"
+    os.makedirs(os.path.join(site_dir, "assets"), exist_ok=True)
+    atomic_write(os.path.join(site_dir, stylesheet), css)
+    atomic_write(os.path.join(site_dir, "_headers"), f"/assets/*\n  Cache-Control: {SITE_ASSET_CACHE_CONTROL}\n")
+    for index, page in enumerate(pages):
+        atomic_write(os.path.join(site_dir, page[0]), render(index, stylesheet))
+
+    # Chapters and stylesheets from earlier builds
+    written = {page[0] for page in pages} | {os.path.basename(stylesheet)}
+    stale = [os.path.join(site_dir, "style.css")]
+    stale += glob.glob(os.path.join(site_dir, "chapter-*.html")) + glob.glob(os.path.join(site_dir, "assets", "style.*.css"))
+    for path in stale:
+        if os.path.basename(path) not in written and os.path.exists(path):
+            os.remove(path)
+    return len(pages)
+
+
+def _epub_nav(toc_items, owner):
+    """EPUB 3 navigation list: chapters with their sections nested."""
+    out = ["<ol>"]
+    in_sections = False
+    for level, title, slug in toc_items:
+        link = f'<a href="{owner.get(slug, "")}#{slug}">{title}</a>'
+        if level <= 2:
+            out.append("</ol></li>" if in_sections else "</li>" if len(out) > 1 else "")
+            out.append(f"<li>{link}")
+            in_sections = False
+        else:
+            if not in_sections:
+                out.append("<ol>")
+                in_sections = True
+            out.append(f"<li>{link}</li>")
+    out.append("</ol></li>" if in_sections else "</li>" if len(out) > 1 else "")
+    out.append("</ol>")
+    return "".join(out)
+
+
+def epub_document(title, body, epub_type=""):
+    """An EPUB 3 XHTML content document around body (already XHTML)."""
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops" lang="en" xml:lang="en">
+<head>
+<meta charset="utf-8"/>
+<title>{html_lib.escape(title)}</title>
+<link rel="stylesheet" type="text/css" href="style.css"/>
+</head>
+<body{f' epub:type="{epub_type}"' if epub_type else ""}>
+{body}
+</body>
+</html>
+"""
+
+
+def write_epub(epub_path, cover_html, toc_items, fragments, font_css=""):
+    """Write the document as an EPUB 3 book with one content document per
+    chapter and a navigation document built from the TOC. Returns the
+    number of chapters."""
+    title = DOCUMENT_TITLE
+    chapters = relink_pages(chapter_pages(fragments, ".xhtml"))
+    nav = to_xhtml(
+        f'<nav epub:type="toc" id="toc"><h2>Table of Contents</h2>{_epub_nav(toc_items, page_owners(chapters))}</nav>'
+    )
+
+    files = [("cover.xhtml", epub_document(title, to_xhtml(cover_html), "cover"), "")]
+    files.append(("nav.xhtml", epub_document("Table of Contents", nav), "nav"))
+    for name, html in chapters:
+        body = f'<div class="doc-content">{to_xhtml(html)}</div>'
+        files.append((name, epub_document(chapter_title(html) or title, body), "svg" if "<svg" in html else ""))
+    css = site_stylesheet([(name, content) for name, content, _ in files], font_css, EPUB_CSS)
+
+    book_id = uuid.uuid5(uuid.NAMESPACE_URL, "https://gaicom.org/docs/system-documentation")
+    modified = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    manifest = ['<item id="css" href="style.css" media-type="text/css"/>']
+    spine = []
+    for name, _, properties in files:
+        item_id = os.path.splitext(name)[0]
+        props = f' properties="{properties}"' if properties in ("nav", "svg") else ""
+        manifest.append(f'<item id="{item_id}" href="{name}" media-type="application/xhtml+xml"{props}/>')
+        spine.append(f'<itemref idref="{item_id}"/>')
+    opf = f"""<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id" xml:lang="en">
+<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+<dc:identifier id="book-id">urn:uuid:{book_id}</dc:identifier>
+<dc:title>{html_lib.escape(title)}</dc:title>
+<dc:creator>{html_lib.escape(DOCUMENT_AUTHOR)}</dc:creator>
+<dc:publisher>{html_lib.escape(DOCUMENT_PUBLISHER)}</dc:publisher>
+<dc:language>en</dc:language>
+<meta property="dcterms:modified">{modified}</meta>
+</metadata>
+<manifest>
+{chr(10).join(manifest)}
+</manifest>
+<spine>
+{chr(10).join(spine)}
+</spine>
+</package>
+"""
+    container = """<?xml version="1.0" encoding="utf-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+<rootfiles>
+<rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/>
+</rootfiles>
+</container>
+"""
+    tmp_path = f"{epub_path}.{os.getpid()}.tmp"
+    with zipfile.ZipFile(tmp_path, "w", zipfile.ZIP_DEFLATED) as book:
+        # The mimetype entry must come first and be stored uncompressed
+        book.writestr("mimetype", "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        book.writestr("META-INF/container.xml", container)
+        book.writestr("OEBPS/content.opf", opf)
+        book.writestr("OEBPS/style.css", css)
+        for name, content, _ in files:
+            book.writestr(f"OEBPS/{name}", content)
+    os.replace(tmp_path, epub_path)
+    return len(chapters)
+
+
+# -------------------------------------------------------------------
+# Search index
+#
+# An inverted index from terms to the heading anchors of the TOC (h2
+# and h3), with the word positions of each occurrence so clients can
+# rank and match phrases. Sections are tokenized independently and
+# cached by a hash of their text, so a rebuild only re-indexes the
+# sections that changed; merging the cached postings is cheap.
+# -------------------------------------------------------------------
+SEARCH_INDEX_VERSION = 1
+_SEARCH_HEADING_RE = re.compile(r"""<h([23])\b[^>]*\sid=["']([^"']+)["'][^>]*>(.*?)</h\1>""", re.S)
+_SEARCH_SKIP_RE = re.compile(r"<(script|style)\b.*?</\1>|<[^>]+>", re.S | re.I)
+
+
+def _plain_text(html):
+    return html_lib.unescape(_SEARCH_SKIP_RE.sub(" ", html))
+
+
+def search_sections(fragment):
+    """[(anchor, title, section html)] for the h2/h3 sections of a fragment.
+
+    Text before the first heading belongs to an untitled section with an
+    empty anchor.
+    """
+    sections = []
+    anchor, title, start = "", "", 0
+    for m in _SEARCH_HEADING_RE.finditer(fragment):
+        sections.append((anchor, title, fragment[start:m.start()]))
+        anchor, title, start = m.group(2), " ".join(_plain_text(m.group(3)).split()), m.start()
+    sections.append((anchor, title, fragment[start:]))
+    return [section for section in sections if section[0] or _plain_text(section[2]).strip()]
+
+
+def index_section(text, store=ARTIFACTS):
+    """({term: [word positions]}, whether it was re-indexed) for plain
+    text, cached in the store by its hash."""
+    key = artifact_key(SEARCH_INDEX_VERSION, text)
+    try:
+        return json.loads(store.get_text("search", key)), False
+    except (TypeError, ValueError):
+        pass
+    postings = {}
+    for position, word in enumerate(re.findall(r"\w+", text.lower())):
+        postings.setdefault(word, []).append(position)
+    store.put_text("search", key, json.dumps(postings, separators=(",", ":")))
+    return postings, True
+
+
+def build_search_index(fragments, store=ARTIFACTS):
+    """Build the inverted index for the chapter fragments.
+
+    Returns (index, sections re-indexed). index["sections"] lists
+    [anchor, title, site page] and index["terms"] maps each term to a
+    flat [section, [positions]] list with delta-encoded positions.
+    """
+    sections, terms, reindexed = [], {}, 0
+    for chapter, fragment in enumerate(fragments):
+        page = f"chapter-{chapter:02d}.html"
+        for anchor, title, html in search_sections(fragment):
+            postings, fresh = index_section(_plain_text(html), store)
+            reindexed += fresh
+            for term, positions in postings.items():
+                deltas = [positions[0]] + [b - a for a, b in zip(positions, positions[1:])]
+                terms.setdefault(term, []).extend((len(sections), deltas))
+            sections.append([anchor, title, page])
+    index = {
+        "version": SEARCH_INDEX_VERSION,
+        "document": DOCUMENT_TITLE,
+        "sections": sections,
+        "terms": dict(sorted(terms.items())),
+    }
+    return index, reindexed
+
+
+def write_search_index(path, index):
+    """Write the index as gzip-compressed compact JSON; returns its size."""
+    data = gzip.compress(json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), mtime=0)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return len(data)
+
+
+# -------------------------------------------------------------------
+# Overlapped preparation
+#
+# A single build starts the browser and prepares its assets on
+# background threads as soon as the build cache misses. Browser startup
+# is a child process and image resampling runs in Pillow without the
+# GIL, so both overlap the markdown stages on the main thread; the
+# document goes to the started browser as soon as it is assembled.
+# -------------------------------------------------------------------
+def start_renderer(args):
+    """Create the selected renderer and run its startup.
+
+    A failed early start is not fatal: the renderer starts again at
+    render time and reports the error there.
+    """
+    with TRACER.span("start_renderer", renderer=args.renderer):
+        renderer = make_renderer(args)
+        try:
+            renderer.start()
+        except (OSError, RuntimeError) as exc:
+            print(f"  ⚠ Could not start {renderer.label} early ({exc}); retrying at render time")
+        return renderer
+
+
+def prepare_assets(md_text, base_dir, font_dir=None):
+    """Optimize referenced images and load the font subsetter; returns the
+    number of images prepared.
+
+    Font subsetting itself needs the assembled text, and mermaid
+    diagrams lay out in milliseconds during conversion, so neither is
+    moved here.
+    """
+    with TRACER.span("prepare_assets") as span:
+        span["images"] = prefetch_images(md_text, base_dir)
+        if find_local_fonts(font_dir):
+            with contextlib.suppress(ImportError):
+                from fontTools import subset  # noqa: F401
+        return span["images"]
+
+
+# -------------------------------------------------------------------
+# Batch mode
+# -------------------------------------------------------------------
+def expand_batch_inputs(patterns):
+    """Expand paths and globs into a sorted, de-duplicated list of files."""
+    paths = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True)
+        if not matches and os.path.isfile(pattern):
+            matches = [pattern]
+        paths.update(os.path.abspath(m) for m in matches if os.path.isfile(m))
+    return sorted(paths)
+
+
+def batch_pdf_paths(md_paths, out_dir=None):
+    """Map each markdown file to its PDF path.
+
+    PDFs go beside their markdown, or with out_dir under the same path
+    relative to the inputs' common directory, so docs/a/README.md and
+    docs/b/README.md become <out_dir>/a/README.pdf and <out_dir>/b/README.pdf.
+    Raises ValueError if two inputs would still write the same PDF.
+    """
+    root = os.path.commonpath([os.path.dirname(p) for p in md_paths]) if out_dir and md_paths else None
+    pdf_paths = {}
+    owners = {}
+    for md_path in md_paths:
+        base = os.path.splitext(md_path)[0] + ".pdf"
+        pdf_path = os.path.join(out_dir, os.path.relpath(base, root)) if out_dir else base
+        owner = owners.setdefault(os.path.normcase(os.path.abspath(pdf_path)), md_path)
+        if owner != md_path:
+            raise ValueError(f"{owner} and {md_path} would both write {pdf_path}")
+        pdf_paths[md_path] = pdf_path
+    return pdf_paths
+
+
+def prepare_batch_document(md_path, md_text, minify=True):
+    """Process-pool worker: convert one markdown file to full HTML."""
+    start = time.perf_counter()
+    base_dir = os.path.dirname(os.path.abspath(md_path))
+    full_html, stats = build_document_html(md_text, base_dir=base_dir, minify=minify)
+    stats["prepare_s"] = time.perf_counter() - start
+    return full_html, stats
+
+
+def run_batch(args):
+    """Render many markdown files: conversion in a process pool, rendering
+    through at most args.tabs concurrent renderers (Chrome tabs or processes).
+
+    In-process engines (WeasyPrint) render in a pool of worker processes
+    instead. Documents whose PDF is up to date are skipped before
+    conversion. A document that fails to convert or render is reported and
+    the rest of the batch carries on; the exit status is non-zero if any
+    failed. With --keep-html each document's HTML is written beside its PDF.
+    """
+    md_paths = expand_batch_inputs(args.batch)
+    if not md_paths:
+        print("No markdown files matched.")
+        sys.exit(1)
+    try:
+        pdf_paths = batch_pdf_paths(md_paths, args.out_dir)
+    except ValueError as exc:
+        print(f"✗ {exc}")
+        sys.exit(1)
+
+    manifest = load_manifest()
+    engine = RENDERERS[args.renderer].engine
+    in_process = RENDERERS[args.renderer].in_process
+    results = {}
+    pending = {}
+    for md_path in md_paths:
+        result = {
+            "pdf_path": pdf_paths[md_path],
+            "prepare_s": 0.0,
+            "render_s": 0.0,
+            "cached": False,
+            "ok": False,
+            "error": None,
+        }
+        results[md_path] = result
+        try:
+            md_text = read_markdown(md_path)
+        except OSError as exc:
+            result["error"] = f"cannot read: {exc}"
+            continue
+        result["build_key"] = compute_build_key(
+            md_text, engine, os.path.dirname(md_path), args.optimize_pdf, minify=not args.no_minify
+        )
+        if not args.force and is_cached_build(manifest, result["build_key"], result["pdf_path"]):
+            result.update(cached=True, ok=True)
+        else:
+            pending[md_path] = md_text
+
+    jobs = max(1, min(args.jobs, len(pending)))
+    tabs = max(1, min(args.tabs, len(pending)))
+    print(
+        f"Batch: {len(md_paths)} documents, {len(md_paths) - len(pending)} up to date, "
+        f"{jobs} conversion workers, {tabs} render slots"
+    )
+
+    def render_document(md_path, full_html):
+        result = results[md_path]
+        start = time.perf_counter()
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(result["pdf_path"])), exist_ok=True)
+            if args.keep_html:
+                atomic_write(os.path.splitext(result["pdf_path"])[0] + ".html", full_html)
+        except OSError as exc:
+            result["error"] = f"cannot write output: {exc}"
+            return md_path
+        if worker_pool is not None:
+            try:
+                result["ok"] = worker_pool.submit(render_in_worker, full_html, result["pdf_path"]).result()
+            except Exception as exc:
+                result["error"] = f"render failed: {exc}"
+        else:
+            renderer = renderers.get()
+            try:
+                result["ok"] = renderer.render(full_html, result["pdf_path"])
+            except Exception as exc:
+                # Drop a connection the failure may have broken; the next
+                # render through this renderer reconnects
+                renderer.close()
+                result["error"] = f"render failed: {exc}"
+            finally:
+                renderers.put(renderer)
+        if result["ok"] and args.optimize_pdf:
+            try:
+                optimize_pdf(result["pdf_path"])
+            except RuntimeError as exc:
+                print(f"  ⚠ {os.path.basename(result['pdf_path'])}: PDF optimization failed: {exc}")
+        result["render_s"] = time.perf_counter() - start
+        return md_path
+
+    wall_start = time.perf_counter()
+    renderers = queue.Queue()
+    worker_pool = None
+    try:
+        if pending and in_process:
+            # Fail here rather than in every worker if the engine is missing
+            make_renderer(args).close()
+            worker_pool = concurrent.futures.ProcessPoolExecutor(
+                tabs, initializer=init_render_worker, initargs=(args.renderer,)
+            )
+        elif pending:
+            for _ in range(tabs):
+                renderers.put(make_renderer(args))
+        # Spawned workers do not inherit --cache-dir / --cache-size
+        store_args = (ARTIFACTS.root, ARTIFACTS.max_bytes // (1024 * 1024))
+        with concurrent.futures.ProcessPoolExecutor(jobs, initializer=use_artifact_store, initargs=store_args) as prepare_pool, \
+                concurrent.futures.ThreadPoolExecutor(max_workers=tabs) as render_pool:
+            prepared = {
+                prepare_pool.submit(prepare_batch_document, md_path, md_text, not args.no_minify): md_path
+                for md_path, md_text in pending.items()
+            }
+            rendering = []
+            for future in concurrent.futures.as_completed(prepared):
+                md_path = prepared[future]
+                try:
+                    full_html, stats = future.result()
+                except Exception as exc:
+                    results[md_path]["error"] = f"conversion failed: {exc}"
+                    continue
+                results[md_path].update(stats)
+                rendering.append(render_pool.submit(render_document, md_path, full_html))
+            for future in concurrent.futures.as_completed(rendering):
+                result = results[future.result()]
+                if result["ok"]:
+                    record_build(manifest, result["build_key"], result["pdf_path"])
+    finally:
+        if worker_pool is not None:
+            worker_pool.shutdown()
+        while not renderers.empty():
+            renderers.get().close()
+    wall_s = time.perf_counter() - wall_start
+    save_manifest(manifest)
+
+    print("\n" + "=" * 78)
+    print(f"{'document':<36} {'prepare':>9} {'render':>9} {'total':>9} {'size':>10}  status")
+    print("-" * 78)
+    failed = 0
+    for md_path in md_paths:
+        r = results[md_path]
+        size = os.path.getsize(r["pdf_path"]) if os.path.exists(r["pdf_path"]) else 0
+        status = "cached" if r["cached"] else ("ok" if r["ok"] else "FAILED")
+        failed += not r["ok"]
+        print(
+            f"{os.path.basename(md_path)[:36]:<36} {r['prepare_s'] * 1000:>7.0f}ms "
+            f"{r['render_s'] * 1000:>7.0f}ms {(r['prepare_s'] + r['render_s']) * 1000:>7.0f}ms "
+            f"{size / 1024:>8.0f}KB  {status}"
+        )
+    print("-" * 78)
+    for md_path in md_paths:
+        if results[md_path]["error"]:
+            print(f"  ⚠ {os.path.basename(md_path)}: {results[md_path]['error']}")
+    print(f"{len(md_paths)} documents in {wall_s:.2f}s ({len(md_paths) / wall_s:.1f} docs/s), {failed} failed")
+    print("=" * 78)
+    if failed:
+        sys.exit(1)
+
+
+# -------------------------------------------------------------------
+# Watch mode
+# -------------------------------------------------------------------
+def rebuild_pdf(md_path, pdf_path, renderer, manifest, force=False, keep_html=False, optimize=False, minify=True):
+    """Quietly rebuild one PDF using the fragment cache.
+
+    Returns a stats dict, with "cached" set when the build cache was hit.
+    """
+    md_text = read_markdown(md_path)
+    base_dir = os.path.dirname(os.path.abspath(md_path))
+    build_key = compute_build_key(md_text, renderer.engine, base_dir, optimize, minify=minify)
+    if not force and is_cached_build(manifest, build_key, pdf_path):
+        return {"cached": True, "ok": True}
+    start = time.perf_counter()
+    full_html, stats = build_document_html(md_text, base_dir=base_dir, minify=minify)
+    if keep_html:
+        atomic_write(HTML_FILE, full_html)
+    stats["prepare_s"] = time.perf_counter() - start
+    start = time.perf_counter()
+    stats["ok"] = renderer.render(full_html, pdf_path)
+    stats["render_s"] = time.perf_counter() - start
+    stats["cached"] = False
+    if stats["ok"] and optimize:
+        try:
+            stats["optimized"] = optimize_pdf(pdf_path)
+        except RuntimeError:
+            stats["optimized"] = None
+    if stats["ok"]:
+        record_build(manifest, build_key, pdf_path)
+        save_manifest(manifest)
+    return stats
+
+
+def _file_signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def watch(args):
+    """Poll the markdown file and rebuild after each burst of saves settles."""
+    renderer = make_renderer(args)
+    manifest = load_manifest()
+
+    def rebuild(force):
+        # Spans are only reported per build; don't let them pile up
+        TRACER.reset()
+        start = time.perf_counter()
+        try:
+            stats = rebuild_pdf(
+                MD_FILE, PDF_FILE, renderer, manifest,
+                force=force, keep_html=args.keep_html, optimize=args.optimize_pdf, minify=not args.no_minify,
+            )
+        except Exception as exc:
+            # A bad edit or a dead browser must not end the session; drop
+            # the renderer's connection so the next rebuild reconnects
+            renderer.close()
+            print(f"[{time.strftime('%H:%M:%S')}] ⚠ Rebuild failed ({type(exc).__name__}: {exc}), keeping previous PDF")
+            return
+        stamp = time.strftime("%H:%M:%S")
+        if stats["cached"]:
+            print(f"[{stamp}] Up to date (cache hit)")
+        elif stats["ok"]:
+            print(
+                f"[{stamp}] Rebuilt in {(time.perf_counter() - start) * 1000:.0f} ms "
+                f"({stats['converted']}/{stats['chapters']} chapters converted, "
+                f"HTML {stats['prepare_s'] * 1000:.0f} ms, render {stats['render_s'] * 1000:.0f} ms)"
+            )
+        else:
+            print(f"[{stamp}] ⚠ Rebuild failed, keeping previous PDF")
+
+    print(f"Watching {MD_FILE} (Ctrl+C to stop)")
+    signature = _file_signature(MD_FILE)
+    try:
+        rebuild(args.force)
+        while True:
+            time.sleep(WATCH_POLL_INTERVAL)
+            current = _file_signature(MD_FILE)
+            if current == signature:
+                continue
+            # Debounce: wait until the file has stopped changing
+            while True:
+                time.sleep(args.debounce)
+                settled = _file_signature(MD_FILE)
+                if settled == current and settled is not None:
+                    break
+                current = settled
+            signature = current
+            rebuild(False)
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        renderer.close()
+
+
+# -------------------------------------------------------------------
+# Render daemon
+#
+# A long-running process that renders PDFs for other tools over HTTP on
+# 127.0.0.1, so they stop paying interpreter startup, imports and a
+# browser launch per document. Parsers, in-memory caches and browser
+# tabs stay warm between requests. PDFs are kept in the artifact store
+# under their build key, which is also the response ETag. Requests must
+# come from loopback (Host and Origin), and documents may only embed
+# images from inside the document directory.
+#
+#   POST /render           markdown body in, PDF out
+#   GET  /doc/<name>.pdf   <name>.md from the document directory
+# -------------------------------------------------------------------
+_DOC_PATH_RE = re.compile(r"^/doc/([\w.-]+)\.pdf$")
+_LOOPBACK_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+
+def _is_loopback(netloc):
+    """Whether a Host header or URL netloc names this machine."""
+    try:
+        return urllib.parse.urlsplit("//" + netloc).hostname in _LOOPBACK_HOSTS
+    except ValueError:
+        return False
+
+
+class RenderDaemon:
+    """Renders markdown to PDF bytes for the HTTP handler.
+
+    Renders run on a pool of args.tabs worker threads, each taking one of
+    as many started renderers, so the pool bounds the concurrent renders.
+    Concurrent requests for the same build share one render.
+    """
+
+    def __init__(self, args, doc_dir, store=ARTIFACTS):
+        self.args = args
+        self.doc_dir = doc_dir
+        self.store = store
+        self.engine = RENDERERS[args.renderer].engine
+        self.workers = max(1, args.tabs)
+        self.renderers = queue.Queue()
+        # Each worker thread builds its markdown parser once and keeps it
+        self.pool = concurrent.futures.ThreadPoolExecutor(
+            self.workers, thread_name_prefix="render", initializer=_markdown_converter
+        )
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def start(self):
+        """Create and start the renderers, so the first request is warm."""
+        for _ in range(self.workers):
+            renderer = make_renderer(self.args)
+            self.renderers.put(renderer)
+            renderer.start()
+
+    def close(self):
+        self.pool.shutdown(wait=True)
+        while not self.renderers.empty():
+            self.renderers.get().close()
+
+    def build_key(self, md_text):
+        return compute_build_key(
+            md_text, self.engine, self.doc_dir, self.args.optimize_pdf, minify=not self.args.no_minify
+        )
+
+    def pdf(self, md_text, build_key):
+        """(PDF bytes, stage timings) for md_text. The timings are
+        [(stage, wall ms)] of the render, or None for a cache hit."""
+        data = self.store.get("pdf", build_key)
+        if data is not None:
+            return data, None
+        with self.lock:
+            future = self.inflight.get(build_key)
+            if future is None:
+                future = self.inflight[build_key] = self.pool.submit(self._render, md_text, build_key)
+        return future.result()
+
+    def _render(self, md_text, build_key):
+        # Each render traces into its own list; concurrent renders would
+        # otherwise mix their spans in the shared tracer
+        with TRACER.capture() as events:
+            try:
+                data = self._render_pdf(md_text, build_key)
+            finally:
+                with self.lock:
+                    self.inflight.pop(build_key, None)
+        return data, [(name, wall_ms) for name, wall_ms, _ in TRACER.summary(events)]
+
+    def _render_pdf(self, md_text, build_key):
+        with TRACER.span("build_document"):
+            document, _ = build_document_html(
+                md_text, self.store, self.doc_dir, not self.args.no_minify, image_root=self.doc_dir
+            )
+        renderer = self.renderers.get()
+        try:
+            with TRACER.span("render", renderer=renderer.name):
+                with tempfile.TemporaryDirectory(prefix="gaicom-serve-") as out_dir:
+                    pdf_path = os.path.join(out_dir, "document.pdf")
+                    if not renderer.render(document, pdf_path):
+                        raise RuntimeError(f"{renderer.label} did not write a PDF")
+                    if self.args.optimize_pdf:
+                        try:
+                            optimize_pdf(pdf_path)
+                        except RuntimeError as exc:
+                            print(f"  ⚠ PDF optimization failed, serving the unoptimized PDF: {exc}")
+                    with open(pdf_path, "rb") as f:
+                        data = f.read()
+        except Exception:
+            # Drop a connection the failure may have broken; the next
+            # render through this renderer reconnects
+            renderer.close()
+            raise
+        finally:
+            self.renderers.put(renderer)
+        self.store.put("pdf", build_key, data)
+        return data
+
+    def handler(self):
+        """A request handler class bound to this daemon."""
+        daemon = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def from_loopback(self):
+                """Refuse requests whose Host or Origin is not loopback, so
+                neither a web page nor a DNS-rebound name can drive the daemon."""
+                origin = self.headers.get("Origin")
+                if _is_loopback(self.headers.get("Host", "")) and (
+                    origin is None or _is_loopback(urllib.parse.urlsplit(origin).netloc)
+                ):
+                    return True
+                self.send_error(403, "Only loopback clients may use the render daemon")
+                return False
+
+            def do_GET(self):
+                if not self.from_loopback():
+                    return
+                m = _DOC_PATH_RE.match(urllib.parse.urlsplit(self.path).path)
+                if not m:
+                    self.send_error(404)
+                    return
+                try:
+                    md_text = read_markdown(os.path.join(daemon.doc_dir, m.group(1) + ".md"))
+                except OSError:
+                    self.send_error(404, f"No {m.group(1)}.md in the document directory")
+                    return
+                self.send_pdf(md_text)
+
+            def do_POST(self):
+                if not self.from_loopback():
+                    return
+                if urllib.parse.urlsplit(self.path).path != "/render":
+                    self.send_error(404)
+                    return
+                length = self.headers.get("Content-Length", "")
+                if not length.isdigit():
+                    self.send_error(411)
+                    return
+                if int(length) > DAEMON_MAX_BODY:
+                    self.send_error(413, f"Markdown larger than {DAEMON_MAX_BODY // (1024 * 1024)} MB")
+                    return
+                try:
+                    md_text = self.rfile.read(int(length)).decode("utf-8")
+                except UnicodeDecodeError:
+                    self.send_error(400, "Markdown must be UTF-8")
+                    return
+                self.send_pdf(md_text)
+
+            def send_pdf(self, md_text):
+                etag = f'"{daemon.build_key(md_text)}"'
+                # Rendering has no side effects, so a matching ETag answers
+                # POST /render with 304 as well
+                known = set(re.findall(r'"[^"]*"|\*', self.headers.get("If-None-Match", "")))
+                if etag in known or "*" in known:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                try:
+                    data, timings = daemon.pdf(md_text, etag.strip('"'))
+                except ImagePathError as exc:
+                    self.send_error(403, str(exc))
+                    return
+                except (OSError, RuntimeError, ValueError) as exc:
+                    self.send_error(500, str(exc))
+                    return
+                except Exception as exc:
+                    # Renderer internals and timeouts still get a response
+                    self.log_error("render failed:\n%s", traceback.format_exc().rstrip())
+                    self.send_error(500, f"{type(exc).__name__}: {exc}")
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "application/pdf")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("ETag", etag)
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("X-Cache", "hit" if timings is None else "miss")
+                if timings:
+                    self.send_header(
+                        "Server-Timing", ", ".join(f"{name};dur={wall_ms:.1f}" for name, wall_ms in timings)
+                    )
+                self.end_headers()
+                # The client may have given up waiting for the render
+                with contextlib.suppress(OSError):
+                    self.wfile.write(data)
+
+            def log_message(self, fmt, *args):
+                print(f"[{time.strftime('%H:%M:%S')}] {fmt % args}")
+
+        return Handler
+
+
+def serve(args):
+    """Run the render daemon on 127.0.0.1 until interrupted."""
+    if args.renderer == "chrome":
+        # A Chrome launch per request is the cost the daemon exists to avoid
+        args.renderer = "chrome-warm"
+    daemon = RenderDaemon(args, os.path.abspath(args.doc_dir or os.path.dirname(MD_FILE)))
+    try:
+        daemon.start()
+        server = http.server.ThreadingHTTPServer(("127.0.0.1", args.serve), daemon.handler())
+    except (OSError, RuntimeError) as exc:
+        print(f"ERROR: {exc}")
+        daemon.close()
+        sys.exit(1)
+    label = RENDERERS[args.renderer].label
+    print(f"Serving on http://127.0.0.1:{server.server_address[1]}/ "
+          f"({daemon.workers} × {label}; Ctrl+C to stop)")
+    print("  POST /render          markdown in, PDF out")
+    print(f"  GET  /doc/<name>.pdf  <name>.md from {daemon.doc_dir}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopped serving.")
+    finally:
+        server.server_close()
+        daemon.close()
+        report = ARTIFACTS.report()
+        if report:
+            print(f"  {report}")
+
+
+def finish_trace(args):
+    """Print the per-stage timing summary and write the trace if requested."""
+    print("\n  Stage timings:")
+    for name, wall_ms, cpu_ms in TRACER.summary():
+        print(f"    {name:<20} {wall_ms:>9.1f} ms wall {cpu_ms:>9.1f} ms cpu")
+    if ARTIFACTS.report():
+        print(f"  {ARTIFACTS.report()}")
+    if args.trace:
+        TRACER.export(args.trace)
+        print(f"  ✓ Wrote trace: {args.trace}")
+
+
+def render_pdf(args, renderer, document, cover_html, toc_html, fragments, font_css):
+    """Render the assembled document to PDF_FILE, per chapter with
+    --parallel-chapters, then post-optimize it if requested. Closes the
+    renderer and returns whether the PDF was written."""
+    with TRACER.span("render", renderer=renderer.name, input_chars=len(document)) as span:
+        success = None
+        try:
+            if args.parallel_chapters:
+                chunks = build_render_chunks(cover_html, toc_html, fragments, font_css, minify=not args.no_minify)
+                renderers = queue.Queue()
+                renderers.put(renderer)
+                try:
+                    for _ in range(max(1, min(args.tabs, len(chunks))) - 1):
+                        renderers.put(make_renderer(args))
+                    print(f"  Rendering {len(chunks)} chunks in {renderers.qsize()} renderers...")
+                    success, pages = render_chunks_parallel(chunks, PDF_FILE, renderers, renderer.engine)
+                    if success:
+                        print(f"  ✓ Merged {len(chunks)} chunks into {pages} pages")
+                except RuntimeError as exc:
+                    print(f"  {exc}; rendering the whole document instead")
+                finally:
+                    # The first renderer stays open for the fallback below
+                    while not renderers.empty():
+                        extra = renderers.get()
+                        if extra is not renderer:
+                            extra.close()
+            if success is None:
+                success = renderer.render(document, PDF_FILE)
+        finally:
+            renderer.close()
+        if success:
+            span["output_bytes"] = os.path.getsize(PDF_FILE)
+    if success and args.optimize_pdf:
+        with TRACER.span("optimize_pdf") as span:
+            try:
+                result = optimize_pdf(PDF_FILE)
+                print(f"  {'✓ ' if result else ''}{report_pdf_optimization(result)}")
+                if result:
+                    span.update(input_bytes=result[0], output_bytes=result[1], merged=result[2])
+            except RuntimeError as exc:
+                print(f"  ⚠ PDF optimization failed, keeping the unoptimized PDF: {exc}")
+    return success
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    use_artifact_store(args.cache_dir, args.cache_size)
+
+    if args.stop_browser:
+        stopped = WarmChromeRenderer(find_chrome(args.chrome_path), port=args.chrome_port).shutdown()
+        print("✓ Background Chrome stopped" if stopped else "No background Chrome running")
+        return
+
+    if args.download_fonts:
+        print(f"Downloading Inter and JetBrains Mono into {FONT_CACHE_DIR}...")
+        try:
+            count = download_fonts()
+        except (OSError, ValueError) as exc:
+            print(f"✗ Font download failed: {exc}")
+            sys.exit(1)
+        print(f"✓ Downloaded {count} font files")
+        return
+
+    if args.batch:
+        run_batch(args)
+        return
+
+    if args.watch:
+        watch(args)
+        return
+
+    if args.serve is not None:
+        serve(args)
+        return
+
     print("=" * 60)
     print("GAICOM Documentation PDF Generator - Version 2.0")
     print("=" * 60)
+    steps = 6 + len(args.formats)
 
     # 1. Read markdown
-    print("\n[1/7] Reading markdown file...")
-    md_text = read_markdown(MD_FILE)
+    print(f"\n[1/{steps}] Reading markdown file...")
+    with TRACER.span("read_markdown") as span:
+        md_text = read_markdown(MD_FILE)
+        span["output_chars"] = len(md_text)
     print(f"  ✓ Read {len(md_text):,} characters")
 
-    # 2. Generate TOC
-    print("\n[2/7] Building table of contents...")
-    toc_items = build_toc_from_md(md_text)
-    toc_html = build_toc_html(toc_items)
+    with TRACER.span("build_cache_check", input_chars=len(md_text)) as span:
+        manifest = load_manifest()
+        build_key = compute_build_key(
+            md_text,
+            RENDERERS[args.renderer].engine,
+            optimize=args.optimize_pdf,
+            parallel=args.parallel_chapters,
+            minify=not args.no_minify,
+        )
+        outputs = {
+            "pdf": PDF_FILE,
+            "html": os.path.join(SITE_DIR, "index.html"),
+            "epub": EPUB_FILE,
+            "search": SEARCH_INDEX_FILE,
+        }
+        stale = [fmt for fmt in args.formats if args.force or not is_cached_build(manifest, build_key, outputs[fmt])]
+        span["hit"] = not stale
+    if not stale:
+        print(f"\n✓ Cache hit ({build_key[:12]}) - inputs unchanged, reusing existing output")
+        for fmt in args.formats:
+            print(f"  Output: {outputs[fmt]}")
+        finish_trace(args)
+        return
+    print(f"  Cache miss ({build_key[:12]}) - rebuilding {', '.join(stale)}")
+
+    # Start the browser and prepare images now, overlapping the markdown stages
+    prepare_pool = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="prepare")
+    renderer_future = prepare_pool.submit(start_renderer, args) if "pdf" in stale else None
+    assets_future = prepare_pool.submit(prepare_assets, md_text, os.path.dirname(MD_FILE))
+    prepare_pool.shutdown(wait=False)
+
+    # 2. Split into chapters
+    print(f"\n[2/{steps}] Splitting markdown into chapters...")
+    with TRACER.span("split_chapters", input_chars=len(md_text)) as span:
+        chapters = split_chapters(md_text)
+        span["chapters"] = len(chapters)
+    print(f"  ✓ Found {len(chapters)} chapters (including preamble)")
+    # Only one copy of the document is kept alive per stage: the chapters
+    # replace the markdown text, then the fragments replace the chapters
+    input_chars = len(md_text)
+    del md_text
+
+    # 3. Convert and enhance each chapter, reusing cached fragments
+    print(f"\n[3/{steps}] Converting chapters to styled HTML...")
+    with TRACER.span("convert_chapters", input_chars=input_chars) as span:
+        fragments, toc_tokens, converted = convert_chapters(chapters)
+        span.update(converted=converted, output_chars=sum(map(len, fragments)))
+    print(f"  ✓ {converted} converted, {len(chapters) - converted} reused from cache")
+    del chapters
+    with TRACER.span("embed_images") as span:
+        # The background pass has put the images in the cache by now
+        assets_future.result()
+        image_stats = {"images": 0, "bytes_in": 0, "bytes_out": 0}
+        for index, fragment in enumerate(fragments):
+            fragments[index], stats = embed_images(fragment, os.path.dirname(MD_FILE))
+            for key in image_stats:
+                image_stats[key] += stats[key]
+        content_chars = sum(map(len, fragments))
+        span.update(image_stats)
+    if image_stats["images"]:
+        print(
+            f"  ✓ Embedded {image_stats['images']} images "
+            f"({image_stats['bytes_in'] / 1024:,.0f} KB → {image_stats['bytes_out'] / 1024:,.0f} KB)"
+        )
+    print(f"  ✓ Generated {content_chars:,} characters of HTML")
+
+    # 4. Generate TOC from the parser's heading tokens
+    print(f"\n[4/{steps}] Building table of contents...")
+    with TRACER.span("build_toc") as span:
+        toc_items = build_toc_from_tokens(toc_tokens)
+        toc_html = build_toc_html(toc_items)
+        span.update(sections=len(toc_items), output_chars=len(toc_html))
     print(f"  ✓ Found {len(toc_items)} sections")
 
-    # 3. Convert markdown to HTML
-    print("\n[3/7] Converting markdown to HTML...")
-    content_html = convert_md_to_html(md_text)
-    print(f"  ✓ Generated {len(content_html):,} characters of HTML")
-
-    # 4. Post-process HTML
-    print("\n[4/7] Enhancing HTML with professional styling...")
-    
-    print("    - Removing redundant H1 heading...")
-    content_html = remove_first_h1(content_html)
-    
-    print("    - Injecting architecture diagram...")
-    content_html = inject_architecture_diagram(content_html)
-    
-    print("    - Injecting flow diagrams...")
-    content_html = inject_flow_diagrams(content_html)
-    
-    print("    - Adding callout boxes...")
-    content_html = add_callout_boxes(content_html)
-    
-    print("    - Converting checkbox lists...")
-    content_html = convert_checkbox_lists(content_html)
-    
-    print("    - Adding section numbers and rules...")
-    content_html = add_section_numbers_and_rules(content_html)
-    
-    print("    - Adding code language labels...")
-    content_html = add_code_language_labels(content_html)
-    
-    print("  ✓ HTML enhancement complete")
-
     # 5. Build cover page
-    print("\n[5/7] Building cover page...")
-    cover_html = build_cover_page()
+    print(f"\n[5/{steps}] Building cover page...")
+    with TRACER.span("build_cover_page"):
+        cover_html = build_cover_page()
     print("  ✓ Cover page created")
 
     # 6. Assemble full HTML
-    print("\n[6/7] Assembling final HTML document...")
-    full_html = build_full_html(cover_html, toc_html, content_html)
-
-    # Write intermediate HTML
-    with open(HTML_FILE, "w", encoding="utf-8") as f:
-        f.write(full_html)
-    print(f"  ✓ Wrote intermediate HTML: {HTML_FILE}")
-
-    # 7. Convert to PDF
-    print("\n[7/7] Converting to PDF via Chrome headless...")
-    success = html_to_pdf_chrome(HTML_FILE, PDF_FILE, CHROME_PATH)
+    print(f"\n[6/{steps}] Assembling final HTML document...")
+    with TRACER.span("assemble", input_chars=content_chars) as span:
+        with TRACER.span("build_font_css") as sub:
+            font_css, font_faces = build_font_css([cover_html, toc_html, *fragments])
+            sub.update(faces=font_faces, output_chars=len(font_css))
+        with TRACER.span("build_document") as sub:
+            document = build_document(cover_html, toc_html, fragments, font_css, minify=not args.no_minify)
+            sub.update(document.stats)
+        span["output_chars"] = len(document)
+    # The document holds its own (minified) copy of every chapter, so keep
+    # the fragments only while another output still reads them
+    if not args.parallel_chapters and not {"html", "search", "epub"} & set(stale):
+        fragments = None
+    if font_faces:
+        print(f"  ✓ Embedded {font_faces} local font faces ({len(font_css):,} characters)")
+    else:
+        print("  Using system fonts (add Inter / JetBrains Mono to fonts/ or run --download-fonts to embed them)")
+
+    if document.stats:
+        print(f"  ✓ {report_minification(document.stats)}")
+    print(f"  ✓ Assembled {len(document):,} characters in {len(document.parts)} parts")
+    if args.keep_html:
+        with open(HTML_FILE, "w", encoding="utf-8") as f:
+            f.writelines(document)
+        print(f"  ✓ Wrote intermediate HTML: {HTML_FILE}")
+
+    # 7+. Serialize each requested format from the shared fragments
+    html_pages = epub_chapters = 0
+    success = True
+    for step, fmt in enumerate(args.formats, start=7):
+        if fmt not in stale:
+            print(f"\n[{step}/{steps}] {fmt.upper()} output up to date: {outputs[fmt]}")
+        elif fmt == "pdf":
+            try:
+                renderer = renderer_future.result()
+            except RuntimeError as exc:
+                print(f"\n  ERROR: {exc}")
+                sys.exit(1)
+            print(f"\n[{step}/{steps}] Converting to PDF via {renderer.label}...")
+            success = render_pdf(args, renderer, document, cover_html, toc_html, fragments, font_css)
+            document = None
+            if success and os.path.exists(PDF_FILE):
+                record_build(manifest, build_key, PDF_FILE)
+        elif fmt == "html":
+            print(f"\n[{step}/{steps}] Writing HTML site...")
+            with TRACER.span("write_html_site") as span:
+                html_pages = write_html_site(SITE_DIR, cover_html, toc_items, fragments, font_css)
+                span["pages"] = html_pages
+            record_build(manifest, build_key, outputs["html"])
+            print(f"  ✓ Wrote {html_pages} pages")
+        elif fmt == "search":
+            print(f"\n[{step}/{steps}] Building search index...")
+            with TRACER.span("build_search_index") as span:
+                index, reindexed = build_search_index(fragments)
+                span.update(sections=len(index["sections"]), reindexed=reindexed, terms=len(index["terms"]))
+                span["output_bytes"] = write_search_index(SEARCH_INDEX_FILE, index)
+            record_build(manifest, build_key, SEARCH_INDEX_FILE)
+            print(
+                f"  ✓ Indexed {len(index['sections'])} sections ({reindexed} re-indexed), "
+                f"{len(index['terms']):,} terms, {span['output_bytes'] / 1024:,.0f} KB"
+            )
+        else:
+            print(f"\n[{step}/{steps}] Writing EPUB...")
+            with TRACER.span("write_epub") as span:
+                epub_chapters = write_epub(EPUB_FILE, cover_html, toc_items, fragments, font_css)
+                span["chapters"] = epub_chapters
+            record_build(manifest, build_key, EPUB_FILE)
+            print(f"  ✓ Wrote {epub_chapters} chapters")
+    save_manifest(manifest)
 
     print("\n" + "=" * 60)
-    if success and os.path.exists(PDF_FILE):
+    if html_pages:
+        print(f"✓ HTML site: {SITE_DIR} ({html_pages} pages)")
+    if epub_chapters:
+        print(f"✓ EPUB: {EPUB_FILE} ({os.path.getsize(EPUB_FILE) / 1024:,.0f} KB)")
+    if "pdf" in stale and success and os.path.exists(PDF_FILE):
         size_mb = os.path.getsize(PDF_FILE) / (1024 * 1024)
         print("✓ PDF GENERATED SUCCESSFULLY!")
         print(f"  Output: {PDF_FILE}")
         print(f"  Size: {size_mb:.2f} MB")
-    else:
+    elif "pdf" in stale:
         print("⚠ PDF generation may have issues. Checking...")
         if os.path.exists(PDF_FILE):
             size_mb = os.path.getsize(PDF_FILE) / (1024 * 1024)
             print(f"  PDF exists at: {PDF_FILE} ({size_mb:.2f} MB)")
         else:
             print(f"  ERROR: PDF was not created at {PDF_FILE}")
-            print("  Try opening the HTML file directly in Chrome and printing to PDF:")
+            print("  Re-run with --keep-html, then open the HTML file in Chrome and print to PDF:")
             print(f"  {HTML_FILE}")
             sys.exit(1)
 
-    print(f"\n  Intermediate HTML kept at: {HTML_FILE}")
-    print("  (You can delete it after verifying the PDF)")
+    if args.keep_html:
+        print(f"\n  Intermediate HTML kept at: {HTML_FILE}")
+        print("  (You can delete it after verifying the PDF)")
+    finish_trace(args)
     print("=" * 60)
 
 
@@ -0,0 +1,58 @@
+"""Make generate_pdf.py importable from the tests.
+
+Run from the repository root with `python -m pytest tests`.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+
+import generate_pdf as gen  # noqa: E402
+
+
+@pytest.fixture
+def build_cache(tmp_path, monkeypatch):
+    """Point the artifact store and the build manifest into tmp_path."""
+    root, max_bytes = gen.ARTIFACTS.root, gen.ARTIFACTS.max_bytes
+    gen.use_artifact_store(str(tmp_path / "cache"))
+    manifest_path = str(tmp_path / "manifest.json")
+    load_manifest, save_manifest = gen.load_manifest, gen.save_manifest
+    monkeypatch.setattr(gen, "load_manifest", lambda path=manifest_path: load_manifest(path))
+    monkeypatch.setattr(gen, "save_manifest", lambda manifest, path=manifest_path: save_manifest(manifest, path))
+    yield manifest_path
+    gen.use_artifact_store(root)
+    gen.ARTIFACTS.max_bytes = max_bytes
+
+
+SAMPLE_MD = """# GAICOM SYSTEM DOCUMENTATION
+
+---
+
+Intro text.
+
+## 1. Getting Started
+
+### A. Install & Run
+
+Install it, then read [the API](#b-endpoints).
+
+## 2. API Reference
+
+### B. Endpoints
+
+Endpoints for `orders` & payments; see [install](#a-install-run).
+
+```js
+const orders = [];
+```
+"""
+
+
+@pytest.fixture
+def sample_document(build_cache):
+    """(cover html, TOC items, chapter fragments) of a two-chapter document."""
+    fragments, toc_tokens, _ = gen.convert_chapters(gen.split_chapters(SAMPLE_MD))
+    return gen.build_cover_page(), gen.build_toc_from_tokens(toc_tokens), fragments
@@ -0,0 +1,48 @@
+"""Tests for the content-addressed artifact store."""
+
+import os
+
+import generate_pdf as gen
+
+
+def _age(store, namespace, key, seconds):
+    path = store.path(namespace, key)
+    st = os.stat(path)
+    os.utime(path, (st.st_atime - seconds, st.st_mtime - seconds))
+
+
+def test_artifact_store_round_trip_and_stats(tmp_path):
+    store = gen.ArtifactStore(str(tmp_path))
+    assert store.get("ns", "ab12") is None
+    assert store.put("ns", "ab12", b"data")
+    assert store.get("ns", "ab12") == b"data"
+    assert store.stats["ns"]["hits"] == 1
+    assert store.stats["ns"]["misses"] == 1
+
+
+def test_artifact_store_overwrite_counts_only_the_difference(tmp_path):
+    store = gen.ArtifactStore(str(tmp_path))
+    store.put("ns", "aa", b"x" * 100)
+    store.put("ns", "aa", b"x" * 100)
+    store.put("ns", "aa", b"x" * 40)
+    assert store._size == 40
+    assert store._size == sum(size for _, size, _ in store._entries())
+
+
+def test_artifact_store_evicts_least_recently_used(tmp_path):
+    store = gen.ArtifactStore(str(tmp_path))
+    store.max_bytes = 250
+    store.put("ns", "aa", b"a" * 100)
+    store.put("ns", "bb", b"b" * 100)
+    _age(store, "ns", "aa", 20)
+    _age(store, "ns", "bb", 10)
+    # Reading refreshes an entry, so "bb" is now the oldest
+    assert store.get("ns", "aa") is not None
+
+    store.put("ns", "cc", b"c" * 100)
+
+    assert store.get("ns", "bb") is None
+    assert store.get("ns", "aa") == b"a" * 100
+    assert store.get("ns", "cc") == b"c" * 100
+    assert store.evicted == 1
+    assert store._size == 200
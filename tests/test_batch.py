@@ -0,0 +1,90 @@
+"""Tests for batch mode."""
+
+import os
+
+import pytest
+
+import generate_pdf as gen
+
+
+class FakeRenderer(gen.Renderer):
+    """Writes a stub PDF recording the rendering process id."""
+
+    name = "fake"
+    label = "fake"
+    engine = "fake"
+
+    def render(self, document, pdf_path):
+        with open(pdf_path, "w", encoding="utf-8") as f:
+            f.write(f"%PDF-stub pid={os.getpid()}\n")
+        return True
+
+
+class FakeInProcessRenderer(FakeRenderer):
+    name = "fake-in-process"
+    in_process = True
+
+
+@pytest.fixture
+def fake_renderers(monkeypatch):
+    monkeypatch.setitem(gen.RENDERERS, FakeRenderer.name, FakeRenderer)
+    monkeypatch.setitem(gen.RENDERERS, FakeInProcessRenderer.name, FakeInProcessRenderer)
+    monkeypatch.setattr(gen, "make_renderer", lambda args: gen.RENDERERS[args.renderer]())
+
+
+def _docs(tmp_path):
+    for name in ("a", "b"):
+        path = tmp_path / "docs" / name / "README.md"
+        path.parent.mkdir(parents=True)
+        path.write_text(f"# {name}\n\n## 1. Intro\n\nText of {name}.\n", encoding="utf-8")
+
+
+def _batch_args(pattern, renderer, *extra):
+    args = gen.parse_args(["--batch", pattern, "--jobs", "2", "--tabs", "2", *extra])
+    args.renderer = renderer
+    return args
+
+
+def test_pdfs_go_beside_their_markdown():
+    assert gen.batch_pdf_paths(["/d/a/x.md", "/d/b/y.md"]) == {"/d/a/x.md": "/d/a/x.pdf", "/d/b/y.md": "/d/b/y.pdf"}
+
+
+def test_out_dir_keeps_relative_subdirectories():
+    paths = gen.batch_pdf_paths(["/d/a/README.md", "/d/b/README.md", "/d/c.md"], "/out")
+    assert paths == {
+        "/d/a/README.md": "/out/a/README.pdf",
+        "/d/b/README.md": "/out/b/README.pdf",
+        "/d/c.md": "/out/c.pdf",
+    }
+    assert gen.batch_pdf_paths(["/d/a/README.md"], "/out") == {"/d/a/README.md": "/out/README.pdf"}
+
+
+def test_inputs_writing_the_same_pdf_are_rejected():
+    with pytest.raises(ValueError, match="would both write"):
+        gen.batch_pdf_paths(["/d/a.md", "/d/a.markdown"], "/out")
+
+
+def test_batch_writes_one_pdf_per_document(tmp_path, build_cache, fake_renderers):
+    _docs(tmp_path)
+    out_dir = tmp_path / "out"
+    gen.run_batch(_batch_args(str(tmp_path / "docs" / "**" / "*.md"), "fake", "--out-dir", str(out_dir), "--keep-html"))
+
+    for name in ("a", "b"):
+        assert (out_dir / name / "README.pdf").read_text().startswith("%PDF-stub")
+        assert f"Text of {name}." in (out_dir / name / "README.html").read_text(encoding="utf-8")
+    manifest = gen.load_manifest()
+    assert sorted(manifest) == sorted(str(out_dir / n / "README.pdf") for n in ("a", "b"))
+
+    # Nothing changed, so the second run renders nothing
+    before = {p: os.stat(p).st_mtime_ns for p in manifest}
+    gen.run_batch(_batch_args(str(tmp_path / "docs" / "**" / "*.md"), "fake", "--out-dir", str(out_dir)))
+    assert {p: os.stat(p).st_mtime_ns for p in manifest} == before
+
+
+def test_in_process_engines_render_in_worker_processes(tmp_path, build_cache, fake_renderers):
+    _docs(tmp_path)
+    gen.run_batch(_batch_args(str(tmp_path / "docs" / "**" / "*.md"), "fake-in-process"))
+
+    for name in ("a", "b"):
+        stub = (tmp_path / "docs" / name / "README.pdf").read_text()
+        assert f"pid={os.getpid()}" not in stub
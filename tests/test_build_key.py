@@ -0,0 +1,72 @@
+"""Tests for the build key and the build manifest."""
+
+import os
+
+import pytest
+
+import generate_pdf as gen
+
+MD = "# Title\n\n![diagram](img/diagram.png)\n\n## 1. Intro\n\nText.\n"
+
+
+@pytest.fixture
+def doc_dir(tmp_path):
+    (tmp_path / "img").mkdir()
+    (tmp_path / "img" / "diagram.png").write_bytes(b"png")
+    return str(tmp_path)
+
+
+def test_build_key_is_stable(doc_dir):
+    assert gen.compute_build_key(MD, base_dir=doc_dir) == gen.compute_build_key(MD, base_dir=doc_dir)
+
+
+@pytest.mark.parametrize("change", [
+    {"md_text": MD + "More.\n"},
+    {"engine": "weasyprint"},
+    {"optimize": True},
+    {"parallel": True},
+    {"minify": False},
+])
+def test_build_key_changes_with_each_input(doc_dir, change):
+    args = dict(md_text=MD, base_dir=doc_dir)
+    assert gen.compute_build_key(**{**args, **change}) != gen.compute_build_key(**args)
+
+
+def test_build_key_changes_when_a_referenced_image_changes(doc_dir):
+    before = gen.compute_build_key(MD, base_dir=doc_dir)
+    image = os.path.join(doc_dir, "img", "diagram.png")
+    with open(image, "wb") as f:
+        f.write(b"a different png")
+    assert gen.compute_build_key(MD, base_dir=doc_dir) != before
+
+
+def test_build_key_changes_with_the_stylesheet(doc_dir, monkeypatch):
+    before = gen.compute_build_key(MD, base_dir=doc_dir)
+    monkeypatch.setattr(gen, "CSS", gen.CSS + "\np { color: red; }")
+    assert gen.compute_build_key(MD, base_dir=doc_dir) != before
+
+
+def test_manifest_trusts_only_the_recorded_pdf(tmp_path):
+    pdf = tmp_path / "out.pdf"
+    pdf.write_bytes(b"%PDF-1.7 one")
+    manifest_path = str(tmp_path / "manifest.json")
+    manifest = {}
+    gen.record_build(manifest, "key-1", str(pdf))
+    gen.save_manifest(manifest, manifest_path)
+
+    manifest = gen.load_manifest(manifest_path)
+    assert gen.is_cached_build(manifest, "key-1", str(pdf))
+    assert not gen.is_cached_build(manifest, "key-2", str(pdf))
+
+    # A PDF replaced since the build is rebuilt even with the same key
+    pdf.write_bytes(b"%PDF-1.7 replaced")
+    assert not gen.is_cached_build(manifest, "key-1", str(pdf))
+    pdf.unlink()
+    assert not gen.is_cached_build(manifest, "key-1", str(pdf))
+
+
+def test_unreadable_manifest_is_empty(tmp_path):
+    path = tmp_path / "manifest.json"
+    path.write_text("{not json")
+    assert gen.load_manifest(str(path)) == {}
+    assert gen.load_manifest(str(tmp_path / "missing.json")) == {}
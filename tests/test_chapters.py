@@ -0,0 +1,64 @@
+"""Tests for splitting the markdown into chapters and converting them."""
+
+import generate_pdf as gen
+
+
+def test_split_chapters_at_numbered_headings():
+    md = "# Title\nIntro\n## 1. First\nOne\n## 2. Second\nTwo"
+    assert gen.split_chapters(md) == ["# Title\nIntro", "## 1. First\nOne", "## 2. Second\nTwo"]
+
+
+def test_split_chapters_ignores_fenced_code_and_unnumbered_headings():
+    md = "## 1. First\n```\n## 2. Not a chapter\n```\n## Notes\n~~~\n## 3. Nor this\n~~~"
+    assert gen.split_chapters(md) == [md]
+
+
+def test_split_chapters_keeps_the_text_intact():
+    md = "Intro\n\n## 1. A\n\ntext\n\n## 10. B\n"
+    assert "\n".join(gen.split_chapters(md)) == md
+
+
+def test_split_chapters_closes_a_fence_only_on_its_own_kind():
+    md = (
+        "## 1. First\n"
+        "~~~markdown\n"
+        "```\n"
+        "## 2. Inside the tilde fence\n"
+        "```\n"
+        "~~~\n"
+        "````\n"
+        "```\n"
+        "## 3. Inside the long fence\n"
+        "````\n"
+        "## 4. Second"
+    )
+    chapters = gen.split_chapters(md)
+    assert len(chapters) == 2
+    assert chapters[1] == "## 4. Second"
+
+
+def test_split_chapters_ignores_a_fence_closed_with_text_after_it():
+    md = "## 1. First\n```\n``` not a close\n## 2. Still code\n```\n## 3. Next"
+    assert gen.split_chapters(md)[1:] == ["## 3. Next"]
+
+
+# -------------------------------------------------------------------
+# Heading ids across chapters
+# -------------------------------------------------------------------
+def test_duplicate_heading_ids_are_renamed_with_their_links(tmp_path, capsys):
+    chapters = [
+        "## 1. One\n\n### Setup\n\nSee [setup](#setup).\n",
+        "## 2. Two\n\n### Setup\n\nSee [setup](#setup).\n",
+        "## 3. Three\n\nSee [the first setup](#setup).\n",
+    ]
+    fragments, toc_tokens, _ = gen.convert_chapters(chapters, gen.ArtifactStore(str(tmp_path)))
+
+    ids = [token["id"] for token in gen._flatten_toc_tokens(toc_tokens)]
+    assert len(ids) == len(set(ids))
+    assert 'id="setup"' in fragments[0] and 'href="#setup"' in fragments[0]
+    assert 'id="setup_1"' in fragments[1] and 'href="#setup_1"' in fragments[1]
+    # A link from a chapter without that heading is reported, not guessed
+    assert 'href="#setup"' in fragments[2]
+    out = capsys.readouterr().out
+    assert "Link to #setup in chapter 2 is ambiguous" in out
+    assert "chapter 0" not in out and "chapter 1 " not in out
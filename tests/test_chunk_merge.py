@@ -0,0 +1,75 @@
+"""Tests for merging per-chapter PDFs."""
+
+import pytest
+
+import generate_pdf as gen
+
+
+def _chunk_pdf(path, pages=1, links=(), dests=()):
+    """Write a PDF with /Link annotations on its first page and /Dests
+    pointing at its last page."""
+    pikepdf = pytest.importorskip("pikepdf")
+    pdf = pikepdf.new()
+    for _ in range(pages):
+        pdf.add_blank_page()
+    if links:
+        pdf.pages[0].obj.Annots = pdf.make_indirect(pikepdf.Array([
+            pikepdf.Dictionary(
+                Type=pikepdf.Name.Annot,
+                Subtype=pikepdf.Name.Link,
+                Rect=[0, 0, 10, 10],
+                Dest=pikepdf.Name("/" + name),
+            )
+            for name in links
+        ]))
+    if dests:
+        target = pdf.pages[-1].obj
+        pdf.Root.Dests = pikepdf.Dictionary(
+            {"/" + name: pikepdf.Array([target, pikepdf.Name.XYZ, 0, 0, 0]) for name in dests}
+        )
+    pdf.save(path)
+    return str(path)
+
+
+def test_merge_chunk_pdfs_resolves_toc_links_to_chapters(tmp_path, capsys):
+    pikepdf = pytest.importorskip("pikepdf")
+    paths = [
+        # The front chunk holds the TOC links and their stand-in targets
+        _chunk_pdf(tmp_path / "front.pdf", pages=2, links=["intro", "usage"], dests=["intro", "usage"]),
+        _chunk_pdf(tmp_path / "ch1.pdf", pages=3, dests=["intro"]),
+        _chunk_pdf(tmp_path / "ch2.pdf", pages=1, dests=["usage"]),
+    ]
+    out = str(tmp_path / "merged.pdf")
+
+    assert gen.merge_chunk_pdfs(paths, out) == 6
+    assert "⚠" not in capsys.readouterr().out
+    with pikepdf.open(out) as merged:
+        assert len(merged.pages) == 6
+        assert gen.unresolved_links(merged) == []
+        page_of = {page.obj.objgen: index for index, page in enumerate(merged.pages)}
+        assert page_of[merged.Root.Dests.intro[0].objgen] == 4
+        assert page_of[merged.Root.Dests.usage[0].objgen] == 5
+        links = [a for a in merged.pages[0].obj.Annots if a.Subtype == "/Link"]
+        assert [str(a.Dest) for a in links] == ["/intro", "/usage"]
+
+
+def test_merge_chunk_pdfs_reports_unresolved_links(tmp_path, capsys):
+    pikepdf = pytest.importorskip("pikepdf")
+    paths = [
+        _chunk_pdf(tmp_path / "front.pdf", links=["intro", "missing"], dests=["intro", "missing"]),
+        _chunk_pdf(tmp_path / "ch1.pdf", dests=["intro"]),
+    ]
+    out = str(tmp_path / "merged.pdf")
+
+    gen.merge_chunk_pdfs(paths, out)
+    assert "1 links have no destination" in capsys.readouterr().out
+    with pikepdf.open(out) as merged:
+        assert gen.unresolved_links(merged) == [(0, "missing")]
+
+
+def test_front_chunk_carries_toc_link_targets():
+    toc = '<div class="toc-page">\n  <a href="#intro">Intro</a>\n  <a href="#usage">Usage</a>\n</div>\n'
+    front = gen.toc_link_targets(toc)
+    assert '<span id="intro"></span><span id="usage"></span>' in front
+    assert front.endswith("</div>\n")
+    assert gen.toc_link_targets("<p>no links</p>") == "<p>no links</p>"
@@ -0,0 +1,17 @@
+"""Tests for CSS minification."""
+
+import generate_pdf as gen
+
+
+def test_minify_declaration_collapses_commas():
+    assert gen._minify_declaration(" font-family : Inter , sans-serif ") == "font-family:Inter,sans-serif"
+
+
+def test_minify_declaration_keeps_quoted_strings():
+    assert gen._minify_declaration('content: "a , b", " , "') == 'content:"a , b"," , "'
+    assert gen._minify_declaration("font-family: 'My , Font' , serif") == "font-family:'My , Font',serif"
+    assert gen._minify_declaration(r'content: "say \", hi" , x') == r'content:"say \", hi",x'
+
+
+def test_minify_declaration_leaves_non_declarations_alone():
+    assert gen._minify_declaration("not a declaration") == "not a declaration"
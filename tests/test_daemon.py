@@ -0,0 +1,160 @@
+"""Tests for the render daemon's HTTP responses."""
+
+import http.client
+import http.server
+import threading
+
+import pytest
+
+import generate_pdf as gen
+
+MD = "# Doc\n\n## 1. Intro\n\nText.\n"
+
+
+class FakeRenderer(gen.Renderer):
+    """Writes a stub PDF, or raises for markdown containing "boom"."""
+
+    name = "fake"
+    label = "fake"
+    engine = "fake"
+
+    def render(self, document, pdf_path):
+        if "boom" in str(document):
+            raise KeyError("renderer exploded")
+        with open(pdf_path, "wb") as f:
+            f.write(b"%PDF-stub\n")
+        return True
+
+
+@pytest.fixture
+def daemon(tmp_path, build_cache, monkeypatch):
+    """(host, port) of a daemon serving tmp_path/docs with the fake renderer."""
+    monkeypatch.setitem(gen.RENDERERS, FakeRenderer.name, FakeRenderer)
+    monkeypatch.setattr(gen, "make_renderer", lambda args: gen.RENDERERS[args.renderer]())
+    doc_dir = tmp_path / "docs"
+    doc_dir.mkdir()
+    (doc_dir / "guide.md").write_text(MD, encoding="utf-8")
+    (tmp_path / "secret.png").write_bytes(b"not for the daemon")
+    args = gen.parse_args(["--serve", "0", "--tabs", "1"])
+    args.renderer = FakeRenderer.name
+    render_daemon = gen.RenderDaemon(args, str(doc_dir))
+    render_daemon.start()
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), render_daemon.handler())
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server.server_address
+    server.shutdown()
+    server.server_close()
+    render_daemon.close()
+
+
+def request(address, method, path, body=None, headers=None):
+    conn = http.client.HTTPConnection(*address, timeout=10)
+    try:
+        conn.request(method, path, body=body, headers=headers or {})
+        response = conn.getresponse()
+        return response, response.read()
+    finally:
+        conn.close()
+
+
+def test_render_then_cache_hit(daemon):
+    response, data = request(daemon, "POST", "/render", MD.encode())
+    assert response.status == 200
+    assert data.startswith(b"%PDF")
+    assert response.getheader("X-Cache") == "miss"
+    assert "render;dur=" in response.getheader("Server-Timing")
+    etag = response.getheader("ETag")
+
+    response, data = request(daemon, "POST", "/render", MD.encode())
+    assert response.status == 200
+    assert response.getheader("X-Cache") == "hit"
+    assert response.getheader("ETag") == etag
+
+
+def test_matching_etag_is_not_modified(daemon):
+    etag = request(daemon, "GET", "/doc/guide.pdf")[0].getheader("ETag")
+    response, data = request(daemon, "GET", "/doc/guide.pdf", headers={"If-None-Match": etag})
+    assert response.status == 304
+    assert data == b""
+    response, _ = request(daemon, "POST", "/render", MD.encode(), {"If-None-Match": f'"other", {etag}'})
+    assert response.status == 304
+    response, _ = request(daemon, "POST", "/render", MD.encode() + b"More.\n", {"If-None-Match": etag})
+    assert response.status == 200
+
+
+@pytest.mark.parametrize("method, path, body, status", [
+    ("GET", "/doc/missing.pdf", None, 404),
+    ("GET", "/doc/../guide.pdf", None, 404),
+    ("GET", "/elsewhere", None, 404),
+    ("POST", "/elsewhere", b"", 404),
+    ("POST", "/render", b"\xff\xfe", 400),
+])
+def test_bad_requests(daemon, method, path, body, status):
+    assert request(daemon, method, path, body)[0].status == status
+
+
+def test_missing_content_length(daemon):
+    conn = http.client.HTTPConnection(*daemon, timeout=10)
+    try:
+        conn.putrequest("POST", "/render")
+        conn.endheaders()
+        assert conn.getresponse().status == 411
+    finally:
+        conn.close()
+
+
+def test_oversized_body(daemon):
+    conn = http.client.HTTPConnection(*daemon, timeout=10)
+    try:
+        conn.putrequest("POST", "/render")
+        conn.putheader("Content-Length", str(gen.DAEMON_MAX_BODY + 1))
+        conn.endheaders()
+        assert conn.getresponse().status == 413
+    finally:
+        conn.close()
+
+
+def test_renderer_failure_is_a_server_error(daemon):
+    response, _ = request(daemon, "POST", "/render", b"# Doc\n\nboom\n")
+    assert response.status == 500
+    # The daemon keeps serving after the failure
+    assert request(daemon, "POST", "/render", MD.encode())[0].status == 200
+
+
+@pytest.mark.parametrize("headers", [
+    {"Host": "evil.example"},
+    {"Host": "evil.example:8765"},
+    {"Origin": "http://evil.example"},
+    {"Origin": "null"},
+])
+def test_non_loopback_clients_are_refused(daemon, headers):
+    assert request(daemon, "POST", "/render", MD.encode(), headers)[0].status == 403
+    assert request(daemon, "GET", "/doc/guide.pdf", headers=headers)[0].status == 403
+
+
+def test_loopback_origins_are_served(daemon):
+    for origin in ("http://localhost:3000", "http://127.0.0.1", "http://[::1]:8080"):
+        assert request(daemon, "GET", "/doc/guide.pdf", headers={"Origin": origin})[0].status == 200
+
+
+@pytest.mark.parametrize("src", ["../secret.png", "/../secret.png", "file:///etc/passwd"])
+def test_images_outside_the_document_directory_are_refused(daemon, src):
+    response, _ = request(daemon, "POST", "/render", f"# Doc\n\n![x]({src})\n".encode())
+    assert response.status == 403
+
+
+def test_images_inside_the_document_directory_are_embedded(tmp_path):
+    Image = pytest.importorskip("PIL.Image")
+    Image.new("RGB", (4, 4)).save(tmp_path / "dot.png")
+    html, stats = gen.embed_images('<img src="dot.png">', str(tmp_path), root=str(tmp_path))
+    assert stats["images"] == 1
+    assert "data:image/" in html
+
+
+def test_symlinked_images_must_stay_inside(tmp_path):
+    (tmp_path / "docs").mkdir()
+    (tmp_path / "secret.png").write_bytes(b"secret")
+    (tmp_path / "docs" / "link.png").symlink_to(tmp_path / "secret.png")
+    with pytest.raises(gen.ImagePathError):
+        gen.embed_images('<img src="link.png">', str(tmp_path / "docs"), root=str(tmp_path / "docs"))
@@ -0,0 +1,71 @@
+"""Tests for EPUB output."""
+
+import re
+import xml.etree.ElementTree as ET
+import zipfile
+
+import generate_pdf as gen
+
+XHTML = "{http://www.w3.org/1999/xhtml}"
+DC = "{http://purl.org/dc/elements/1.1/}"
+
+
+def _write(tmp_path, sample_document):
+    cover_html, toc_items, fragments = sample_document
+    path = str(tmp_path / "book.epub")
+    chapters = gen.write_epub(path, cover_html, toc_items, fragments)
+    return path, chapters
+
+
+def test_epub_container_layout(tmp_path, sample_document):
+    path, chapters = _write(tmp_path, sample_document)
+    assert chapters == 3
+    with zipfile.ZipFile(path) as book:
+        first = book.infolist()[0]
+        assert first.filename == "mimetype" and first.compress_type == zipfile.ZIP_STORED
+        assert book.read("mimetype") == b"application/epub+zip"
+        rootfile = ET.fromstring(book.read("META-INF/container.xml")).find(".//{*}rootfile")
+        assert rootfile.get("full-path") == "OEBPS/content.opf"
+        opf = ET.fromstring(book.read("OEBPS/content.opf"))
+        hrefs = {item.get("href") for item in opf.findall(".//{*}item")}
+        assert hrefs and {"OEBPS/" + href for href in hrefs} <= set(book.namelist())
+        spine = [ref.get("idref") for ref in opf.findall(".//{*}itemref")]
+        assert spine == ["cover", "nav", "chapter-00", "chapter-01", "chapter-02"]
+
+
+def test_epub_metadata_comes_from_the_document_constants(tmp_path, sample_document, monkeypatch):
+    monkeypatch.setattr(gen, "DOCUMENT_AUTHOR", "Docs & Platform Team")
+    path, _ = _write(tmp_path, sample_document)
+    with zipfile.ZipFile(path) as book:
+        metadata = ET.fromstring(book.read("OEBPS/content.opf")).find("{*}metadata")
+    assert metadata.find(f"{DC}title").text == gen.DOCUMENT_TITLE
+    assert metadata.find(f"{DC}creator").text == "Docs & Platform Team"
+    assert metadata.find(f"{DC}publisher").text == gen.DOCUMENT_PUBLISHER
+
+
+def test_epub_content_documents_are_xml_and_links_resolve(tmp_path, sample_document):
+    path, _ = _write(tmp_path, sample_document)
+    ids = {}
+    links = []
+    with zipfile.ZipFile(path) as book:
+        for name in book.namelist():
+            if name.endswith(".xhtml"):
+                root = ET.fromstring(book.read(name))
+                page = name.split("/")[-1]
+                ids[page] = {el.get("id") for el in root.iter() if el.get("id")}
+                links += [(page, a.get("href")) for a in root.iter(f"{XHTML}a") if a.get("href")]
+    assert links
+    for page, href in links:
+        target, _, anchor = href.partition("#")
+        assert anchor in ids[target or page], (page, href)
+    # Chapter 1 links into chapter 2 and back
+    assert ("chapter-01.xhtml", "chapter-02.xhtml#b-endpoints") in links
+    assert ("chapter-02.xhtml", "chapter-01.xhtml#a-install-run") in links
+
+
+def test_epub_nav_lists_every_toc_entry(tmp_path, sample_document):
+    path, _ = _write(tmp_path, sample_document)
+    with zipfile.ZipFile(path) as book:
+        nav = book.read("OEBPS/nav.xhtml").decode("utf-8")
+    anchors = re.findall(r'href="[^"#]*#([^"]+)"', nav)
+    assert anchors == [slug for _, _, slug in sample_document[1]]
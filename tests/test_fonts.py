@@ -0,0 +1,122 @@
+"""Tests for local font discovery, download and glyph collection."""
+
+import http.server
+import threading
+
+import pytest
+
+import generate_pdf as gen
+
+
+# -------------------------------------------------------------------
+# Glyph collection
+# -------------------------------------------------------------------
+def test_glyphs_include_text_and_entities():
+    glyphs = gen.collect_document_glyphs(["<p>Ünïcode &amp; &#x2192;</p>", "<td>数据</td>"])
+    for char in "Üï&→数据":
+        assert char in glyphs
+
+
+def test_glyphs_include_every_case_of_the_text():
+    # Headings and labels are styled with text-transform: uppercase
+    glyphs = gen.collect_document_glyphs("<h4>résumé ﬁle straße</h4>")
+    for char in "ÉRSUM":
+        assert char in glyphs
+    assert "ß" in glyphs
+
+
+def test_generated_content_reads_both_quote_styles_and_escapes():
+    css = (
+        ".a::before { content: '✓'; }\n"
+        '.b::after { content: "⚠ " counter(n) "\\2014"; }\n'
+        '.c { content: "say \\"hi\\""; justify-content: "x"; }\n'
+    )
+    assert gen.css_generated_text(css) == '✓⚠ —say "hi"'
+
+
+def test_glyphs_include_the_stylesheet_generated_content():
+    glyphs = gen.collect_document_glyphs("")
+    for char in gen.css_generated_text(gen.CSS):
+        assert char in glyphs
+
+
+# -------------------------------------------------------------------
+# Font discovery and download
+# -------------------------------------------------------------------
+def test_find_local_fonts_reads_family_weight_and_style(tmp_path):
+    for name in ("Inter-SemiBold.ttf", "Inter-BoldItalic.woff2", "JetBrainsMono[wght].ttf", "Other-Bold.ttf", "notes.txt"):
+        (tmp_path / name).write_bytes(b"")
+    fonts = {(family, weight, style) for family, weight, style, _ in gen.find_local_fonts(str(tmp_path))}
+    assert fonts == {
+        ("Inter", "600", "normal"),
+        ("Inter", "700", "italic"),
+        ("JetBrains Mono", "100 900", "normal"),
+    }
+
+
+@pytest.fixture
+def font_server():
+    """Serve a Google Fonts style stylesheet and its font files; paths in
+    `missing` answer 404."""
+    files = {}
+    missing = set()
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path in missing or self.path not in files:
+                self.send_error(404)
+                return
+            body = files[self.path]
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    files["/css"] = "\n".join(
+        f"/* {subset} */ @font-face {{ font-family: '{family}'; font-style: normal; font-weight: {weight}; "
+        f"src: url({base}/{subset}/{family.replace(' ', '')}-{weight}.ttf) format('truetype'); }}"
+        for subset in ("cyrillic", "latin")
+        for family, weight in (("Inter", 400), ("Inter", 700), ("JetBrains Mono", 400))
+    ).encode()
+    for family, weight in (("Inter", 400), ("Inter", 700), ("JetBrainsMono", 400)):
+        files[f"/latin/{family}-{weight}.ttf"] = f"{family} {weight}".encode()
+    yield base, missing
+    server.shutdown()
+    server.server_close()
+
+
+def test_download_fonts_keeps_the_latin_faces(tmp_path, font_server):
+    base, _ = font_server
+    cache_dir = tmp_path / "fonts"
+    assert gen.download_fonts(str(cache_dir), base + "/css") == 3
+    assert sorted(p.name for p in cache_dir.iterdir()) == [
+        "Inter-Bold.ttf", "Inter-Regular.ttf", "JetBrainsMono-Regular.ttf",
+    ]
+    assert len(gen.find_local_fonts(str(cache_dir))) == 3
+
+
+def test_failed_download_leaves_the_previous_fonts(tmp_path, font_server):
+    base, missing = font_server
+    cache_dir = tmp_path / "fonts"
+    gen.download_fonts(str(cache_dir), base + "/css")
+    before = {p.name: p.read_bytes() for p in cache_dir.iterdir()}
+
+    missing.add("/latin/Inter-700.ttf")
+    with pytest.raises(OSError):
+        gen.download_fonts(str(cache_dir), base + "/css")
+    assert {p.name: p.read_bytes() for p in cache_dir.iterdir()} == before
+    assert [p.name for p in tmp_path.iterdir()] == ["fonts"]
+
+
+def test_failed_first_download_leaves_no_fonts(tmp_path, font_server):
+    base, missing = font_server
+    missing.add("/latin/JetBrainsMono-400.ttf")
+    with pytest.raises(OSError):
+        gen.download_fonts(str(tmp_path / "fonts"), base + "/css")
+    assert list(tmp_path.iterdir()) == []
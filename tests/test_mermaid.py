@@ -0,0 +1,25 @@
+"""Tests for the mermaid flowchart parser."""
+
+import pytest
+
+import generate_pdf as gen
+
+
+@pytest.mark.parametrize("source", [
+    "",
+    "%% only a comment",
+    "sequenceDiagram\n  A->>B: hi",
+    "flowchart TD\n  end",
+    "flowchart TD\n  subgraph S\n    A --> B",
+    "flowchart TD\n  A[unclosed --> B",
+])
+def test_parse_mermaid_rejects_unsupported_source(source):
+    with pytest.raises(gen.MermaidError):
+        gen.parse_mermaid(source)
+
+
+def test_parse_mermaid_reads_nodes_and_edges():
+    chart = gen.parse_mermaid("flowchart LR\n  A[Start] --> B(End)")
+    assert chart.direction == "LR"
+    assert {"A", "B"} <= set(chart.nodes)
+    assert len(chart.edges) == 1
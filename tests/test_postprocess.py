@@ -0,0 +1,156 @@
+"""Tests for the single-pass HTML post-processor.
+
+The functions below are the original chain of whole-document passes that
+postprocess_html replaced; the single pass must produce the same HTML.
+"""
+
+import re
+
+import pytest
+
+import generate_pdf as gen
+
+
+def render_mermaid_blocks(html):
+    """Replace mermaid code blocks with their rendered diagrams."""
+    pattern = r'<pre><code class="language-mermaid">(.*?)</code></pre>'
+    return re.sub(pattern, lambda m: gen._render_mermaid_code(m.group(1)) or m.group(0), html, flags=re.DOTALL)
+
+
+def add_callout_boxes(html):
+    """Convert Important/Note paragraphs into styled callout boxes."""
+    # Convert **Important:** paragraphs
+    html = re.sub(
+        r"<p><strong>Important:</strong>\s*(.*?)</p>",
+        r'<div class="callout callout-important"><div class="callout-label">Important</div><p>\1</p></div>',
+        html,
+        flags=re.DOTALL,
+    )
+    # Convert **Note:** paragraphs
+    html = re.sub(
+        r"<p><strong>Note:</strong>\s*(.*?)</p>",
+        r'<div class="callout callout-note"><div class="callout-label">Note</div><p>\1</p></div>',
+        html,
+        flags=re.DOTALL,
+    )
+    # Convert **Decision:** paragraphs
+    html = re.sub(
+        r"<p><strong>Decision:</strong>\s*(.*?)</p>",
+        r'<div class="callout callout-note"><div class="callout-label">Decision</div><p>\1</p></div>',
+        html,
+        flags=re.DOTALL,
+    )
+    return html
+
+
+def convert_checkbox_lists(html):
+    """Convert checkbox list items into styled checkboxes."""
+    # Convert [ ] into unchecked checkbox
+    html = html.replace(
+        "[ ]",
+        '<span class="checkbox-box"></span>'
+    )
+    # Convert [x] into checked checkbox
+    html = html.replace(
+        "[x]",
+        '<span class="checkbox-box checked"></span>'
+    )
+    html = html.replace(
+        "[X]",
+        '<span class="checkbox-box checked"></span>'
+    )
+    return html
+
+
+def add_section_numbers_and_rules(html):
+    """Add colored section numbers and horizontal accent rules after h2 tags."""
+    def replace_h2(match):
+        attrs = match.group(1) or ""
+        content = match.group(2)
+        # Extract section number if present
+        num_match = re.match(r"(\d+)\.\s*(.*)", content)
+        if num_match:
+            num = num_match.group(1)
+            rest = num_match.group(2)
+            return f'<div class="section-break"></div><h2{attrs}><span class="section-number">{num}.</span> {rest}</h2>\n<hr class="section-rule">'
+        return f"<h2{attrs}>{content}</h2>\n" + '<hr class="section-rule">'
+
+    html = re.sub(r"<h2([^>]*)>(.*?)</h2>", replace_h2, html)
+    return html
+
+
+def add_code_language_labels(html):
+    """Add language labels to code blocks."""
+    # Find code blocks with language classes and add labels
+    def add_label(match):
+        lang = match.group(1) if match.group(1) else ""
+        code_content = match.group(2)
+
+        label = gen.CODE_LANG_LABELS.get(lang.lower(), lang.upper()) if lang else ""
+        label_html = f'<span class="code-lang">{label}</span>' if label else ""
+
+        return f'<pre>{label_html}<code class="language-{lang}">{code_content}</code></pre>'
+
+    # Match pre>code blocks with language class
+    html = re.sub(
+        r'<pre><code class="language-(\w+)">(.*?)</code></pre>',
+        add_label,
+        html,
+        flags=re.DOTALL
+    )
+
+    return html
+
+
+def remove_first_h1(html):
+    """Remove the first H1 tag (GAICOM SYSTEM DOCUMENTATION) since we have a cover page."""
+    # Remove the first h1 and the hr that follows it
+    html = re.sub(r'<h1[^>]*>GAICOM SYSTEM DOCUMENTATION</h1>\s*<hr\s*/?\s*>', '', html, count=1)
+    return html
+
+
+LEGACY_CHAIN = [
+    remove_first_h1,
+    render_mermaid_blocks,
+    add_callout_boxes,
+    convert_checkbox_lists,
+    add_section_numbers_and_rules,
+    add_code_language_labels,
+]
+
+
+def run_legacy_chain(html):
+    for func in LEGACY_CHAIN:
+        html = func(html)
+    return html
+
+
+SAMPLES = {
+    "first h1": "<h1 id=\"gaicom\">GAICOM SYSTEM DOCUMENTATION</h1>\n<hr />\n<p>Intro</p>\n<h1>Again</h1>",
+    "callouts": (
+        "<p><strong>Important:</strong> Back up first.</p>\n"
+        "<p><strong>Note:</strong>\nspans\nlines</p>\n"
+        "<p><strong>Decision:</strong> Use Postgres.</p>"
+    ),
+    "checkboxes": "<ul>\n<li>[ ] todo</li>\n<li>[x] done</li>\n<li>[X] done</li>\n</ul>",
+    "sections": '<h2 id="1-intro">1. Intro</h2>\n<h2>Appendix</h2>\n<h3>3. Not a section</h3>',
+    "code labels": (
+        '<pre><code class="language-js">const a = [x];</code></pre>\n'
+        '<pre><code class="language-rust">fn main() {}</code></pre>\n'
+        "<pre><code>[ ] plain</code></pre>"
+    ),
+    "mermaid": '<pre><code class="language-mermaid">flowchart LR\n  A[Start] --&gt; B[End]\n</code></pre>',
+    "broken mermaid": '<pre><code class="language-mermaid">sequenceDiagram\n  A-&gt;&gt;B: hi\n</code></pre>',
+}
+
+
+@pytest.mark.parametrize("html", SAMPLES.values(), ids=SAMPLES.keys())
+def test_single_pass_matches_the_legacy_chain(html):
+    assert gen.postprocess_html(html) == run_legacy_chain(html)
+
+
+def test_single_pass_matches_the_legacy_chain_on_the_documentation():
+    md_text = gen.read_markdown(gen.MD_FILE)
+    for chapter_md in gen.split_chapters(md_text):
+        html, _ = gen.convert_markdown(chapter_md)
+        assert gen.postprocess_html(html) == run_legacy_chain(html)
@@ -0,0 +1,67 @@
+"""Tests for the search index."""
+
+import gzip
+import json
+
+import generate_pdf as gen
+
+
+def _positions(deltas):
+    positions, total = [], 0
+    for delta in deltas:
+        total += delta
+        positions.append(total)
+    return positions
+
+
+def _postings(index, term):
+    """{section index: [word positions]} of a term."""
+    flat = index["terms"].get(term, [])
+    return {section: _positions(deltas) for section, deltas in zip(flat[::2], flat[1::2])}
+
+
+def test_sections_follow_the_toc_headings(sample_document):
+    _, toc_items, fragments = sample_document
+    index, _ = gen.build_search_index(fragments, gen.ARTIFACTS)
+    anchors = [anchor for anchor, _, _ in index["sections"] if anchor]
+    assert anchors == [slug for _, _, slug in toc_items]
+    assert ["b-endpoints", "B. Endpoints", "chapter-02.html"] in index["sections"]
+    assert index["document"] == gen.DOCUMENT_TITLE
+
+
+def test_terms_map_to_sections_and_word_positions(sample_document):
+    _, _, fragments = sample_document
+    index, _ = gen.build_search_index(fragments, gen.ARTIFACTS)
+    sections = [anchor for anchor, _, _ in index["sections"]]
+    endpoints = sections.index("b-endpoints")
+    # Section text: "B. Endpoints Endpoints for orders & payments; see
+    # install. JavaScript const orders = [];"
+    assert _postings(index, "endpoints") == {endpoints: [1, 2]}
+    assert _postings(index, "orders") == {endpoints: [4, 10]}
+    assert sections.index("a-install-run") in _postings(index, "install")
+    assert list(index["terms"]) == sorted(index["terms"])
+
+
+def test_unchanged_sections_are_not_reindexed(sample_document):
+    _, _, fragments = sample_document
+    first, reindexed = gen.build_search_index(fragments, gen.ARTIFACTS)
+    assert reindexed == len(first["sections"])
+    fragments = fragments[:2] + [fragments[2].replace("payments", "refunds")]
+    second, reindexed = gen.build_search_index(fragments, gen.ARTIFACTS)
+    assert reindexed == 1
+    assert "refunds" in second["terms"] and "payments" not in second["terms"]
+
+
+def test_index_file_round_trips(tmp_path, sample_document):
+    _, _, fragments = sample_document
+    index, _ = gen.build_search_index(fragments, gen.ARTIFACTS)
+    path = str(tmp_path / "search.json.gz")
+    size = gen.write_search_index(path, index)
+    with open(path, "rb") as f:
+        data = f.read()
+    assert len(data) == size
+    assert json.loads(gzip.decompress(data)) == index
+    # Byte-identical on rewrite, so unchanged indexes cache well
+    gen.write_search_index(path, index)
+    with open(path, "rb") as f:
+        assert f.read() == data
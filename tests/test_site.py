@@ -0,0 +1,78 @@
+"""Tests for HTML site output."""
+
+import html.parser
+import os
+
+import generate_pdf as gen
+
+
+class _Links(html.parser.HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.ids, self.hrefs, self.stylesheets = set(), [], []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if "id" in attrs:
+            self.ids.add(attrs["id"])
+        if tag == "a" and attrs.get("href"):
+            self.hrefs.append(attrs["href"])
+        if tag == "link" and attrs.get("rel") == "stylesheet":
+            self.stylesheets.append(attrs["href"])
+
+
+def _parse_site(site_dir):
+    pages = {}
+    for name in sorted(os.listdir(site_dir)):
+        if name.endswith(".html"):
+            parser = _Links()
+            with open(os.path.join(site_dir, name), encoding="utf-8") as f:
+                parser.feed(f.read())
+            pages[name] = parser
+    return pages
+
+
+def test_site_has_an_index_and_one_page_per_chapter(tmp_path, sample_document):
+    site_dir = str(tmp_path / "site")
+    assert gen.write_html_site(site_dir, *sample_document) == 4
+    assert sorted(_parse_site(site_dir)) == ["chapter-00.html", "chapter-01.html", "chapter-02.html", "index.html"]
+
+
+def test_site_links_and_stylesheet_resolve(tmp_path, sample_document):
+    site_dir = str(tmp_path / "site")
+    gen.write_html_site(site_dir, *sample_document)
+    pages = _parse_site(site_dir)
+
+    stylesheets = {href for page in pages.values() for href in page.stylesheets}
+    assert len(stylesheets) == 1
+    stylesheet = stylesheets.pop()
+    assert stylesheet.startswith("assets/style.") and os.path.isfile(os.path.join(site_dir, stylesheet))
+    with open(os.path.join(site_dir, "_headers"), encoding="utf-8") as f:
+        assert gen.SITE_ASSET_CACHE_CONTROL in f.read()
+
+    for name, page in pages.items():
+        for href in page.hrefs:
+            target, _, anchor = href.partition("#")
+            assert (target or name) in pages, (name, href)
+            assert not anchor or anchor in pages[target or name].ids, (name, href)
+    assert "chapter-02.html#b-endpoints" in pages["chapter-01.html"].hrefs
+    assert "chapter-01.html#a-install-run" in pages["index.html"].hrefs
+
+
+def test_site_stylesheet_name_follows_its_content(tmp_path, sample_document):
+    site_dir = str(tmp_path / "site")
+    gen.write_html_site(site_dir, *sample_document)
+    before = os.listdir(os.path.join(site_dir, "assets"))
+    gen.write_html_site(site_dir, *sample_document, font_css="@font-face { font-family: Inter; }")
+    after = os.listdir(os.path.join(site_dir, "assets"))
+    # A changed stylesheet gets a new name and the old one is removed
+    assert len(before) == len(after) == 1 and before != after
+    assert all(after[0] in page.stylesheets[0] for page in _parse_site(site_dir).values())
+
+
+def test_site_rebuild_removes_stale_pages(tmp_path, sample_document):
+    site_dir = str(tmp_path / "site")
+    cover_html, toc_items, fragments = sample_document
+    gen.write_html_site(site_dir, cover_html, toc_items, fragments)
+    gen.write_html_site(site_dir, cover_html, toc_items[:2], fragments[:2])
+    assert sorted(_parse_site(site_dir)) == ["chapter-00.html", "chapter-01.html", "index.html"]